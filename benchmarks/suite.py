@@ -0,0 +1,720 @@
+"""
+Benchmark suite for the formatters, filters and pre-formatters of gouge.
+
+Each benchmark runs one operation (for example ``CSVLog.format``) over a
+"record mix" and reports:
+
+* throughput in records per second
+* per-record latency percentiles (p50, p95, p99) in microseconds
+* the peak number of bytes allocated while processing a single record
+
+Usage::
+
+    # Run everything
+    python benchmarks/suite.py
+
+    # Run a subset and store the results as baseline
+    python benchmarks/suite.py -k csv --save baseline.json
+
+    # Compare against a baseline. Exits with status 1 if the throughput of
+    # any benchmark dropped by more than 10%
+    python benchmarks/suite.py --compare baseline.json --threshold 0.1
+
+Numbers are only comparable between runs on the same machine and Python
+version.
+"""
+
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import colorama as clr
+from colorama.ansitowin32 import AnsiToWin32
+
+from gouge import preformatters as pf
+from gouge.binary import BinaryEncoder
+from gouge.colourcli import Simple
+from gouge.filters import RateLimitFilter, ShiftingFilter, ShiftingRules
+from gouge.handlers import CollapsingHandler
+from gouge.loggers import shift_level
+from gouge.parseable import CSVLog, JSONLog, XMLLog
+
+RecordFactory = Callable[[int], List[logging.LogRecord]]
+
+
+class NullStream:
+    """
+    A text stream discarding everything written to it.
+    """
+
+    def write(self, data: str) -> int:
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+
+def _record(
+    msg: str, args: tuple = (), level: int = logging.INFO, exc_info=None
+) -> logging.LogRecord:
+    return logging.LogRecord(
+        "bench.module.sub", level, __file__, 42, msg, args, exc_info
+    )
+
+
+def _deep_exc_info(depth: int = 30) -> tuple:
+    def recurse(remaining: int) -> None:
+        if remaining == 0:
+            raise ValueError("failed: {'reason': 'timeout'}")
+        recurse(remaining - 1)
+
+    try:
+        recurse(depth)
+    except ValueError:
+        return sys.exc_info()
+    raise AssertionError("unreachable")
+
+
+_LEVELS = [
+    logging.DEBUG,
+    logging.INFO,
+    logging.INFO,
+    logging.INFO,
+    logging.WARNING,
+    logging.ERROR,
+]
+
+
+def plain_records(count: int) -> List[logging.LogRecord]:
+    return [
+        _record("Processing request", level=_LEVELS[i % len(_LEVELS)])
+        for i in range(count)
+    ]
+
+
+def args_records(count: int) -> List[logging.LogRecord]:
+    return [
+        _record(
+            "User %s fetched %d items in %.3fs",
+            ("alice", i, i / 1000),
+            level=_LEVELS[i % len(_LEVELS)],
+        )
+        for i in range(count)
+    ]
+
+
+def exception_records(count: int) -> List[logging.LogRecord]:
+    exc_info = _deep_exc_info()
+    return [
+        _record("Request failed", level=logging.ERROR, exc_info=exc_info)
+        for _ in range(count)
+    ]
+
+
+def long_records(count: int) -> List[logging.LogRecord]:
+    payload = "lorem ipsum dolor sit amet " * 150
+    return [_record("Payload: %s", (payload,)) for _ in range(count)]
+
+
+def mixed_records(count: int) -> List[logging.LogRecord]:
+    """
+    A "realistic" mix: mostly short messages with a few long ones and an
+    occasional exception.
+    """
+    exc_info = _deep_exc_info()
+    payload = "lorem ipsum dolor sit amet " * 150
+    output = []
+    for i in range(count):
+        if i % 100 == 0:
+            output.append(
+                _record("Failed", level=logging.ERROR, exc_info=exc_info)
+            )
+        elif i % 20 == 0:
+            output.append(_record("Payload: %s", (payload,)))
+        elif i % 2:
+            output.append(_record("Item %d of %d", (i, count)))
+        else:
+            output.append(_record("Processing request"))
+    return output
+
+
+def access_records(count: int) -> List[logging.LogRecord]:
+    statuses = [200, 200, 200, 201, 304, 404, 500]
+    return [
+        logging.LogRecord(
+            "uvicorn.access",
+            logging.INFO,
+            __file__,
+            1,
+            '%s - "%s %s HTTP/%s" %d',
+            (
+                "127.0.0.1:43522",
+                "GET",
+                f"/api/items/{i}",
+                "1.1",
+                statuses[i % len(statuses)],
+            ),
+            None,
+        )
+        for i in range(count)
+    ]
+
+
+_THIRD_PARTY = [
+    "sqlalchemy.engine.Engine",
+    "urllib3.connectionpool",
+    "botocore.endpoint",
+    "botocore.hooks",
+    "asyncio",
+    "httpx._client",
+    "app.api.views",
+    "app.worker",
+]
+
+
+def third_party_records(count: int) -> List[logging.LogRecord]:
+    """
+    Chatty DEBUG output of third-party libraries mixed with application
+    messages.
+    """
+    return [
+        logging.LogRecord(
+            _THIRD_PARTY[i % len(_THIRD_PARTY)],
+            logging.DEBUG if i % 3 else logging.INFO,
+            __file__,
+            42,
+            "Item %d",
+            (i,),
+            None,
+        )
+        for i in range(count)
+    ]
+
+
+def flood_records(count: int) -> List[logging.LogRecord]:
+    """
+    The same warning over and over, as logged while a dependency is down.
+    """
+    return [
+        _record("Connection to %s failed", ("db:5432",), logging.WARNING)
+        for _ in range(count)
+    ]
+
+
+MIXES: Dict[str, RecordFactory] = {
+    "plain": plain_records,
+    "args": args_records,
+    "exception": exception_records,
+    "long": long_records,
+    "mixed": mixed_records,
+    "access": access_records,
+    "third-party": third_party_records,
+    "flood": flood_records,
+}
+
+
+@dataclass
+class Benchmark:
+    """
+    One operation which is measured on one or more record mixes.
+
+    :param name: A unique name.
+    :param setup: Returns the callable which is measured. It is called with
+        one record at a time.
+    :param mixes: The names of the record mixes (see :py:data:`MIXES`) to
+        run the benchmark on.
+    :param threads: If larger than 1, the records are emitted by that many
+        producer threads concurrently. Latencies and allocations are not
+        measured in that case.
+    """
+
+    name: str
+    setup: Callable[[], Callable[[logging.LogRecord], object]]
+    mixes: List[str]
+    threads: int = 1
+
+
+@dataclass
+class Result:
+    benchmark: str
+    mix: str
+    records_per_sec: float
+    p50_us: Optional[float] = None
+    p95_us: Optional[float] = None
+    p99_us: Optional[float] = None
+    alloc_bytes: Optional[float] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.benchmark}[{self.mix}]"
+
+
+def _threaded_handler(
+    formatter: logging.Formatter,
+) -> Callable[[logging.LogRecord], object]:
+    handler = logging.StreamHandler(NullStream())  # type: ignore
+    handler.setFormatter(formatter)
+    return handler.handle
+
+
+def _stripped_handler(
+    formatter: logging.Formatter,
+) -> Callable[[logging.LogRecord], object]:
+    """
+    A handler whose stream strips ANSI sequences using colorama, which is
+    what happens when coloured output is not written to a terminal.
+    """
+    stream = AnsiToWin32(NullStream(), strip=True).stream  # type: ignore
+    handler = logging.StreamHandler(stream)  # type: ignore
+    handler.setFormatter(formatter)
+    return handler.handle
+
+
+def _batched(
+    formatter: CSVLog, size: int = 1000
+) -> Callable[[logging.LogRecord], object]:
+    """
+    Collect records and format them in batches of *size* records using
+    ``format_many``. The reported latency is amortised over the batch.
+    """
+    pending: List[logging.LogRecord] = []
+
+    def operation(record: logging.LogRecord) -> None:
+        pending.append(record)
+        if len(pending) >= size:
+            formatter.format_many(pending)
+            pending.clear()
+
+    return operation
+
+
+def _uvicorn_access(record: logging.LogRecord) -> str:
+    # Parses the rendered message
+    return pf.uvicorn_access(record.getMessage())
+
+
+def _shifting_filters() -> Callable[[logging.LogRecord], object]:
+    # A typical set-up: several filters stacked on one handler, most of them
+    # for other libraries.
+    handler = logging.NullHandler()
+    for name in ["sqlalchemy", "urllib3", "botocore", "asyncio", "httpx"]:
+        handler.addFilter(ShiftingFilter(-1, name))
+    handler.addFilter(ShiftingFilter(1, "bench.module"))
+    return handler.filter
+
+
+_NOISY_LIBRARIES = [
+    "sqlalchemy",
+    "sqlalchemy.engine",
+    "sqlalchemy.pool",
+    "urllib3",
+    "urllib3.connectionpool",
+    "botocore",
+    "botocore.hooks",
+    "botocore.endpoint",
+    "boto3",
+    "s3transfer",
+    "asyncio",
+    "httpx",
+    "httpcore",
+    "requests",
+    "charset_normalizer",
+    "PIL",
+    "matplotlib",
+    "parso",
+]
+
+
+def _stacked_filters() -> Callable[[logging.LogRecord], object]:
+    # Many filters silencing or promoting individual libraries
+    handler = logging.NullHandler()
+    for name in _NOISY_LIBRARIES:
+        handler.addFilter(ShiftingFilter(-1, name))
+    handler.addFilter(ShiftingFilter(1, "app.api"))
+    handler.addFilter(ShiftingFilter(offset=5, logger="app"))
+    return handler.filter
+
+
+def _shifting_rules() -> Callable[[logging.LogRecord], object]:
+    # The same rules as _stacked_filters in a single filter
+    rules: Dict[str, Any] = {name: -1 for name in _NOISY_LIBRARIES}
+    rules.update({"app.api": 1, "app": {"offset": 5}})
+    return ShiftingRules(rules).filter
+
+
+def _rate_limited(
+    formatter: logging.Formatter,
+) -> Callable[[logging.LogRecord], object]:
+    filter_ = RateLimitFilter(rate=100, summary_interval=0)
+
+    def operation(record: logging.LogRecord) -> None:
+        if filter_.filter(record):
+            formatter.format(record)
+
+    return operation
+
+
+def _collapsing(
+    formatter: logging.Formatter,
+) -> Callable[[logging.LogRecord], object]:
+    target = logging.StreamHandler(NullStream())  # type: ignore
+    target.setFormatter(formatter)
+    return CollapsingHandler([target], max_delay=0).handle
+
+
+def _chatty_logger(name: str) -> logging.Logger:
+    # A library logger at INFO, whose INFO messages are shifted to DEBUG
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = logging.NullHandler()
+    handler.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    return logger
+
+
+def _chatty_filter() -> Callable[[logging.LogRecord], object]:
+    logger = _chatty_logger("bench.chatty.filter")
+    ShiftingFilter(-1).inject(logger)
+    return lambda record: logger.info(record.msg, *record.args)
+
+
+def _chatty_shifted() -> Callable[[logging.LogRecord], object]:
+    logger = _chatty_logger("bench.chatty.shifted")
+    shift_level(logger.name, -1)
+    return lambda record: logger.info(record.msg, *record.args)
+
+
+_HIGHLIGHT_RULES = [
+    (r"(?P<host>\d+\.\d+\.\d+\.\d+):\d+", {"host": clr.Fore.BLUE}),
+    (
+        r'"(?P<method>GET|POST|PUT|DELETE) (?P<path>\S+)',
+        {"method": clr.Fore.GREEN},
+    ),
+    (r"(?P<status>[45]\d\d)$", {"status": clr.Fore.RED}),
+    (r"\b(?P<sql>SELECT|INSERT|UPDATE|DELETE)\b", {"sql": clr.Fore.CYAN}),
+    (r"request_id=(?P<id>[0-9a-f-]{36})", {"id": clr.Fore.MAGENTA}),
+]
+
+
+def _highlight_separate() -> Callable[[logging.LogRecord], object]:
+    # One pre-formatter (and scan) per rule
+    highlighters = [
+        pf.Highlighter([pf.HighlightRule(pattern, colours)])
+        for pattern, colours in _HIGHLIGHT_RULES
+    ]
+
+    def operation(record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        for highlighter in highlighters:
+            message = highlighter(message)
+        return message
+
+    return operation
+
+
+def _highlight_combined() -> Callable[[logging.LogRecord], object]:
+    highlighter = pf.Highlighter(
+        pf.HighlightRule(pattern, colours)
+        for pattern, colours in _HIGHLIGHT_RULES
+    )
+    return lambda record: highlighter(record.getMessage())
+
+
+BENCHMARKS = [
+    Benchmark(
+        "simple",
+        lambda: Simple().format,
+        ["plain", "args", "long", "mixed", "flood"],
+    ),
+    Benchmark(
+        "simple-show-threads",
+        lambda: Simple(show_threads=True).format,
+        ["args"],
+    ),
+    Benchmark(
+        "simple-show-pid",
+        lambda: Simple(show_pid=True).format,
+        ["args"],
+    ),
+    Benchmark(
+        "simple-colourless",
+        lambda: Simple(colour=False).format,
+        ["plain", "args", "mixed"],
+    ),
+    Benchmark(
+        "simple-handler-stripped",
+        lambda: _stripped_handler(Simple()),
+        ["args"],
+    ),
+    Benchmark(
+        "simple-handler-colourless",
+        lambda: _threaded_handler(Simple(colour=False)),
+        ["args"],
+    ),
+    Benchmark(
+        "simple-show-exc",
+        lambda: Simple(show_exc=True).format,
+        ["exception", "mixed"],
+    ),
+    Benchmark(
+        "simple-handler",
+        lambda: _threaded_handler(Simple()),
+        ["flood", "mixed"],
+    ),
+    Benchmark(
+        "simple-collapsing",
+        lambda: _collapsing(Simple()),
+        ["flood", "mixed"],
+    ),
+    Benchmark(
+        "simple-threads-4",
+        lambda: _threaded_handler(Simple()),
+        ["args"],
+        threads=4,
+    ),
+    Benchmark(
+        "csvlog", lambda: CSVLog().format, ["args", "exception", "mixed"]
+    ),
+    Benchmark(
+        "csvlog-format-many",
+        lambda: _batched(CSVLog()),
+        ["args", "mixed"],
+    ),
+    Benchmark(
+        "xmllog", lambda: XMLLog().format, ["args", "exception", "mixed"]
+    ),
+    *[
+        Benchmark(
+            f"csvlog-threads-{threads}",
+            lambda: _threaded_handler(CSVLog()),
+            ["args"],
+            threads=threads,
+        )
+        for threads in (2, 4, 8)
+    ],
+    Benchmark(
+        "jsonlog", lambda: JSONLog().format, ["args", "exception", "mixed"]
+    ),
+    Benchmark(
+        "jsonlog-stdlib",
+        lambda: JSONLog(fast_encoder=False).format,
+        ["args", "mixed"],
+    ),
+    Benchmark(
+        "binary", lambda: BinaryEncoder().encode, ["args", "exception", "mixed"]
+    ),
+    Benchmark("shifting-filter", _shifting_filters, ["args"]),
+    Benchmark("shifting-filter-stacked", _stacked_filters, ["third-party"]),
+    Benchmark("shifting-rules", _shifting_rules, ["third-party"]),
+    Benchmark("chatty-logger-filter", _chatty_filter, ["args"]),
+    Benchmark("chatty-logger-shifted", _chatty_shifted, ["args"]),
+    Benchmark(
+        "simple-rate-limited",
+        lambda: _rate_limited(Simple()),
+        ["flood", "mixed"],
+    ),
+    Benchmark("uvicorn-access", lambda: _uvicorn_access, ["access"]),
+    Benchmark("uvicorn-access-args", lambda: pf.uvicorn_access, ["access"]),
+    Benchmark(
+        "highlight-separate", _highlight_separate, ["access", "mixed", "long"]
+    ),
+    Benchmark(
+        "highlight-combined", _highlight_combined, ["access", "mixed", "long"]
+    ),
+]
+
+
+def _percentile(sorted_values: List[int], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index] / 1000
+
+
+def measure(benchmark: Benchmark, mix: str, count: int, repeat: int) -> Result:
+    """
+    Run *benchmark* on *count* records of *mix*. The throughput is the best
+    of *repeat* runs. Every run uses freshly created records so caches on
+    the records (like ``exc_text``) do not skew the results.
+    """
+    factory = MIXES[mix]
+    operation = benchmark.setup()
+    # Warm-up (fills caches which are expected to be warm in production)
+    for record in factory(min(count, 100)):
+        operation(record)
+
+    if benchmark.threads > 1:
+        return _measure_threaded(benchmark, mix, operation, count, repeat)
+
+    best = float("inf")
+    latencies: List[int] = []
+    clock = time.perf_counter_ns
+    for _ in range(repeat):
+        records = factory(count)
+        run_latencies = []
+        started = clock()
+        for record in records:
+            before = clock()
+            operation(record)
+            run_latencies.append(clock() - before)
+        elapsed = clock() - started
+        if elapsed < best:
+            best = elapsed
+            latencies = run_latencies
+    latencies.sort()
+
+    return Result(
+        benchmark.name,
+        mix,
+        count / (best / 1e9),
+        _percentile(latencies, 0.50),
+        _percentile(latencies, 0.95),
+        _percentile(latencies, 0.99),
+        _allocated_bytes(operation, factory(min(count, 500))),
+    )
+
+
+def _allocated_bytes(
+    operation: Callable[[logging.LogRecord], object],
+    records: List[logging.LogRecord],
+) -> Optional[float]:
+    """
+    Return the average peak number of bytes allocated while processing one
+    record.
+    """
+    if not hasattr(tracemalloc, "reset_peak"):
+        # Python < 3.9
+        return None
+    tracemalloc.start()
+    try:
+        peaks = 0
+        for record in records:
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            operation(record)
+            peaks += tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+    return peaks / len(records)
+
+
+def _measure_threaded(
+    benchmark: Benchmark,
+    mix: str,
+    operation: Callable[[logging.LogRecord], object],
+    count: int,
+    repeat: int,
+) -> Result:
+    best = float("inf")
+    per_thread = count // benchmark.threads
+    for _ in range(repeat):
+        batches = [MIXES[mix](per_thread) for _ in range(benchmark.threads)]
+        barrier = threading.Barrier(benchmark.threads + 1)
+
+        def produce(records: List[logging.LogRecord]) -> None:
+            barrier.wait()
+            for record in records:
+                operation(record)
+
+        threads = [
+            threading.Thread(target=produce, args=(batch,)) for batch in batches
+        ]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        best = min(best, time.perf_counter() - started)
+    return Result(benchmark.name, mix, per_thread * benchmark.threads / best)
+
+
+def compare(
+    results: List[Result], baseline: Dict[str, dict], threshold: float
+) -> List[str]:
+    """
+    Return a description of every result which is more than *threshold*
+    (a fraction) slower than in *baseline*.
+    """
+    regressions = []
+    for result in results:
+        reference = baseline.get(result.key)
+        if not reference:
+            continue
+        ratio = result.records_per_sec / reference["records_per_sec"]
+        if ratio < 1 - threshold:
+            regressions.append(
+                f"{result.key}: {result.records_per_sec:,.0f} records/sec "
+                f"vs. {reference['records_per_sec']:,.0f} in baseline "
+                f"({ratio - 1:+.1%})"
+            )
+    return regressions
+
+
+def _fmt(value: Optional[float], spec: str) -> str:
+    return f"{'-':>8}" if value is None else format(value, spec)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "-k",
+        dest="keyword",
+        default="",
+        help="Only run benchmarks whose name contains this text",
+    )
+    parser.add_argument("-n", "--records", type=int, default=5000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("--save", type=Path, help="Store results as JSON")
+    parser.add_argument(
+        "--compare", type=Path, help="Compare with a stored baseline"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Allowed slow-down (as fraction) before flagging a regression",
+    )
+    args = parser.parse_args(argv)
+
+    results = []
+    print(
+        f"{'benchmark':<40} {'records/sec':>12} {'p50 µs':>8} "
+        f"{'p95 µs':>8} {'p99 µs':>8} {'bytes':>8}"
+    )
+    for benchmark in BENCHMARKS:
+        if args.keyword not in benchmark.name:
+            continue
+        for mix in benchmark.mixes:
+            result = measure(benchmark, mix, args.records, args.repeat)
+            results.append(result)
+            print(
+                f"{result.key:<40} {result.records_per_sec:>12,.0f} "
+                f"{_fmt(result.p50_us, '>8.2f')} "
+                f"{_fmt(result.p95_us, '>8.2f')} "
+                f"{_fmt(result.p99_us, '>8.2f')} "
+                f"{_fmt(result.alloc_bytes, '>8,.0f')}"
+            )
+
+    if args.save:
+        data = {result.key: asdict(result) for result in results}
+        args.save.write_text(json.dumps(data, indent=2))
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import sys
+
+from gouge.cli import main
+
+sys.exit(main())
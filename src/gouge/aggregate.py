@@ -0,0 +1,410 @@
+"""
+This module contains simple aggregations over log files.
+
+Only the columns needed for a query are loaded (see
+:py:meth:`LogTable.from_csv`). Numeric columns are stored in
+:py:class:`array.array` instances. All other columns are dictionary-encoded:
+each distinct value is stored once and the rows only hold a small integer
+code. This keeps the memory use proportional to the number of loaded columns
+instead of the size of the rows.
+
+If NumPy is installed (``pip install gouge[aggregate]``), it is used to
+speed up grouping. The results are the same either way.
+"""
+import logging
+import math
+import operator
+import os
+from array import array
+from collections import Counter
+from functools import reduce
+from itertools import compress
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from gouge.index import read_csv_slice
+from gouge.parseable import FIELDS
+from gouge.readers import CSVLogReader
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+#: Columns stored as numbers, with their :py:mod:`array` type-code.
+NUMERIC_COLUMNS = {
+    "created": "d",
+    "msecs": "d",
+    "relativeCreated": "d",
+    "levelno": "q",
+    "lineno": "q",
+}
+
+#: A filter value: either a single value or a collection of allowed values.
+Condition = Union[Any, Collection[Any]]
+
+
+class StringColumn:
+    """
+    A dictionary-encoded column of strings. ``None`` is stored as an empty
+    string.
+    """
+
+    def __init__(self) -> None:
+        self.codes = array("I")
+        self.values: List[str] = []
+        self.lookup: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def append(self, value: Any) -> None:
+        value = "" if value is None else str(value)
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def keys(self) -> Sequence[int]:
+        """
+        Return the values used for grouping (the codes).
+        """
+        return self.codes
+
+    def decode(self, key: int) -> str:
+        return self.values[key]
+
+    def encode(self, values: Iterable[Any]) -> Set[int]:
+        """
+        Return the codes of *values*. Unknown values are ignored.
+        """
+        output = set()
+        for value in values:
+            code = self.lookup.get("" if value is None else str(value))
+            if code is not None:
+                output.add(code)
+        return output
+
+
+class NumericColumn:
+    """
+    A column of numbers stored in an :py:class:`array.array`.
+
+    :param typecode: The array type-code (``"d"`` or ``"q"``).
+    """
+
+    def __init__(self, typecode: str) -> None:
+        self.data = array(typecode)
+        self.convert: Callable[[Any], Any] = float if typecode == "d" else int
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def append(self, value: Any) -> None:
+        self.data.append(self.convert(value))
+
+    def keys(self) -> Sequence[Any]:
+        return self.data
+
+    def decode(self, key: Any) -> Any:
+        return key
+
+    def encode(self, values: Iterable[Any]) -> Set[Any]:
+        return {self.convert(value) for value in values}
+
+
+Column = Union[StringColumn, NumericColumn]
+
+
+def _integer_keys(columns: Iterable[Column]) -> bool:
+    """
+    Return whether the grouping keys of all *columns* are integers.
+    """
+    return all(
+        isinstance(column, StringColumn) or column.data.typecode == "q"
+        for column in columns
+    )
+
+
+def _to_numpy(values: Sequence[Any]) -> Any:
+    """
+    Return a NumPy view of the :py:class:`array.array` *values* (without
+    copying).
+    """
+    return numpy.frombuffer(values, dtype=numpy.dtype(values.typecode))
+
+
+def _make_column(name: str) -> Column:
+    if name not in FIELDS:
+        raise ValueError(
+            f"Unknown column {name!r}. Expected one of {', '.join(FIELDS)}"
+        )
+    typecode = NUMERIC_COLUMNS.get(name)
+    if typecode is None:
+        return StringColumn()
+    return NumericColumn(typecode)
+
+
+def _as_collection(condition: Condition) -> Collection[Any]:
+    if isinstance(condition, (str, bytes)) or not isinstance(
+        condition, Collection
+    ):
+        return (condition,)
+    return condition
+
+
+class LogTable:
+    """
+    Selected columns of log records.
+
+    :param columns: The names of the columns (see
+        :py:data:`gouge.parseable.FIELDS`).
+    """
+
+    def __init__(self, columns: Iterable[str]) -> None:
+        self.columns: Dict[str, Column] = {}
+        for name in columns:
+            if name not in self.columns:
+                self.columns[name] = _make_column(name)
+        self._positions = [
+            (FIELDS.index(name), column.append)
+            for name, column in self.columns.items()
+        ]
+
+    def __len__(self) -> int:
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def append_row(self, row: Sequence[Any]) -> None:
+        """
+        Add a row with the values of all :py:data:`gouge.parseable.FIELDS`.
+        Only the values of the table columns are kept.
+        """
+        for position, append in self._positions:
+            append(row[position])
+
+    def append_record(self, record: logging.LogRecord) -> None:
+        """
+        Add the values of *record*.
+        """
+        for name, column in self.columns.items():
+            column.append(getattr(record, name, None))
+
+    @staticmethod
+    def from_csv(
+        filename: "Union[str, os.PathLike[str]]",
+        columns: Iterable[str],
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        encoding: str = "utf-8",
+    ) -> "LogTable":
+        """
+        Load *columns* of the :py:class:`~gouge.parseable.CSVLog` file
+        *filename*.
+
+        If *start* or *end* are given, only the records created in that
+        time range are loaded, using the time index of the file (see
+        :py:mod:`gouge.index`).
+        """
+        table = LogTable(columns)
+        rows: Iterable[List[str]]
+        if start is None and end is None:
+            rows = CSVLogReader(filename, encoding).rows()
+        else:
+            rows = read_csv_slice(filename, start, end, encoding)
+        append_row = table.append_row
+        for row in rows:
+            append_row(row)
+        return table
+
+    @staticmethod
+    def from_records(
+        records: Iterable[logging.LogRecord], columns: Iterable[str]
+    ) -> "LogTable":
+        """
+        Load *columns* from *records* (for example from
+        :py:class:`gouge.binary.BinaryLogReader`).
+        """
+        table = LogTable(columns)
+        for record in records:
+            table.append_record(record)
+        return table
+
+    def _column(self, name: str) -> Column:
+        try:
+            return self.columns[name]
+        except KeyError:
+            raise ValueError(f"Column {name!r} has not been loaded") from None
+
+    def _mask(
+        self, where: Optional[Mapping[str, Condition]]
+    ) -> Optional[Iterator[bool]]:
+        if not where:
+            return None
+        masks = []
+        for name, condition in where.items():
+            column = self._column(name)
+            allowed = column.encode(_as_collection(condition))
+            masks.append(map(allowed.__contains__, column.keys()))
+        if len(masks) == 1:
+            return masks[0]
+        return map(all, zip(*masks))
+
+    def count(
+        self,
+        by: Sequence[str] = (),
+        interval: Optional[float] = None,
+        where: Optional[Mapping[str, Condition]] = None,
+        use_numpy: Optional[bool] = None,
+    ) -> "Counter[Tuple[Any, ...]]":
+        """
+        Count the records per distinct combination of the values in the
+        columns *by*.
+
+        :param by: The columns to group by.
+        :param interval: If set, the records are also grouped by their
+            creation time in buckets of this many seconds. The start of the
+            bucket is the first element of the keys. This needs the
+            ``created`` column.
+        :param where: Only count records matching all conditions. The keys
+            are column names, the values are either a value or a collection
+            of allowed values.
+        :param use_numpy: Whether to use NumPy. By default, NumPy is used if
+            it is installed.
+        :return: The counts, keyed by tuples of the group values.
+
+        Example: the records per logger, level and minute::
+
+            table.count(["name", "levelname"], interval=60)
+
+        The top 10 functions by error count::
+
+            table.count(["funcName"], where={"levelname": "ERROR"}).most_common(10)
+        """
+        columns = [self._column(name) for name in by]
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        if use_numpy and numpy is not None and _integer_keys(columns):
+            keys = self._count_numpy(columns, interval, where)
+        else:
+            keys = self._count_python(columns, interval, where)
+
+        # Replace the codes in the keys with the column values
+        offset = 0 if interval is None else 1
+        output: "Counter[Tuple[Any, ...]]" = Counter()
+        for key, count in keys.items():
+            values = tuple(
+                column.decode(part)
+                for column, part in zip(columns, key[offset:])
+            )
+            if interval is not None:
+                values = (key[0] * interval,) + values
+            output[values] = count
+        return output
+
+    def _count_python(
+        self,
+        columns: List[Column],
+        interval: Optional[float],
+        where: Optional[Mapping[str, Condition]],
+    ) -> "Counter[Tuple[Any, ...]]":
+        parts: List[Iterable[Any]] = [column.keys() for column in columns]
+        if interval is not None:
+            created = self._column("created").keys()
+            parts.insert(0, (math.floor(value / interval) for value in created))
+        keys: Iterable[Tuple[Any, ...]] = zip(*parts)
+        if not parts:
+            keys = (() for _ in range(len(self)))
+        mask = self._mask(where)
+        if mask is not None:
+            keys = compress(keys, mask)
+        return Counter(keys)
+
+    def _count_numpy(
+        self,
+        columns: List[Column],
+        interval: Optional[float],
+        where: Optional[Mapping[str, Condition]],
+    ) -> "Counter[Tuple[Any, ...]]":
+        parts = []
+        if interval is not None:
+            created = _to_numpy(self._column("created").keys())
+            parts.append(numpy.floor(created / interval).astype(numpy.int64))
+        for column in columns:
+            parts.append(_to_numpy(column.keys()).astype(numpy.int64))
+
+        selected = None
+        for name, condition in (where or {}).items():
+            column = self._column(name)
+            allowed = list(column.encode(_as_collection(condition)))
+            matches = numpy.isin(_to_numpy(column.keys()), allowed)
+            selected = matches if selected is None else selected & matches
+
+        if not parts:
+            total = len(self) if selected is None else int(selected.sum())
+            return Counter({(): total} if total else {})
+        if selected is not None:
+            parts = [part[selected] for part in parts]
+        if not len(parts[0]):
+            return Counter()
+
+        # Combine the parts into a single integer per record (a number with
+        # one "digit" per part). Counting unique scalars is much faster than
+        # counting unique rows.
+        offsets = [int(part.min()) for part in parts]
+        sizes = [
+            int(part.max()) - offset + 1 for part, offset in zip(parts, offsets)
+        ]
+        if reduce(operator.mul, sizes) >= 2**63:
+            return self._count_python(columns, interval, where)
+        combined = numpy.zeros(len(parts[0]), dtype=numpy.int64)
+        for part, offset, size in zip(parts, offsets, sizes):
+            combined *= size
+            combined += part - offset
+        unique, counts = numpy.unique(combined, return_counts=True)
+
+        output: "Counter[Tuple[Any, ...]]" = Counter()
+        for value, count in zip(unique.tolist(), counts.tolist()):
+            key = []
+            for offset, size in zip(reversed(offsets), reversed(sizes)):
+                value, digit = divmod(value, size)
+                key.append(digit + offset)
+            output[tuple(reversed(key))] = count
+        return output
+
+    def histogram(
+        self,
+        column: str = "created",
+        width: float = 60,
+        where: Optional[Mapping[str, Condition]] = None,
+    ) -> Dict[float, int]:
+        """
+        Count the values of the numeric *column* in buckets of *width*.
+
+        Returns a dictionary mapping the start of each non-empty bucket to
+        the number of records in it, ordered by bucket.
+        """
+        values = self._column(column)
+        if not isinstance(values, NumericColumn):
+            raise ValueError(f"Column {column!r} is not numeric")
+        buckets = (math.floor(value / width) for value in values.data)
+        mask = self._mask(where)
+        if mask is not None:
+            buckets = compress(buckets, mask)
+        counts = Counter(buckets)
+        return {bucket * width: counts[bucket] for bucket in sorted(counts)}
@@ -0,0 +1,398 @@
+"""
+This module contains a compact binary log format for high-volume logging.
+
+A file starts with :py:data:`MAGIC` followed by a sequence of entries. Each
+entry consists of a one byte *kind*, the length of the payload (unsigned 32
+bit integer) and the payload itself:
+
+* ``S`` entries add a string to the string table. Strings are numbered in
+  the order they appear in the file, starting at 0. Repeated strings (logger
+  names, path names, function names, thread names, ...) are only stored once.
+* ``R`` entries contain a log record. The payload starts with the
+  fixed-width fields described by :py:data:`RECORD`, followed by the UTF-8
+  encoded message and exception text.
+
+All numbers are stored little-endian. A string reference of
+:py:data:`NONE` represents *None*.
+
+Use :py:class:`~.BinaryFileHandler` to write such files and
+:py:class:`~.BinaryLogReader` to read them.
+"""
+import logging
+import mmap
+import os
+import struct
+from typing import IO, Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+MAGIC = b"GOUGEBIN\x00\x01"
+
+#: Entry header: kind and payload length
+ENTRY = struct.Struct("<cI")
+KIND_STRING = b"S"
+KIND_RECORD = b"R"
+
+#: Fixed-width record fields: created, msecs, relativeCreated, levelno,
+#: lineno, process, thread, the string references for name, pathname,
+#: funcName, threadName, processName and levelname, the length of the message
+#: and the length of the exception text.
+RECORD = struct.Struct("<dddiIIQ6III")
+_CREATED = struct.Struct("<d")
+_LEVELNO = struct.Struct("<i")
+_LEVELNO_OFFSET = 24
+_NAME_OFFSET = 44
+_REF = struct.Struct("<I")
+
+#: String reference representing *None*
+NONE = 0xFFFFFFFF
+
+_DEFAULT_FORMATTER = logging.Formatter()
+
+
+class BinaryEncoder:
+    """
+    Convert log records to entries of the binary log format.
+
+    The encoder keeps track of the strings which have already been written,
+    so one encoder must be used per output file.
+
+    :param strings: Strings which are already present in the output (in
+        order of their appearance).
+    """
+
+    def __init__(self, strings: Optional[List[str]] = None) -> None:
+        self.strings: Dict[str, int] = {
+            value: index for index, value in enumerate(strings or [])
+        }
+
+    def _ref(
+        self, value: Optional[str], pending: Dict[str, int], output: List[bytes]
+    ) -> int:
+        """
+        Return the index of *value* in the string table. New strings are
+        added to *pending* and their entries to *output*.
+        """
+        if value is None:
+            return NONE
+        index = self.strings.get(value)
+        if index is None:
+            index = pending.get(value)
+        if index is None:
+            index = pending[value] = len(self.strings) + len(pending)
+            data = value.encode("utf8")
+            output.append(ENTRY.pack(KIND_STRING, len(data)))
+            output.append(data)
+        return index
+
+    def encode(
+        self,
+        record: logging.LogRecord,
+        formatter: logging.Formatter = _DEFAULT_FORMATTER,
+    ) -> bytes:
+        """
+        Return the binary entries for *record*. This includes string-table
+        entries for strings which have not been seen before.
+
+        *formatter* is used to convert exception information to text if
+        ``record.exc_text`` is not yet set.
+        """
+        if record.exc_info and not record.exc_text:
+            record.exc_text = formatter.formatException(record.exc_info)
+        message = record.getMessage().encode("utf8")
+        exc_text = (record.exc_text or "").encode("utf8")
+        output: List[bytes] = []
+        pending: Dict[str, int] = {}
+        header = RECORD.pack(
+            record.created,
+            record.msecs,
+            record.relativeCreated,
+            record.levelno,
+            record.lineno or 0,
+            record.process or 0,
+            record.thread or 0,
+            self._ref(record.name, pending, output),
+            self._ref(record.pathname, pending, output),
+            self._ref(record.funcName, pending, output),
+            self._ref(record.threadName, pending, output),
+            self._ref(record.processName, pending, output),
+            self._ref(record.levelname, pending, output),
+            len(message),
+            len(exc_text),
+        )
+        # Only remember new strings once the record could be packed
+        self.strings.update(pending)
+        output.append(
+            ENTRY.pack(KIND_RECORD, len(header) + len(message) + len(exc_text))
+        )
+        output.append(header)
+        output.append(message)
+        output.append(exc_text)
+        return b"".join(output)
+
+
+class BinaryFileHandler(logging.Handler):
+    """
+    A handler writing log records to a file in the binary log format.
+
+    When appending to an existing file, the string table of that file is
+    loaded first so new records can reference it.
+
+    The output is buffered by the file object. It is flushed for records with
+    a level of *flush_level* or higher, when the handler is flushed and when
+    it is closed.
+
+    :param filename: The name of the output file.
+    :param flush_level: Records of this level or higher are written
+        immediately.
+    """
+
+    def __init__(
+        self,
+        filename: "Union[str, os.PathLike[str]]",
+        flush_level: int = logging.ERROR,
+    ) -> None:
+        super().__init__()
+        self.baseFilename = os.path.abspath(filename)
+        self.flush_level = flush_level
+        strings: List[str] = []
+        complete: Optional[int] = None
+        if os.path.exists(self.baseFilename):
+            with BinaryLogReader(self.baseFilename) as reader:
+                strings = reader.read_strings()
+                if reader.complete_size < reader.size:
+                    complete = reader.complete_size
+        self.encoder = BinaryEncoder(strings)
+        self.stream: Optional[IO[bytes]] = open(self.baseFilename, "ab")
+        if complete is not None:
+            # Drop the incomplete entry of an interrupted writer. Otherwise
+            # all new entries would be read as part of it.
+            self.stream.truncate(complete)
+        if self.stream.tell() == 0:
+            self.stream.write(MAGIC)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            data = self.encoder.encode(
+                record, self.formatter or _DEFAULT_FORMATTER
+            )
+            if self.stream is None:
+                return
+            self.stream.write(data)
+            if record.levelno >= self.flush_level:
+                self.stream.flush()
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if self.stream is not None:
+                self.stream.flush()
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        self.acquire()
+        try:
+            stream, self.stream = self.stream, None
+            if stream is not None:
+                stream.close()
+        finally:
+            self.release()
+        super().close()
+
+
+class BinaryLogReader:
+    """
+    Read log records from a file written by
+    :py:class:`~.BinaryFileHandler`.
+
+    The file is memory-mapped. When filtering, only the fields needed to
+    evaluate the filter are decoded. Use it as context manager, or call
+    :py:meth:`~.close` when done.
+
+    :param filename: The file to read.
+    """
+
+    def __init__(self, filename: "Union[str, os.PathLike[str]]") -> None:
+        self.filename = filename
+        self._file = open(filename, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data: Union[mmap.mmap, bytes]
+        if size == 0:
+            self._data = b""
+        else:
+            self._data = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        if size and self._data[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{filename} is not a gouge binary log file")
+        self.size = size
+        self.strings: List[str] = []
+        #: The end of the last complete entry (set after reading the file)
+        self.complete_size = len(MAGIC) if size else 0
+
+    def __enter__(self) -> "BinaryLogReader":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def _entries(self) -> Iterator[Tuple[bytes, int, int]]:
+        """
+        Yield ``(kind, start, end)`` for each complete entry. String entries
+        are added to :py:attr:`strings` on the way.
+        """
+        data = self._data
+        size = len(data)
+        offset = len(MAGIC)
+        strings = self.strings
+        strings.clear()
+        while offset + ENTRY.size <= size:
+            kind, length = ENTRY.unpack_from(data, offset)
+            start = offset + ENTRY.size
+            end = start + length
+            if end > size:
+                # Incomplete entry (the writer was interrupted)
+                break
+            if kind == KIND_STRING:
+                strings.append(data[start:end].decode("utf8"))
+            else:
+                yield kind, start, end
+            offset = end
+            self.complete_size = offset
+
+    def read_strings(self) -> List[str]:
+        """
+        Return the complete string table of the file.
+        """
+        for _ in self._entries():
+            pass
+        return list(self.strings)
+
+    def __iter__(self) -> Iterator[logging.LogRecord]:
+        return self.records()
+
+    def records(
+        self,
+        min_level: int = logging.NOTSET,
+        logger: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Iterator[logging.LogRecord]:
+        """
+        Iterate over the log records in the file.
+
+        :param min_level: Skip records with a lower level.
+        :param logger: Only return records of this logger and its
+            descendants.
+        :param start: Skip records created before this timestamp.
+        :param end: Skip records created at or after this timestamp.
+        """
+        data = self._data
+        strings = self.strings
+        matching_names: Set[int] = set()
+        other_names: Set[int] = set()
+        for kind, offset, _ in self._entries():
+            if kind != KIND_RECORD:
+                continue
+            if min_level > logging.NOTSET:
+                levelno = _LEVELNO.unpack_from(data, offset + _LEVELNO_OFFSET)
+                if levelno[0] < min_level:
+                    continue
+            if start is not None or end is not None:
+                (created,) = _CREATED.unpack_from(data, offset)
+                if start is not None and created < start:
+                    continue
+                if end is not None and created >= end:
+                    continue
+            if logger is not None:
+                (name_ref,) = _REF.unpack_from(data, offset + _NAME_OFFSET)
+                if name_ref in other_names:
+                    continue
+                if name_ref not in matching_names:
+                    name = strings[name_ref] if name_ref != NONE else ""
+                    if name == logger or name.startswith(logger + "."):
+                        matching_names.add(name_ref)
+                    else:
+                        other_names.add(name_ref)
+                        continue
+            yield self._decode(offset)
+
+    def _decode(self, offset: int) -> logging.LogRecord:
+        data = self._data
+        strings = self.strings
+        (
+            created,
+            msecs,
+            relative_created,
+            levelno,
+            lineno,
+            process,
+            thread,
+            *refs,
+            message_length,
+            exc_length,
+        ) = RECORD.unpack_from(data, offset)
+        name, pathname, func_name, thread_name, process_name, levelname = [
+            None if ref == NONE else strings[ref] for ref in refs
+        ]
+        message_start = offset + RECORD.size
+        exc_start = message_start + message_length
+        message = data[message_start:exc_start].decode("utf8")
+        exc_text = data[exc_start : exc_start + exc_length].decode("utf8")
+        filename = os.path.basename(pathname or "")
+        return logging.makeLogRecord(
+            {
+                "name": name,
+                "msg": message,
+                "args": (),
+                "message": message,
+                "levelname": levelname,
+                "levelno": levelno,
+                "pathname": pathname,
+                "filename": filename,
+                "module": os.path.splitext(filename)[0],
+                "lineno": lineno,
+                "funcName": func_name,
+                "created": created,
+                "msecs": msecs,
+                "relativeCreated": relative_created,
+                "thread": thread or None,
+                "threadName": thread_name,
+                "process": process or None,
+                "processName": process_name,
+                "exc_info": None,
+                "exc_text": exc_text or None,
+            }
+        )
+
+
+def convert(
+    filename: "Union[str, os.PathLike[str]]",
+    handler: logging.Handler,
+    **filters: Any,
+) -> int:
+    """
+    Pass the records of the binary log *filename* on to *handler*. Together
+    with :py:class:`gouge.parseable.CSVFileHandler`,
+    :py:class:`gouge.parseable.XMLFileHandler` or a stream handler using
+    :py:class:`gouge.colourcli.Simple` this converts the file back to a text
+    format.
+
+    The *filters* are passed on to :py:meth:`BinaryLogReader.records`.
+
+    Returns the number of converted records.
+    """
+    count = 0
+    with BinaryLogReader(filename) as reader:
+        for record in reader.records(**filters):
+            handler.handle(record)
+            count += 1
+    handler.flush()
+    return count
@@ -0,0 +1,79 @@
+"""
+This module contains small caching helpers shared by the formatters and
+filters.
+"""
+from collections import OrderedDict
+from threading import Lock
+from typing import Generic, Hashable, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class LRUCache(Generic[T]):
+    """
+    A thread-safe mapping which holds at most *maxsize* entries. When full,
+    the least recently used entry is discarded.
+
+    :param maxsize: The maximum number of entries to keep.
+    """
+
+    def __init__(self, maxsize: int = 128) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize must be a positive integer")
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, T]" = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Optional[T] = None) -> Optional[T]:
+        """
+        Return the value for *key* (marking it as recently used) or *default*
+        if it is not cached.
+        """
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def put(self, key: Hashable, value: T) -> Optional[Tuple[Hashable, T]]:
+        """
+        Store *value* under *key*.
+
+        If this evicts an entry, the evicted ``(key, value)`` pair is returned,
+        otherwise *None*.
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                return self._data.popitem(last=False)
+        return None
+
+    def pop(self, key: Hashable, default: Optional[T] = None) -> Optional[T]:
+        """
+        Remove *key* from the cache and return its value (or *default*).
+        """
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def items(self) -> Iterator[Tuple[Hashable, T]]:
+        """
+        Return a snapshot of the cached ``(key, value)`` pairs, least recently
+        used first.
+        """
+        with self._lock:
+            return iter(list(self._data.items()))
+
+    def clear(self) -> None:
+        """
+        Remove all entries.
+        """
+        with self._lock:
+            self._data.clear()
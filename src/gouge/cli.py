@@ -0,0 +1,301 @@
+"""
+Command-line tools for log files written by gouge.
+
+Run ``gouge --help`` (or ``python -m gouge --help``) for usage information.
+"""
+import argparse
+import logging
+import sys
+from datetime import datetime
+from typing import Any, List, Optional, TextIO, Tuple
+
+from gouge import binary
+from gouge.aggregate import LogTable
+from gouge.colourcli import Simple
+from gouge.parseable import (
+    CSVFileHandler,
+    CSVLog,
+    JSONLog,
+    XMLFileHandler,
+    XMLLog,
+)
+from gouge.readers import CSVLogReader
+
+#: Output formats supported by the ``convert`` command
+CONVERT_FORMATS = ("console", "csv", "jsonl", "xml")
+
+
+def parse_timestamp(value: str) -> float:
+    """
+    Convert a command-line timestamp to seconds since the epoch. Both plain
+    numbers and ISO-8601 dates (as understood by
+    :py:meth:`datetime.datetime.fromisoformat`) are accepted.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"{value!r} is neither a number nor an ISO-8601 timestamp"
+        ) from None
+
+
+def parse_level(value: str) -> int:
+    """
+    Convert a level name (like ``WARNING``) or number to a level number.
+    """
+    if value.isdigit():
+        return int(value)
+    level = logging.getLevelName(value.upper())
+    if not isinstance(level, int):
+        raise argparse.ArgumentTypeError(f"Unknown log level {value!r}")
+    return level
+
+
+def _stream_handler(
+    stream: TextIO, formatter: logging.Formatter
+) -> logging.Handler:
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(formatter)
+    return handler
+
+
+class _XMLStreamHandler(logging.StreamHandler):
+    """
+    Write :py:class:`~gouge.parseable.XMLLog` records wrapped in a root
+    element to a stream.
+    """
+
+    def __init__(self, stream: TextIO) -> None:
+        super().__init__(stream)
+        self.setFormatter(XMLLog())
+        stream.write(
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            f"<{XMLFileHandler.ROOT_TAG}>\n"
+        )
+
+    def close(self) -> None:
+        self.stream.write(f"</{XMLFileHandler.ROOT_TAG}>\n")
+        self.flush()
+        super().close()
+
+
+def make_handler(
+    fmt: str, output: Optional[str], stream: TextIO
+) -> logging.Handler:
+    """
+    Create a handler writing records in the format *fmt* to the file
+    *output*, or to *stream* if *output* is not set.
+    """
+    if output is None:
+        if fmt == "csv":
+            stream.write(CSVLog.render_rows([CSVLog.COLUMNS]))
+            return _stream_handler(stream, CSVLog())
+        if fmt == "xml":
+            return _XMLStreamHandler(stream)
+        if fmt == "jsonl":
+            return _stream_handler(stream, JSONLog())
+        colour = hasattr(stream, "isatty") and stream.isatty()
+        return _stream_handler(stream, Simple(show_exc=True, colour=colour))
+
+    if fmt == "csv":
+        return CSVFileHandler(output, mode="w")
+    if fmt == "xml":
+        return XMLFileHandler(output, mode="w")
+    handler = logging.FileHandler(output, mode="w", encoding="utf-8")
+    if fmt == "jsonl":
+        handler.setFormatter(JSONLog())
+    else:
+        handler.setFormatter(Simple(show_exc=True, colour=False))
+    return handler
+
+
+def is_binary_log(filename: str) -> bool:
+    """
+    Return whether *filename* is a binary log file (as written by
+    :py:class:`gouge.binary.BinaryFileHandler`).
+    """
+    with open(filename, "rb") as fptr:
+        return fptr.read(len(binary.MAGIC)) == binary.MAGIC
+
+
+def convert_command(args: argparse.Namespace) -> int:
+    filters = {
+        "min_level": args.level,
+        "logger": args.logger,
+        "start": args.start,
+        "end": args.end,
+    }
+    handler = make_handler(args.format, args.output, sys.stdout)
+    try:
+        if is_binary_log(args.filename):
+            binary.convert(args.filename, handler, **filters)
+        else:
+            for record in CSVLogReader(args.filename).records(**filters):
+                handler.handle(record)
+    finally:
+        handler.close()
+    return 0
+
+
+def parse_condition(value: str) -> Tuple[str, List[str]]:
+    """
+    Convert ``column=value1,value2`` to ``("column", ["value1", "value2"])``.
+    """
+    column, sep, values = value.partition("=")
+    if not sep or not column:
+        raise argparse.ArgumentTypeError(
+            f"Expected COLUMN=VALUE[,VALUE...] but got {value!r}"
+        )
+    return column, values.split(",")
+
+
+def _format_value(column: str, value: Any) -> str:
+    if column == "interval":
+        return datetime.fromtimestamp(value).isoformat(" ", "seconds")
+    return str(value)
+
+
+def aggregate_command(args: argparse.Namespace) -> int:
+    where = dict(args.where)
+    columns = list(args.by) + list(where)
+    if args.interval is not None:
+        columns.append("created")
+    try:
+        if is_binary_log(args.filename):
+            with binary.BinaryLogReader(args.filename) as reader:
+                table = LogTable.from_records(
+                    reader.records(start=args.start, end=args.end), columns
+                )
+        else:
+            table = LogTable.from_csv(
+                args.filename, columns, args.start, args.end
+            )
+        counts = table.count(args.by, args.interval, where)
+    except ValueError as exc:
+        print(f"gouge aggregate: {exc}", file=sys.stderr)
+        return 2
+
+    if args.top:
+        items = counts.most_common(args.top)
+    else:
+        items = sorted(counts.items())
+    header = (["interval"] if args.interval is not None else []) + args.by
+    lines = [header + ["count"]]
+    for key, count in items:
+        lines.append(
+            [_format_value(col, value) for col, value in zip(header, key)]
+            + [str(count)]
+        )
+    widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+    for line in lines:
+        cells = [cell.ljust(width) for cell, width in zip(line, widths)]
+        print("  ".join(cells + [line[-1].rjust(len("count"))]))
+    return 0
+
+
+def _add_filter_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--level",
+        type=parse_level,
+        default=logging.NOTSET,
+        help="Only include records with this level or higher.",
+    )
+    parser.add_argument(
+        "--logger",
+        help="Only include records of this logger and its descendants.",
+    )
+    parser.add_argument(
+        "--start",
+        type=parse_timestamp,
+        help="Only include records created at or after this time.",
+    )
+    parser.add_argument(
+        "--end",
+        type=parse_timestamp,
+        help="Only include records created before this time.",
+    )
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="gouge", description="Tools for log files written by gouge."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser(
+        "convert",
+        help="Convert a binary or CSV log file to a text format.",
+        description="Convert a binary or CSV log file to a text format.",
+    )
+    convert.add_argument("filename", help="The binary or CSV log file.")
+    convert.add_argument(
+        "-f",
+        "--format",
+        choices=CONVERT_FORMATS,
+        default="console",
+        help="The output format (default: %(default)s).",
+    )
+    convert.add_argument(
+        "-o",
+        "--output",
+        help="Write to this file instead of the standard output.",
+    )
+    _add_filter_arguments(convert)
+    convert.set_defaults(func=convert_command)
+
+    aggregate = commands.add_parser(
+        "aggregate",
+        help="Count log records by column values.",
+        description=(
+            "Count the records of a binary or CSV log file by the values of "
+            "one or more columns."
+        ),
+    )
+    aggregate.add_argument("filename", help="The binary or CSV log file.")
+    aggregate.add_argument(
+        "--by",
+        nargs="+",
+        default=[],
+        metavar="COLUMN",
+        help="Group by these columns (for example name levelname).",
+    )
+    aggregate.add_argument(
+        "--interval",
+        type=float,
+        help="Also group by creation time in buckets of this many seconds.",
+    )
+    aggregate.add_argument(
+        "--where",
+        type=parse_condition,
+        action="append",
+        default=[],
+        metavar="COLUMN=VALUE[,VALUE...]",
+        help="Only count records with one of the values in the column.",
+    )
+    aggregate.add_argument(
+        "--top",
+        type=int,
+        metavar="N",
+        help="Only show the N largest groups (ordered by count).",
+    )
+    aggregate.add_argument(
+        "--start",
+        type=parse_timestamp,
+        help="Only include records created at or after this time.",
+    )
+    aggregate.add_argument(
+        "--end",
+        type=parse_timestamp,
+        help="Only include records created before this time.",
+    )
+    aggregate.set_defaults(func=aggregate_command)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = make_parser().parse_args(argv)
+    return args.func(args)
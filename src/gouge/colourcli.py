@@ -2,17 +2,322 @@
 This module contains everything needed to emit colourful messages on the CLI
 """
 
+import builtins
 import logging
 import re
 import sys
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from itertools import chain
 from logging import Handler, LogRecord
+from operator import attrgetter
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Mapping, Optional
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Tuple,
+)
 
 import colorama as clr
 
+from gouge.cache import LRUCache
+from gouge.handlers import BLOCK, BackgroundHandler, buffer_handlers
+
 P_FILENAME = re.compile(r"File \"([^\"]+)\", line (\d+), in ([^\s]+)")
 
+#: Inclusive upper bounds of the level "buckets" used to pick an output
+#: template. ``ERROR`` gets a bucket of its own because the traceback colour
+#: changes at that level while the level colour already changes above
+#: ``WARNING``.
+LEVEL_BOUNDS = (
+    logging.DEBUG,
+    logging.INFO,
+    logging.WARNING,
+    logging.ERROR - 1,
+    logging.ERROR,
+)
+LEVEL_COLORS = (
+    clr.Style.BRIGHT + clr.Fore.BLACK,
+    clr.Fore.CYAN,
+    clr.Fore.YELLOW,
+    clr.Style.BRIGHT + clr.Fore.RED,
+    clr.Style.BRIGHT + clr.Fore.RED,
+    clr.Style.BRIGHT + clr.Fore.YELLOW + clr.Back.RED,
+)
+EXC_COLORS = (
+    "{f.WHITE}{s.DIM}",
+    "{f.WHITE}{s.DIM}",
+    "{f.WHITE}{s.DIM}",
+    "{f.WHITE}{s.DIM}",
+    "{f.RED}",
+    "{f.RED}",
+)
+
+
+class _NoColour:
+    """
+    Stand-in for :py:data:`colorama.Fore`, :py:data:`colorama.Back` and
+    :py:data:`colorama.Style` which yields an empty string for every colour.
+    """
+
+    def __getattr__(self, name: str) -> str:
+        return ""
+
+
+NO_COLOUR = _NoColour()
+
+#: Number of distinct tracebacks for which the coloured output is kept.
+TRACEBACK_CACHE_SIZE = 256
+
+Renderer = Callable[[LogRecord, str], str]
+#: Time converters which only depend on the whole seconds of a timestamp.
+#: Only for those can the rendered timestamps be reused.
+CACHEABLE_CONVERTERS = (time.localtime, time.gmtime)
+PreFormatter = Callable[[str], str]
+#: A pre-formatter receiving the record (see :py:func:`record_pre_formatter`)
+RecordPreFormatter = Callable[[LogRecord], Optional[str]]
+_BaseExceptionGroup = getattr(builtins, "BaseExceptionGroup", None)
+
+#: Only apply pre-formatters registered for the exact logger name.
+PF_EXACT = "exact"
+#: Apply pre-formatters of all ancestors, starting with the root.
+PF_PARENT_FIRST = "parent-first"
+#: Apply pre-formatters of all ancestors, starting with the logger itself.
+PF_CHILD_FIRST = "child-first"
+#: Only apply the pre-formatters of the closest registered ancestor (or the
+#: logger itself). A registration on a child overrides the parents.
+PF_NEAREST = "nearest"
+PF_LOOKUPS = (PF_EXACT, PF_PARENT_FIRST, PF_CHILD_FIRST, PF_NEAREST)
+
+
+@lru_cache(maxsize=1024)
+def is_local_path(filename: str, root: Path) -> bool:
+    """
+    Return whether the traceback *filename* is located below *root*.
+
+    Results are cached as the same files show up in tracebacks over and over
+    again.
+    """
+    return Path(filename).absolute().is_relative_to(root)
+
+
+def exc_fingerprint(exc_info: tuple) -> Optional[Hashable]:
+    """
+    Return a hashable value identifying the rendered traceback of *exc_info*.
+
+    Two exceptions with the same fingerprint produce the same traceback text.
+    The fingerprint covers the exception chain, the exception types and
+    messages and the code location of every frame. *None* is returned if no
+    reliable fingerprint can be computed (in which case the traceback should
+    not be cached).
+    """
+    exc_type, value, tb = exc_info
+    parts = []
+    seen = set()
+    while value is not None:
+        if id(value) in seen:
+            break
+        seen.add(id(value))
+        if _BaseExceptionGroup and isinstance(value, _BaseExceptionGroup):
+            return None
+        try:
+            message = str(value)
+        except Exception:  # pylint: disable=broad-except
+            return None
+        frames = []
+        while tb is not None:
+            frames.append((tb.tb_frame.f_code, tb.tb_lineno, tb.tb_lasti))
+            tb = tb.tb_next
+        parts.append(
+            (
+                exc_type,
+                message,
+                tuple(frames),
+                value.__suppress_context__,
+                tuple(getattr(value, "__notes__", ())),
+            )
+        )
+        if value.__cause__ is not None:
+            value = value.__cause__
+        elif value.__suppress_context__:
+            value = None
+        else:
+            value = value.__context__
+        if value is not None:
+            exc_type, tb = type(value), value.__traceback__
+    if not parts:
+        return None
+    return tuple(parts)
+
+
+def compile_template(
+    levelcolor: str,
+    show_threads: bool,
+    show_pid: bool,
+    exc_color: Optional[str],
+    colour: bool = True,
+) -> Renderer:
+    """
+    Create a render function for one combination of output options.
+
+    The returned callable takes a log-record (which must already have the
+    ``message`` and ``asctime`` attributes set) and the rendered traceback
+    text. It only reads the record attributes needed for the given options.
+
+    :param levelcolor: The ANSI sequence used for the level name.
+    :param show_threads: Whether to include the thread name.
+    :param show_pid: Whether to include the process ID.
+    :param exc_color: A template (like ``"{f.RED}"``) for the traceback
+        colour, or *None* if the output has no traceback.
+    :param colour: If *False*, the output contains no ANSI sequences at all
+        (*levelcolor* is ignored).
+    """
+    fore: Any = clr.Fore if colour else NO_COLOUR
+    style: Any = clr.Style if colour else NO_COLOUR
+    if not colour:
+        levelcolor = ""
+    fields: List[str] = []
+
+    def field(name: str, spec: str = "") -> str:
+        fields.append(name)
+        return "{%d%s}" % (len(fields) - 1, spec)
+
+    items = []
+    if show_pid:
+        items.append(
+            f"{style.BRIGHT}[PID: {field('process', ':<5')}]"
+            f"{style.RESET_ALL}"
+        )
+    if show_threads:
+        items.append(field("threadName", ":<10"))
+    items += [
+        f"{fore.GREEN}{field('asctime')}{style.RESET_ALL}",
+        f"{levelcolor}{field('levelname', ':<10')}{style.RESET_ALL}",
+        f"{style.BRIGHT}[{field('name')}]{style.RESET_ALL}",
+        field("message"),
+    ]
+    template = " ".join(items)
+    getter = attrgetter(*fields)
+
+    if exc_color is None:
+
+        def render(record: LogRecord, exc_text: str = "") -> str:
+            return template.format(*getter(record))
+
+    else:
+        exc_color = exc_color.format(f=fore, s=style)
+        template += f"\n{exc_color}{{{len(fields)}}}{style.RESET_ALL}"
+
+        def render(record: LogRecord, exc_text: str = "") -> str:
+            return template.format(*getter(record), exc_text)
+
+    return render
+
+
+def _isatty(stream: Any) -> bool:
+    try:
+        return bool(stream.isatty())
+    except Exception:  # pylint: disable=broad-except
+        return False
+
+
+def _unwrap_stream(stream: Any) -> Any:
+    """
+    Return the original stream if *stream* was wrapped by
+    :py:func:`colorama.init`. There is no need to have colorama scan the
+    output for ANSI sequences if we do not emit any.
+    """
+    initialise = clr.initialise
+    if stream is initialise.wrapped_stderr and initialise.orig_stderr:
+        return initialise.orig_stderr
+    if stream is initialise.wrapped_stdout and initialise.orig_stdout:
+        return initialise.orig_stdout
+    return stream
+
+
+def colour_only(pre_formatter: PreFormatter) -> PreFormatter:
+    """
+    Mark *pre_formatter* as only adding colours to the message. Such
+    pre-formatters are skipped when :py:class:`~.Simple` renders without
+    colours.
+    """
+    pre_formatter.colour_only = True  # type: ignore
+    return pre_formatter
+
+
+def record_pre_formatter(pre_formatter: RecordPreFormatter) -> Any:
+    """
+    Mark *pre_formatter* as taking the :py:class:`logging.LogRecord` instead
+    of the message. It renders the message from ``record.msg`` and
+    ``record.args`` itself, which avoids parsing the rendered message again.
+    If it returns *None*, the message is rendered as usual.
+
+    The record pre-formatters of a logger run before all other
+    pre-formatters. The first one returning a message wins.
+    """
+    pre_formatter.record_aware = True  # type: ignore
+    return pre_formatter
+
+
+class PreFormatterRegistry(MutableMapping[str, List[PreFormatter]]):
+    """
+    A mapping from logger names to pre-formatters which calls *on_change*
+    whenever an entry is added, replaced or removed.
+
+    The registry is a view on *data*, which is not copied. Changes made
+    through the registry are visible in *data* and vice versa.
+
+    .. note::
+        With a hierarchical :py:attr:`Simple.pre_formatter_lookup`,
+        modifying *data* directly or one of the lists in-place cannot be
+        detected. Use :py:meth:`Simple.add_pre_formatter` and
+        :py:meth:`Simple.remove_pre_formatter` instead, or call
+        :py:meth:`Simple.clear_pre_formatter_cache` afterwards.
+    """
+
+    def __init__(
+        self,
+        data: Optional[MutableMapping[str, List[PreFormatter]]] = None,
+        on_change: Callable[[], None] = lambda: None,
+    ) -> None:
+        self.data = {} if data is None else data
+        self.on_change = on_change
+
+    def __getitem__(self, key: str) -> List[PreFormatter]:
+        return self.data[key]
+
+    def __setitem__(self, key: str, value: List[PreFormatter]) -> None:
+        self.data[key] = value
+        self.on_change()
+
+    def __delitem__(self, key: str) -> None:
+        del self.data[key]
+        self.on_change()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.data
+
+    def __repr__(self) -> str:
+        return f"PreFormatterRegistry({self.data!r})"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
 
 class Simple(logging.Formatter):
     """
@@ -20,6 +325,16 @@ class Simple(logging.Formatter):
 
     :params show_threads: Whether to display thread names or not.
     :params show_exc: Whether to display tracebacks or not.
+    :params pre_formatters: A mapping from logger names to a list of functions
+        which modify the message before it is formatted.
+    :params pre_formatter_lookup: How *pre_formatters* are looked up. By
+        default (:py:data:`PF_EXACT`) only the pre-formatters of the exact
+        logger name are used. With :py:data:`PF_PARENT_FIRST`,
+        :py:data:`PF_CHILD_FIRST` and :py:data:`PF_NEAREST` pre-formatters
+        registered for a parent logger also apply to its descendants (an
+        empty name applies to all loggers).
+    :params colour: Whether to emit ANSI colour sequences. See
+        :py:attr:`colour`.
 
     .. note:: This formatter *suppresses* tracebacks by default! Remember that
         is is meant to give a concise, readable output. If you need to see
@@ -27,7 +342,14 @@ class Simple(logging.Formatter):
         *show_exc*.
     """
 
-    pre_formatters: Dict[str, List[Callable[[str], str]]]
+    _pre_formatters: PreFormatterRegistry
+    _pre_formatter_cache: Dict[
+        str, Tuple[Tuple[RecordPreFormatter, ...], Tuple[PreFormatter, ...]]
+    ]
+    _renderers: Dict[Tuple[int, bool, bool, bool], Renderer]
+    _exc_colors: List[str]
+    _exc_cache: LRUCache[Tuple[str, str]]
+    _time_cache: Tuple[int, str, str]
 
     @staticmethod
     def basicConfig(
@@ -36,6 +358,11 @@ class Simple(logging.Formatter):
         force_styling: bool = False,
         show_pid: bool = False,
         highlighted_path: Optional[Path] = None,
+        colour: Optional[bool] = None,
+        buffered: bool = False,
+        async_mode: bool = False,
+        queue_size: int = 10000,
+        overflow: str = BLOCK,
         **kwargs: Any,
     ) -> List[Handler]:
         """
@@ -53,9 +380,25 @@ class Simple(logging.Formatter):
         After returning from :py:func:`logging.basicConfig`, it will fetch the
         *stderr* and *stdout* handlers and replace the formatter.
 
+        By default (*colour* is *None*), colours are only used for streams
+        connected to a terminal or if *force_styling* is set. Other streams
+        get a formatter rendering plain text, which is cheaper than emitting
+        ANSI sequences and stripping them again. Set *colour* to *True* or
+        *False* to force either mode.
+
         The function also returns a list of all handlers which have been
         modified. This is useful if you want to modify the handlers any further
         (for example using :py:class:`~gouge.filters.ShiftingFilter`).
+
+        If *buffered* is set, the modified handlers are replaced by
+        :py:class:`~gouge.handlers.BufferedStreamHandler` instances which
+        write the output in larger chunks.
+
+        If *async_mode* is set, the modified handlers are moved behind a
+        :py:class:`~gouge.handlers.BackgroundHandler` so formatting and
+        writing happens on a dedicated thread. *queue_size* and *overflow*
+        are passed on to the background handler. The returned list still
+        contains the stream handlers (now running on the writer thread).
         """
         clr.init(strip=(False if force_styling else None))
         logging.basicConfig(**kwargs)
@@ -70,15 +413,37 @@ class Simple(logging.Formatter):
             if stream_name not in ("<stderr>", "<stdout>"):
                 continue
 
+            if colour is None:
+                use_colour = force_styling or _isatty(stream)
+            else:
+                use_colour = colour
+            if not use_colour:
+                original = _unwrap_stream(stream)
+                if original is not stream and isinstance(
+                    handler, logging.StreamHandler
+                ):
+                    handler.setStream(original)
+
             handler.setFormatter(
                 Simple(
                     show_exc=show_exc,
                     show_threads=show_threads,
                     show_pid=show_pid,
                     highlighted_path=highlighted_path,
+                    colour=use_colour,
                 )
             )
             output.append(handler)
+
+        if buffered:
+            output = buffer_handlers(root, output)
+
+        if async_mode and output:
+            for handler in output:
+                root.removeHandler(handler)
+            root.addHandler(
+                BackgroundHandler(output, maxsize=queue_size, overflow=overflow)
+            )
         return output
 
     def __init__(
@@ -93,8 +458,12 @@ class Simple(logging.Formatter):
         show_threads: bool = False,
         force_styling: bool = False,
         show_pid: bool = False,
-        pre_formatters: Optional[Dict[str, List[Callable[[str], str]]]] = None,
+        pre_formatters: Optional[
+            MutableMapping[str, List[PreFormatter]]
+        ] = None,
         highlighted_path: Optional[Path] = None,
+        pre_formatter_lookup: str = PF_EXACT,
+        colour: bool = True,
     ):
         python_310_args = {"defaults": defaults, "validate": validate}
         if sys.version_info < (3, 10):
@@ -106,90 +475,325 @@ class Simple(logging.Formatter):
         self.show_exc = show_exc
         self.force_styling = force_styling
         self.show_pid = show_pid
-        self.pre_formatters = pre_formatters or {}
+        if pre_formatter_lookup not in PF_LOOKUPS:
+            raise ValueError(
+                f"Unknown pre-formatter lookup {pre_formatter_lookup!r}. "
+                f"Expected one of {PF_LOOKUPS!r}"
+            )
+        self.pre_formatter_lookup = pre_formatter_lookup
+        self._colour = colour
+        self.pre_formatters = {} if pre_formatters is None else pre_formatters
         if (Path.cwd() / "src").exists():
             self.highlighted_path = (Path.cwd() / "src").absolute()
         elif highlighted_path is not None:
             self.highlighted_path = (highlighted_path).absolute()
         else:
             self.highlighted_path = highlighted_path
+        self._compile_renderers()
+        self._exc_cache = LRUCache(TRACEBACK_CACHE_SIZE)
+        self._time_cache = (-1, "", "")
 
     def format(self, record: LogRecord) -> str:
-        if record.levelno <= logging.DEBUG:
-            colorize = clr.Style.BRIGHT + clr.Fore.BLACK
-        elif record.levelno <= logging.INFO:
-            colorize = clr.Fore.CYAN
-        elif record.levelno <= logging.WARNING:
-            colorize = clr.Fore.YELLOW
-        elif record.levelno <= logging.ERROR:
-            colorize = clr.Style.BRIGHT + clr.Fore.RED
-        else:
-            colorize = clr.Style.BRIGHT + clr.Fore.YELLOW + clr.Back.RED
+        bucket = bisect_left(LEVEL_BOUNDS, record.levelno)
 
-        message = record.getMessage()
-        for pre_formatter in self.pre_formatters.get(record.name, []):
+        if self.pre_formatter_lookup == PF_EXACT:
+            # The registered list is used directly (not cached), so in-place
+            # modifications of the list take effect immediately.
+            (
+                record_pre_formatters,
+                pre_formatters,
+            ) = self._split_pre_formatters(
+                self._pre_formatters.get(record.name, ())
+            )
+        else:
+            try:
+                (
+                    record_pre_formatters,
+                    pre_formatters,
+                ) = self._pre_formatter_cache[record.name]
+            except KeyError:
+                (
+                    record_pre_formatters,
+                    pre_formatters,
+                ) = self._resolve_pre_formatters(record.name)
+                self._pre_formatter_cache[record.name] = (
+                    record_pre_formatters,
+                    pre_formatters,
+                )
+        message = None
+        for render in record_pre_formatters:
+            message = render(record)
+            if message is not None:
+                break
+        if message is None:
+            message = record.getMessage()
+        for pre_formatter in pre_formatters:
             message = pre_formatter(message)
         record.message = message
         record.asctime = self.formatTime(record, self.datefmt or "")
 
-        message_items = [
-            "{f.GREEN}{asctime}{s.RESET_ALL}",
-            "{levelcolor}{levelname:<10}{s.RESET_ALL}",
-            "{s.BRIGHT}[{name}]{s.RESET_ALL}",
-            "{message}",
+        has_exc = False
+        exc_text = ""
+        if self.show_exc and (record.exc_info or record.exc_text):
+            has_exc = True
+            exc_text = self._coloured_exception(
+                record, self._exc_colors[bucket]
+            )
+
+        render = self._renderers[
+            (bucket, bool(self.show_threads), bool(self.show_pid), has_exc)
         ]
-        if self.show_threads:
-            message_items.insert(0, "{threadName:<10}")
+        return render(record, exc_text)
 
-        if self.show_pid:
-            message_items.insert(
-                0, "{s.BRIGHT}[PID: {process:<5}]{s.RESET_ALL}"
+    def _compile_renderers(self) -> None:
+        fore, style = (
+            (clr.Fore, clr.Style) if self._colour else (NO_COLOUR,) * 2
+        )
+        self._exc_colors = [
+            exc_color.format(f=fore, s=style) for exc_color in EXC_COLORS
+        ]
+        self._renderers = {
+            (bucket, threads, pid, has_exc): compile_template(
+                levelcolor,
+                threads,
+                pid,
+                EXC_COLORS[bucket] if has_exc else None,
+                self._colour,
             )
+            for bucket, levelcolor in enumerate(LEVEL_COLORS)
+            for threads in (False, True)
+            for pid in (False, True)
+            for has_exc in (False, True)
+        }
 
-        message_template = " ".join(message_items)
-
-        if self.show_exc:
-            if record.exc_info:
-                # Cache the traceback text to avoid converting it multiple times
-                # (it's constant anyway)
-                exc_text = getattr(record, "exc_text", "")
-                if not exc_text:
-                    record.exc_text = self.formatException(record.exc_info, "")
-
-            exc_text = getattr(record, "exc_text", "")
-            if exc_text:
-                exc_color = (
-                    "{f.RED}"
-                    if record.levelno >= logging.ERROR
-                    else "{f.WHITE}{s.DIM}"
-                )
-                message_template += f"\n{exc_color}"
-                message_template += self.formatException(
-                    record.exc_info, exc_color
-                )
-                message_template += "{s.RESET_ALL}"
+    @property
+    def colour(self) -> bool:
+        """
+        Whether the output contains ANSI colour sequences. If this is *False*,
+        no escape sequences are emitted at all, and pre-formatters marked
+        with :py:func:`~.colour_only` are skipped.
+        """
+        return self._colour
+
+    @colour.setter
+    def colour(self, value: bool) -> None:
+        self._colour = value
+        self._compile_renderers()
+        self.clear_pre_formatter_cache()
 
-        return message_template.format(
-            levelcolor=colorize, f=clr.Fore, s=clr.Style, **vars(record)
+    @property
+    def pre_formatters(self) -> PreFormatterRegistry:
+        """
+        The registered pre-formatters, keyed by logger name.
+        """
+        return self._pre_formatters
+
+    @pre_formatters.setter
+    def pre_formatters(
+        self, value: MutableMapping[str, List[PreFormatter]]
+    ) -> None:
+        self._pre_formatters = PreFormatterRegistry(
+            value, self.clear_pre_formatter_cache
         )
+        self.clear_pre_formatter_cache()
 
-    def formatException(self, exc_info: tuple, exc_color: str) -> str:
-        exc_text = super().formatException(exc_info)
-        if "{" in exc_text or "}" in exc_text:
-            exc_text = exc_text.replace("{", "{{").replace("}", "}}")
-        if self.highlighted_path is None:
+    def add_pre_formatter(
+        self, logger_name: str, pre_formatter: PreFormatter
+    ) -> None:
+        """
+        Append *pre_formatter* to the pre-formatters of *logger_name*.
+        """
+        existing = self._pre_formatters.get(logger_name, [])
+        self._pre_formatters[logger_name] = [*existing, pre_formatter]
+
+    def remove_pre_formatter(
+        self, logger_name: str, pre_formatter: PreFormatter
+    ) -> None:
+        """
+        Remove *pre_formatter* from the pre-formatters of *logger_name*.
+
+        :raises ValueError: If the pre-formatter is not registered.
+        """
+        remaining = list(self._pre_formatters.get(logger_name, []))
+        remaining.remove(pre_formatter)
+        self._pre_formatters[logger_name] = remaining
+
+    def clear_pre_formatter_cache(self) -> None:
+        """
+        Forget which pre-formatters apply to which logger. This is done
+        automatically when :py:attr:`pre_formatters` is modified.
+        """
+        self._pre_formatter_cache = {}
+
+    def _resolve_pre_formatters(
+        self, name: str
+    ) -> Tuple[Tuple[RecordPreFormatter, ...], Tuple[PreFormatter, ...]]:
+        """
+        Collect the record pre-formatters and the other pre-formatters for
+        the logger *name* according to :py:attr:`pre_formatter_lookup` and
+        :py:attr:`colour`.
+        """
+        registry = self._pre_formatters
+        if self.pre_formatter_lookup == PF_EXACT:
+            candidates = [name]
+        else:
+            parts = name.split(".")
+            candidates = [""] + [
+                ".".join(parts[:index]) for index in range(1, len(parts) + 1)
+            ]
+        found = [registry[key] for key in candidates if key in registry]
+        if self.pre_formatter_lookup == PF_NEAREST:
+            found = found[-1:]
+        elif self.pre_formatter_lookup == PF_CHILD_FIRST:
+            found.reverse()
+        return self._split_pre_formatters(chain.from_iterable(found))
+
+    def _split_pre_formatters(
+        self, pre_formatters: Iterable[PreFormatter]
+    ) -> Tuple[Tuple[RecordPreFormatter, ...], Tuple[PreFormatter, ...]]:
+        """
+        Split *pre_formatters* into record pre-formatters and the other
+        pre-formatters, skipping colour-only ones if :py:attr:`colour` is
+        disabled.
+        """
+        selected = [
+            pre_formatter
+            for pre_formatter in pre_formatters
+            if self._colour or not getattr(pre_formatter, "colour_only", False)
+        ]
+        if not selected:
+            return (), ()
+        return (
+            tuple(
+                pre_formatter
+                for pre_formatter in selected
+                if getattr(pre_formatter, "record_aware", False)
+            ),
+            tuple(
+                pre_formatter
+                for pre_formatter in selected
+                if not getattr(pre_formatter, "record_aware", False)
+            ),
+        )
+
+    def formatTime(
+        self, record: LogRecord, datefmt: Optional[str] = None
+    ) -> str:
+        """
+        Same as :py:meth:`logging.Formatter.formatTime` but reuses the
+        rendered timestamp for all records logged within the same second.
+
+        Formats containing ``%f`` and custom :py:attr:`converter` functions
+        are not cached.
+        """
+        if self.converter not in CACHEABLE_CONVERTERS or (
+            datefmt and "%f" in datefmt
+        ):
+            return super().formatTime(record, datefmt)
+
+        second = int(record.created)
+        time_format = datefmt or self.default_time_format
+        # The cache is replaced as a whole (never modified in place) so that
+        # concurrent threads always see a consistent entry.
+        cached = self._time_cache
+        if cached[0] != second or cached[1] != time_format:
+            rendered = time.strftime(
+                time_format, self.converter(record.created)
+            )
+            cached = (second, time_format, rendered)
+            self._time_cache = cached
+
+        if datefmt or not self.default_msec_format:
+            return cached[2]
+        return self.default_msec_format % (cached[2], record.msecs)
+
+    def _coloured_exception(self, record: LogRecord, exc_color: str) -> str:
+        """
+        Return the traceback of *record*, highlighted with *exc_color* (an
+        ANSI sequence).
+
+        The traceback is rendered at most once and the result is cached by
+        the exception fingerprint. As a side-effect, ``record.exc_text`` is
+        set if it was empty.
+
+        If a subclass overrides :py:meth:`formatException`, it is called for
+        every record instead and nothing is cached.
+        """
+        if record.exc_info and (
+            type(self).formatException is not Simple.formatException
+            or "formatException" in vars(self)
+        ):
+            return self._custom_exception(record, exc_color)
+        if record.exc_info:
+            key = exc_fingerprint(record.exc_info)
+        else:
+            key = ("exc_text", record.exc_text)
+        if key is not None:
+            key = (key, exc_color, self.highlighted_path)
+            cached = self._exc_cache.get(key)
+            if cached is not None:
+                plain, coloured = cached
+                if not record.exc_text:
+                    record.exc_text = plain
+                return coloured
+
+        if record.exc_info:
+            plain = logging.Formatter.formatException(self, record.exc_info)
+        else:
+            plain = record.exc_text or ""
+        if not record.exc_text:
+            # Cache the traceback text to avoid converting it multiple times
+            # (it's constant anyway)
+            record.exc_text = plain
+        coloured = self._highlight_local_filenames(plain, exc_color)
+        if key is not None:
+            self._exc_cache.put(key, (plain, coloured))
+        return coloured
+
+    def _custom_exception(self, record: LogRecord, exc_color: str) -> str:
+        """
+        Same as :py:meth:`_coloured_exception`, but rendered by an overridden
+        :py:meth:`formatException`.
+        """
+        fore, style = (
+            (clr.Fore, clr.Style) if self._colour else (NO_COLOUR,) * 2
+        )
+        if not record.exc_text:
+            record.exc_text = self.formatException(
+                record.exc_info, ""  # type: ignore
+            ).format(f=NO_COLOUR, s=NO_COLOUR)
+        return self.formatException(
+            record.exc_info, exc_color  # type: ignore
+        ).format(f=fore, s=style)
+
+    def _highlight_local_filenames(self, exc_text: str, exc_color: str) -> str:
+        """
+        Highlight all filenames in *exc_text* which are located below
+        :py:attr:`highlighted_path`. *exc_color* is the colour which is
+        restored after each filename.
+        """
+        if self.highlighted_path is None or not self._colour:
             return exc_text
 
         pth = self.highlighted_path
 
         def highlight_local_filenames(match: re.Match) -> str:
-            filename = Path(match.group(1)).absolute()
-            if filename.is_relative_to(pth):
+            if is_local_path(match.group(1), pth):
                 return match.group(0).replace(
                     match.group(1),
                     f"{clr.Fore.YELLOW}{match.group(1)}{exc_color}",
                 )
             return match.group(0)
 
-        exc_text = P_FILENAME.sub(highlight_local_filenames, exc_text)
-        return exc_text
+        return P_FILENAME.sub(highlight_local_filenames, exc_text)
+
+    def formatException(self, exc_info: tuple, exc_color: str) -> str:
+        """
+        Return the traceback of *exc_info* as a :py:meth:`str.format`
+        template. Local filenames are highlighted and followed by *exc_color*
+        which may itself be a template (like ``"{f.RED}"``).
+        """
+        exc_text = super().formatException(exc_info)
+        if "{" in exc_text or "}" in exc_text:
+            exc_text = exc_text.replace("{", "{{").replace("}", "}}")
+        return self._highlight_local_filenames(exc_text, exc_color)
@@ -2,9 +2,239 @@
 This module contains generally useful filters.
 """
 import logging
-from typing import Set
+import random
+import time
+import weakref
+from functools import wraps
+from threading import Lock, RLock
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 from warnings import warn
 
+from gouge.cache import LRUCache
+
+
+def is_descendant(name: str, parent: str) -> bool:
+    """
+    Return whether the logger *name* is *parent* itself or one of its
+    descendants. An empty *parent* matches every logger.
+
+    Unlike ``name.startswith(parent)``, ``"foobar"`` is not a descendant of
+    ``"foo"``.
+    """
+    return (
+        not parent
+        or name == parent
+        or (name.startswith(parent) and name[len(parent)] == ".")
+    )
+
+
+def _ancestors(name: str) -> Iterator[str]:
+    """
+    Yield *name*, all its ancestors and finally ``""``.
+    """
+    while name:
+        yield name
+        name = name.rpartition(".")[0]
+    yield ""
+
+
+class LoggerIndex:
+    """
+    A hierarchical index of the existing loggers, kept up to date by hooking
+    into the creation of loggers.
+
+    The index allows finding all descendants of a logger without scanning
+    every known logger. It also runs callbacks when a logger below a
+    registered parent is created.
+
+    The hook is installed when the index is first used. It wraps
+    ``logging.Logger.manager.getLogger`` (used by :py:func:`logging.getLogger`
+    and :py:meth:`logging.Logger.getChild`).
+    """
+
+    def __init__(self) -> None:
+        self._lock = RLock()
+        self._children: Dict[str, Set[str]] = {}
+        self._callbacks: Dict[str, List[Callable[[logging.Logger], None]]] = {}
+        self._installed = False
+
+    def _install(self) -> None:
+        with self._lock:
+            if self._installed:
+                return
+            manager = logging.Logger.manager
+            original = manager.getLogger
+
+            def getLogger(name: str) -> logging.Logger:
+                existing = manager.loggerDict.get(name)
+                logger = original(name)
+                if existing is None or isinstance(
+                    existing, logging.PlaceHolder
+                ):
+                    self._created(logger)
+                return logger
+
+            manager.getLogger = getLogger  # type: ignore
+            for name, logger in list(manager.loggerDict.items()):
+                if not isinstance(logger, logging.PlaceHolder):
+                    self._add(name)
+            self._installed = True
+
+    def _add(self, name: str) -> None:
+        child = name
+        for parent in _ancestors(name.rpartition(".")[0]) if name else ():
+            children = self._children.setdefault(parent, set())
+            if child in children:
+                return
+            children.add(child)
+            child = parent
+
+    def _created(self, logger: logging.Logger) -> None:
+        with self._lock:
+            self._add(logger.name)
+            callbacks = [
+                callback
+                for parent in _ancestors(logger.name)
+                for callback in self._callbacks.get(parent, ())
+            ]
+        for callback in callbacks:
+            callback(logger)
+
+    def descendants(self, parent: str) -> Iterator[logging.Logger]:
+        """
+        Yield the existing logger *parent* and all its existing descendants.
+        """
+        self._install()
+        loggers = logging.Logger.manager.loggerDict
+        with self._lock:
+            pending = [parent]
+            names = []
+            while pending:
+                name = pending.pop()
+                names.append(name)
+                pending.extend(self._children.get(name, ()))
+        for name in names:
+            logger = loggers.get(name)
+            if isinstance(logger, logging.Logger):
+                yield logger
+
+    def follow(
+        self, parent: str, callback: Callable[[logging.Logger], None]
+    ) -> None:
+        """
+        Call *callback* for each logger created below (or as) *parent* from
+        now on.
+        """
+        self._install()
+        with self._lock:
+            self._callbacks.setdefault(parent, []).append(callback)
+
+    def unfollow(
+        self, parent: str, callback: Callable[[logging.Logger], None]
+    ) -> None:
+        """
+        Remove a callback registered with :py:meth:`~.follow`.
+        """
+        with self._lock:
+            callbacks = self._callbacks.get(parent, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._callbacks.pop(parent, None)
+
+
+#: The index used by :py:meth:`ShiftingFilter.inject`
+LOGGER_INDEX = LoggerIndex()
+
+
+_STANDARD_LEVELS = (
+    logging.NOTSET,
+    logging.DEBUG,
+    logging.INFO,
+    logging.WARNING,
+    logging.ERROR,
+    logging.CRITICAL,
+)
+
+
+class LevelTable(Dict[int, Tuple[int, str]]):
+    """
+    A mapping from a level number to the shifted level number and its name.
+
+    Entries for the standard levels are computed up front, others when they
+    are first looked up. All tables are refreshed when a level name is
+    changed with :py:func:`logging.addLevelName`.
+
+    :param offset: The value added to the level number.
+    :param min_level: The lowest resulting level number.
+    :param max_level: The highest resulting level number.
+    """
+
+    def __init__(self, offset: int, min_level: int, max_level: int) -> None:
+        super().__init__()
+        self.offset = offset
+        self.min_level = min_level
+        self.max_level = max_level
+        self.refresh()
+        _install_level_hook()
+        _LEVEL_TABLES.add(self)
+
+    def __missing__(self, levelno: int) -> Tuple[int, str]:
+        new_levelno = min(
+            self.max_level, max(self.min_level, levelno + self.offset)
+        )
+        value = self[levelno] = (new_levelno, logging.getLevelName(new_levelno))
+        return value
+
+    def __hash__(self) -> int:  # type: ignore
+        # Needed to store tables in a weak set
+        return id(self)
+
+    def __eq__(self, other: object) -> bool:
+        return self is other
+
+    def refresh(self) -> None:
+        """
+        Recompute the entries of the standard levels and forget all others.
+        """
+        self.clear()
+        for levelno in _STANDARD_LEVELS:
+            self.__missing__(levelno)
+
+
+_LEVEL_TABLES: "weakref.WeakSet[LevelTable]" = weakref.WeakSet()
+
+
+def _install_level_hook() -> None:
+    """
+    Wrap :py:func:`logging.addLevelName` to refresh all level tables when
+    level names change.
+    """
+    original = logging.addLevelName
+    if getattr(original, "refreshes_level_tables", False):
+        return
+
+    @wraps(original)
+    def addLevelName(level: int, levelName: str) -> None:
+        original(level, levelName)
+        for table in list(_LEVEL_TABLES):
+            table.refresh()
+
+    addLevelName.refreshes_level_tables = True  # type: ignore
+    logging.addLevelName = addLevelName
+
 
 class ShiftingFilter(logging.Filter):
     """
@@ -57,46 +287,96 @@ class ShiftingFilter(logging.Filter):
                 SyntaxWarning,
             )
 
-        if offset:
-            self.offset = offset
-        else:
-            self.offset = 10 * shift_by
-        self.logger = logger
-        self.max = max
-        self.min = min
+        self._offset = offset or 10 * shift_by
+        self._logger = logger
+        self._max = max
+        self._min = min
+        self._reset()
         self.injected_loggers: Set[logging.Logger] = set()
+        self.followed: Set[str] = set()
+
+    def _reset(self) -> None:
+        # Both the shifted levels and the match decisions are cached. They
+        # are recomputed if the configuration changes.
+        self._levels = LevelTable(self._offset, self._min, self._max)
+        self._matches: Dict[str, bool] = {}
+
+    @property
+    def offset(self) -> int:
+        return self._offset
+
+    @offset.setter
+    def offset(self, value: int) -> None:
+        self._offset = value
+        self._reset()
 
-    def inject(self, parent: str) -> None:
+    @property
+    def logger(self) -> str:
+        return self._logger
+
+    @logger.setter
+    def logger(self, value: str) -> None:
+        self._logger = value
+        self._reset()
+
+    @property
+    def min(self) -> int:
+        return self._min
+
+    @min.setter
+    def min(self, value: int) -> None:
+        self._min = value
+        self._reset()
+
+    @property
+    def max(self) -> int:
+        return self._max
+
+    @max.setter
+    def max(self, value: int) -> None:
+        self._max = value
+        self._reset()
+
+    def inject(
+        self, parent: Union[str, logging.Logger], follow: bool = False
+    ) -> None:
         """
-        Loop over each known logger and attach this filter.
+        Attach this filter to the logger *parent* and all its descendants.
 
         You can remove the attached filters again using
         :py:meth:`~.ShiftingFilter.cleanup`.
 
         .. note::
-            This will only attach the filter to loggers which already exist! If
-            you see that something is not working as expected, make sure the
-            logger exists before calling this! You can look at all the existing
-            loggers using ``logging.Logger.manager.loggerDict``.
+            By default, this will only attach the filter to loggers which
+            already exist! Set *follow* to also attach it to descendants
+            created later on (for example by plugins which are loaded
+            lazily).
 
         :param parent: Attach the filter to this and all descendant loggers.
+        :param follow: Also attach the filter to loggers created later.
         """
         if not isinstance(parent, str):
             parent = parent.name
-        items = logging.Logger.manager.loggerDict.items()
-        for name, logger in items:
-            if name.startswith(parent) and not isinstance(
-                logger, logging.PlaceHolder
-            ):
-                logger.addFilter(self)
-                self.injected_loggers.add(logger)
+        for logger in LOGGER_INDEX.descendants(parent):
+            self._attach(logger)
+        if follow:
+            LOGGER_INDEX.follow(parent, self._attach)
+            self.followed.add(parent)
+
+    def _attach(self, logger: logging.Logger) -> None:
+        logger.addFilter(self)
+        self.injected_loggers.add(logger)
 
     def cleanup(self) -> None:
         """
         Remove all filters applied via :py:meth:`~.ShiftingFilter.inject`.
         """
+        for parent in self.followed:
+            LOGGER_INDEX.unfollow(parent, self._attach)
+        self.followed.clear()
         for logger in self.injected_loggers:
             logger.removeFilter(self)
+        self.injected_loggers.clear()
 
     def filter(self, record: logging.LogRecord) -> bool:
         """
@@ -105,9 +385,386 @@ class ShiftingFilter(logging.Filter):
 
         See :py:meth:`logging.Filter.filter`
         """
-        if record.name.startswith(self.logger):
-            new_value = record.levelno + self.offset
-            new_levelno = min(self.max, max(self.min, new_value))
-            record.levelname = logging.getLevelName(new_levelno)
-            record.levelno = new_levelno
+        try:
+            matches = self._matches[record.name]
+        except KeyError:
+            matches = is_descendant(record.name, self._logger)
+            self._matches[record.name] = matches
+        if matches:
+            record.levelno, record.levelname = self._levels[record.levelno]
+        return True
+
+
+class ShiftRule:
+    """
+    A level shift for one logger hierarchy, used by :py:class:`ShiftingRules`.
+
+    :param logger: The rule applies to this logger and its descendants. An
+        empty string is the root logger.
+    :param offset: The value added to the level number.
+    :param min: Don't shift below this level.
+    :param max: Don't shift above this level.
+    """
+
+    def __init__(
+        self,
+        logger: str,
+        offset: int,
+        min: int = logging.NOTSET,
+        max: int = logging.CRITICAL,
+    ) -> None:
+        self.logger = logger
+        self.offset = offset
+        self.min = min
+        self.max = max
+        self.levels = LevelTable(offset, min, max)
+
+    def __repr__(self) -> str:
+        return (
+            f"ShiftRule({self.logger!r}, {self.offset!r}, "
+            f"min={self.min!r}, max={self.max!r})"
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ShiftRule):
+            return NotImplemented
+        return (self.logger, self.offset, self.min, self.max) == (
+            other.logger,
+            other.offset,
+            other.min,
+            other.max,
+        )
+
+    @staticmethod
+    def from_config(
+        logger: str, config: Union[int, Mapping[str, Union[int, str]]]
+    ) -> "ShiftRule":
+        """
+        Create a rule from a configuration value. The value is either the
+        number of levels to shift or a dictionary with the keys ``shift_by``
+        or ``offset`` and optionally ``min`` and ``max``. Levels may be given
+        by name::
+
+            ShiftRule.from_config("urllib3", {"shift_by": -2, "min": "DEBUG"})
+        """
+        if isinstance(config, int):
+            return ShiftRule(logger, 10 * config)
+        unknown = set(config) - {"shift_by", "offset", "min", "max"}
+        if unknown:
+            raise ValueError(
+                f"Unknown keys for the rule of {logger!r}: "
+                f"{', '.join(sorted(unknown))}"
+            )
+        offset = config.get("offset") or 10 * int(config.get("shift_by", 0))
+        return ShiftRule(
+            logger,
+            int(offset),
+            _level(config.get("min", logging.NOTSET)),
+            _level(config.get("max", logging.CRITICAL)),
+        )
+
+
+def _level(value: Union[int, str]) -> int:
+    """
+    Convert a level name or number to a level number.
+    """
+    if isinstance(value, int):
+        return value
+    levelno = logging.getLevelName(value.upper())
+    if not isinstance(levelno, int):
+        raise ValueError(f"Unknown level: {value!r}")
+    return levelno
+
+
+class _RuleNode:
+    """
+    A node of the logger name trie used by :py:class:`ShiftingRules`.
+    """
+
+    __slots__ = ("children", "rule")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, _RuleNode] = {}
+        self.rule: Optional[ShiftRule] = None
+
+
+class _CompiledRules:
+    """
+    An immutable rule trie together with the rules resolved so far for each
+    logger name.
+    """
+
+    def __init__(self, rules: Iterable[ShiftRule]) -> None:
+        self.rules = list(rules)
+        self.root = _RuleNode()
+        for rule in self.rules:
+            node = self.root
+            if rule.logger:
+                for part in rule.logger.split("."):
+                    node = node.children.setdefault(part, _RuleNode())
+            node.rule = rule
+        self.resolved: Dict[str, Optional[LevelTable]] = {}
+
+    def resolve(self, name: str) -> Optional[LevelTable]:
+        """
+        Return the level table of the most specific rule for the logger
+        *name*, or *None* if no rule applies.
+        """
+        node = self.root
+        rule = node.rule
+        for part in name.split("."):
+            child = node.children.get(part)
+            if child is None:
+                break
+            node = child
+            if node.rule is not None:
+                rule = node.rule
+        levels = None if rule is None else rule.levels
+        self.resolved[name] = levels
+        return levels
+
+
+class ShiftingRules(logging.Filter):
+    """
+    Shift the levels of many logger hierarchies with a single filter.
+
+    This does the same as stacking one :py:class:`ShiftingFilter` per
+    library, but each record is only looked up once: the rules are stored
+    in a tree of logger name parts and the most specific rule for a logger
+    wins. The result of the lookup is cached per logger name.
+
+    The rules are either a mapping from logger names to configuration
+    values (see :py:meth:`ShiftRule.from_config`) or a sequence of
+    :py:class:`ShiftRule` instances::
+
+        ShiftingRules({
+            "sqlalchemy": -1,
+            "urllib3": {"shift_by": -2, "min": "DEBUG"},
+            "app.audit": 1,
+        })
+
+    This is also the form used with :py:func:`logging.config.dictConfig`::
+
+        "filters": {
+            "shift": {
+                "()": "gouge.filters.ShiftingRules",
+                "rules": {"sqlalchemy": -1, "app.audit": 1},
+            },
+        },
+
+    The rules can be replaced while the application is running using
+    :py:meth:`~.ShiftingRules.load`. Records being filtered at the same time
+    use either the old or the new rules.
+
+    :param rules: The initial rules.
+    """
+
+    def __init__(
+        self,
+        rules: Union[
+            Mapping[str, Union[int, Mapping[str, Union[int, str]]]],
+            Iterable[ShiftRule],
+        ] = (),
+    ) -> None:
+        super().__init__()
+        self._compiled = _CompiledRules(())
+        self.load(rules)
+
+    @property
+    def rules(self) -> List[ShiftRule]:
+        """
+        The current rules.
+        """
+        return list(self._compiled.rules)
+
+    def load(
+        self,
+        rules: Union[
+            Mapping[str, Union[int, Mapping[str, Union[int, str]]]],
+            Iterable[ShiftRule],
+        ],
+    ) -> None:
+        """
+        Replace all rules with *rules*.
+        """
+        if isinstance(rules, Mapping):
+            rules = [
+                ShiftRule.from_config(name, config)
+                for name, config in rules.items()
+            ]
+        # The new rules are compiled completely before they replace the
+        # current ones in a single assignment, so filter() needs no lock.
+        self._compiled = _CompiledRules(rules)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        Always returns *True* but modifies the level of *record* according
+        to the most specific matching rule.
+        """
+        compiled = self._compiled
+        try:
+            levels = compiled.resolved[record.name]
+        except KeyError:
+            levels = compiled.resolve(record.name)
+        if levels is not None:
+            record.levelno, record.levelname = levels[record.levelno]
         return True
+
+
+class _Bucket:
+    """
+    The state of one key of :py:class:`RateLimitFilter`.
+    """
+
+    __slots__ = ("tokens", "updated", "suppressed")
+
+    def __init__(self, tokens: float, updated: float) -> None:
+        self.tokens = tokens
+        self.updated = updated
+        self.suppressed = 0
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Drop records when a logger emits the same message too often.
+
+    Each key (the logger name and the message template, ``record.msg``, before
+    the arguments are interpolated) gets a token bucket: it holds up to
+    *burst* tokens, every record takes one, and *rate* tokens are added per
+    second. Records arriving at an empty bucket are dropped. Because the
+    filter only looks at the template, dropped records are never formatted.
+
+    Additionally, records can be sampled by level. For example
+    ``sampling={logging.DEBUG: 0.1}`` keeps about one in ten DEBUG records.
+
+    Every *summary_interval* seconds, the filter logs a WARNING on the
+    *summary_logger* for each key which had records dropped, with the number
+    of dropped records. The counts are also available in the
+    ``suppressed`` attribute of the summary records. The summary records
+    themselves are never dropped.
+
+    .. note::
+        Attach this filter to a handler (or to every logger to limit) rather
+        than to a parent logger. See :py:meth:`logging.Filter.filter`.
+
+    :param rate: The number of records per second allowed for each key.
+    :param burst: The number of records allowed in a burst. Defaults to
+        *rate* (at least one).
+    :param by_message: Use separate buckets per message template. If
+        *False*, the records of a logger share one bucket.
+    :param sampling: A mapping from level numbers to the fraction of records
+        to keep. Levels not in the mapping are not sampled.
+    :param summary_interval: Report dropped records at most this often (in
+        seconds). ``0`` disables the summaries.
+    :param summary_logger: The name of the logger used for summaries.
+    :param max_keys: The number of keys to remember. Once exceeded, the
+        least recently used keys are forgotten (and start with a full
+        bucket again).
+    """
+
+    def __init__(
+        self,
+        rate: float = 10,
+        burst: Optional[float] = None,
+        by_message: bool = True,
+        sampling: Optional[Mapping[int, float]] = None,
+        summary_interval: float = 60,
+        summary_logger: str = "gouge.ratelimit",
+        max_keys: int = 1024,
+    ) -> None:
+        super().__init__()
+        self.rate = rate
+        self.burst = max(1.0, rate) if burst is None else burst
+        self.by_message = by_message
+        self.sampling = dict(sampling or {})
+        self.summary_interval = summary_interval
+        self.summary_logger = summary_logger
+        self.clock: Callable[[], float] = time.monotonic
+        self._random = random.Random()
+        self._buckets: LRUCache[_Bucket] = LRUCache(max_keys)
+        # Dropped records of keys which were evicted from the LRU
+        self._forgotten = 0
+        self._lock = Lock()
+        self._next_summary = self.clock() + summary_interval
+
+    def _key(self, record: logging.LogRecord) -> Tuple[str, Hashable]:
+        msg = record.msg if self.by_message else None
+        try:
+            hash(msg)
+        except TypeError:
+            # Unhashable messages (like dicts) share the bucket of the logger
+            msg = None
+        return (record.name, msg)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        Return whether *record* should be kept. See
+        :py:meth:`logging.Filter.filter`.
+        """
+        if hasattr(record, "suppressed"):
+            # A summary record
+            return True
+        now = self.clock()
+        keep = True
+        fraction = self.sampling.get(record.levelno)
+        if fraction is not None and self._random.random() >= fraction:
+            keep = False
+        key = self._key(record)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = _Bucket(self.burst, now)
+                evicted = self._buckets.put(key, bucket)
+                if evicted is not None:
+                    self._forgotten += evicted[1].suppressed
+            elif bucket.tokens < self.burst:
+                bucket.tokens = min(
+                    self.burst,
+                    bucket.tokens + (now - bucket.updated) * self.rate,
+                )
+            bucket.updated = now
+            if keep and bucket.tokens >= 1:
+                bucket.tokens -= 1
+            else:
+                keep = False
+                bucket.suppressed += 1
+        if self.summary_interval and now >= self._next_summary:
+            self.summarize()
+        return keep
+
+    def summarize(self) -> None:
+        """
+        Log the number of records dropped since the last summary and reset
+        the counts.
+        """
+        with self._lock:
+            self._next_summary = self.clock() + self.summary_interval
+            counts: Dict[Hashable, int] = {}
+            for key, bucket in self._buckets.items():
+                if bucket.suppressed:
+                    counts[key] = bucket.suppressed
+                    bucket.suppressed = 0
+            forgotten, self._forgotten = self._forgotten, 0
+        logger = logging.getLogger(self.summary_logger)
+        for (name, msg), count in counts.items():
+            if msg is None:
+                logger.warning(
+                    "Suppressed %d records from %r",
+                    count,
+                    name,
+                    extra={"suppressed": count},
+                )
+            else:
+                logger.warning(
+                    "Suppressed %d records from %r: %r",
+                    count,
+                    name,
+                    msg,
+                    extra={"suppressed": count},
+                )
+        if forgotten:
+            logger.warning(
+                "Suppressed %d records from other loggers",
+                forgotten,
+                extra={"suppressed": forgotten},
+            )
@@ -0,0 +1,464 @@
+"""
+This module contains log handlers complementing the formatters of gouge.
+"""
+import atexit
+import copy
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+from threading import Event, Lock, Thread
+from typing import IO, Any, Iterable, List, Optional, Tuple
+
+#: Block the logging thread until there is room in the queue.
+BLOCK = "block"
+#: Discard the oldest queued record to make room for the new one.
+DROP_OLDEST = "drop-oldest"
+#: Discard the new record if the queue is full.
+DROP_NEWEST = "drop-newest"
+
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+#: Types of message arguments which are passed to the writer thread as-is
+IMMUTABLE_TYPES = frozenset({str, int, float, bool, bytes, complex, type(None)})
+
+
+class _BlockingListener(QueueListener):
+    """
+    A queue-listener which waits for room in the queue when it is stopped
+    instead of failing on a full queue.
+    """
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)  # type: ignore
+
+
+class BackgroundHandler(QueueHandler):
+    """
+    A handler which passes records on to *handlers* using a dedicated writer
+    thread. The logging thread only pays for putting the record into a
+    bounded queue. Formatting and writing happens on the writer thread.
+
+    The writer thread is started immediately. Remaining records are written
+    when the handler is closed, which happens automatically on interpreter
+    shutdown.
+
+    :param handlers: The handlers which will receive the records.
+    :param maxsize: The maximum number of records waiting to be written.
+    :param overflow: What to do when the queue is full. One of
+        :py:data:`BLOCK`, :py:data:`DROP_OLDEST` or :py:data:`DROP_NEWEST`.
+        When records are dropped, a summary record with the number of
+        dropped records is emitted as soon as there is room again.
+    """
+
+    def __init__(
+        self,
+        handlers: Iterable[logging.Handler],
+        maxsize: int = 10000,
+        overflow: str = BLOCK,
+    ) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy {overflow!r}. "
+                f"Expected one of {OVERFLOW_POLICIES!r}"
+            )
+        super().__init__(queue.Queue(maxsize))
+        self.handlers: List[logging.Handler] = list(handlers)
+        self.overflow = overflow
+        self.dropped = 0
+        self._dropped_lock = Lock()
+        self.listener: Optional[QueueListener] = _BlockingListener(
+            self.queue, *self.handlers, respect_handler_level=True
+        )
+        self.listener.start()
+        atexit.register(self.close)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Merge the message arguments into the message so the record is no
+        longer affected by later modifications of the arguments. Arguments
+        which cannot be modified (strings, numbers, ...) are kept, so
+        pre-formatters using them (see
+        :py:func:`gouge.colourcli.record_pre_formatter`) still work and the
+        message is rendered on the writer thread.
+
+        Unlike :py:meth:`logging.handlers.QueueHandler.prepare`, this does not
+        format the record. This is left to the writer thread.
+        """
+        record = copy.copy(record)
+        args = record.args
+        if (
+            type(record.msg) is str
+            and isinstance(args, tuple)
+            and all(type(arg) in IMMUTABLE_TYPES for arg in args)
+        ):
+            return record
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.listener is None:
+            # We have been closed. Write synchronously to avoid losing
+            # records logged late during shutdown.
+            self._handle_directly(record)
+            return
+
+        if self.dropped:
+            self._enqueue_summary()
+
+        if self.overflow == BLOCK:
+            self.queue.put(record)
+        elif self.overflow == DROP_NEWEST:
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self._count_drop()
+        else:
+            while True:
+                try:
+                    self.queue.put_nowait(record)
+                    break
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        self.queue.task_done()
+                    except queue.Empty:
+                        continue
+                    self._count_drop()
+
+    def _count_drop(self) -> None:
+        with self._dropped_lock:
+            self.dropped += 1
+
+    def _pop_summary(self) -> Optional[logging.LogRecord]:
+        with self._dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        if not dropped:
+            return None
+        return logging.LogRecord(
+            "gouge",
+            logging.WARNING,
+            __file__,
+            0,
+            "%d log records were dropped because the log queue was full",
+            (dropped,),
+            None,
+        )
+
+    def _enqueue_summary(self) -> None:
+        if self.queue.full():
+            return
+        summary = self._pop_summary()
+        if summary is None:
+            return
+        try:
+            self.queue.put_nowait(summary)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += summary.args[0]  # type: ignore
+
+    def _handle_directly(self, record: logging.LogRecord) -> None:
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def flush(self) -> None:
+        """
+        Wait until all queued records have been passed on and flush the
+        target handlers.
+        """
+        if self.listener is not None:
+            self.queue.join()
+        for handler in self.handlers:
+            handler.flush()
+
+    def close(self) -> None:
+        """
+        Write all remaining records, stop the writer thread and report any
+        dropped records.
+        """
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+            summary = self._pop_summary()
+            if summary is not None:
+                self._handle_directly(summary)
+            for handler in self.handlers:
+                handler.flush()
+            atexit.unregister(self.close)
+        super().close()
+
+
+class BufferedStreamHandler(logging.StreamHandler):
+    """
+    A stream handler which collects formatted records in a buffer and writes
+    them to the stream in one go. This avoids one ``write()`` and ``flush()``
+    per record.
+
+    The buffer is written when it holds *buffer_size* characters or more,
+    when a record with a level of *flush_level* or higher is emitted and at
+    the latest *max_latency* seconds after the previous write.
+
+    :param stream: The output stream. Defaults to :py:data:`sys.stderr`.
+    :param buffer_size: Write the buffer once it holds this many characters.
+    :param max_latency: The maximum number of seconds a record stays in the
+        buffer. If this is ``0`` the buffer is only written by the other
+        conditions.
+    :param flush_level: Records with this level or higher are written
+        immediately (together with everything before them).
+    """
+
+    def __init__(
+        self,
+        stream: Optional[IO[str]] = None,
+        buffer_size: int = 64 * 1024,
+        max_latency: float = 1.0,
+        flush_level: int = logging.ERROR,
+    ) -> None:
+        super().__init__(stream)
+        self.buffer_size = buffer_size
+        self.max_latency = max_latency
+        self.flush_level = flush_level
+        self._buffer: List[str] = []
+        self._buffered = 0
+        # Reported to handleError() if a periodic flush fails
+        self._last_record: Optional[logging.LogRecord] = None
+        self._stop_flushing = Event()
+        self._flusher: Optional[Thread] = None
+        if max_latency > 0:
+            self._flusher = Thread(
+                target=self._flush_periodically,
+                name="gouge-buffer-flush",
+                daemon=True,
+            )
+            self._flusher.start()
+
+    def _flush_periodically(self) -> None:
+        while not self._stop_flushing.wait(self.max_latency):
+            if not self._buffer:
+                continue
+            record = self._last_record
+            try:
+                self.flush()
+            except Exception:  # pylint: disable=broad-except
+                # Keep the thread alive, like a failed emit() would
+                if record is not None:
+                    self.handleError(record)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            msg = self.format(record) + self.terminator
+            self._buffer.append(msg)
+            self._buffered += len(msg)
+            self._last_record = record
+            if record.levelno >= self.flush_level:
+                self.flush()
+            elif self._buffered >= self.buffer_size:
+                self.flush()
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def flush(self) -> None:
+        """
+        Write the buffered records to the stream and flush it.
+        """
+        self.acquire()
+        try:
+            if self.stream is None:
+                return
+            if self._buffer:
+                data = "".join(self._buffer)
+                self._buffer.clear()
+                self._buffered = 0
+                self.stream.write(data)
+            if hasattr(self.stream, "flush"):
+                self.stream.flush()
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        """
+        Write the remaining records and stop the periodic flush.
+        """
+        self._stop_flushing.set()
+        try:
+            self.flush()
+        finally:
+            super().close()
+
+
+class CollapsingHandler(logging.Handler):
+    """
+    A handler which collapses runs of identical records before passing them
+    on to *handlers*, like the "last message repeated N times" of syslog.
+
+    Records are identical if they have the same logger name, level, message
+    template and arguments. The first record of a run is passed on
+    immediately. The following ones are held back and replaced by a single
+    record with the message ``Last message repeated N times`` (with the
+    logger name and level of the run and the number in its ``repeated``
+    attribute) when:
+
+    * a different record arrives,
+    * the run has been held back for *max_delay* seconds,
+    * or the handler is flushed or closed (which also happens on interpreter
+      shutdown).
+
+    If only one record was held back, it is passed on as-is.
+
+    Filters attached to this handler (for example a
+    :py:class:`~gouge.filters.ShiftingFilter`) run before the comparison, so
+    the comparison uses the shifted level.
+
+    :param handlers: The handlers which will receive the records.
+    :param max_delay: The maximum number of seconds a run is held back. If
+        this is ``0``, runs are only reported by the other conditions.
+    """
+
+    def __init__(
+        self, handlers: Iterable[logging.Handler], max_delay: float = 5.0
+    ) -> None:
+        super().__init__()
+        self.handlers: List[logging.Handler] = list(handlers)
+        self.max_delay = max_delay
+        self._key: Optional[Tuple[Any, ...]] = None
+        self._repeated = 0
+        self._first_repeat = 0.0
+        self._last: Optional[logging.LogRecord] = None
+        self._stop_flushing = Event()
+        self._flusher: Optional[Thread] = None
+        if max_delay > 0:
+            self._flusher = Thread(
+                target=self._flush_periodically,
+                name="gouge-collapse-flush",
+                daemon=True,
+            )
+            self._flusher.start()
+
+    def _flush_periodically(self) -> None:
+        while not self._stop_flushing.wait(self.max_delay):
+            if not self._repeated:
+                continue
+            self.acquire()
+            try:
+                if time.time() - self._first_repeat >= self.max_delay:
+                    self._release_run()
+            finally:
+                self.release()
+
+    def _is_repeat(self, key: Tuple[Any, ...]) -> bool:
+        try:
+            return bool(key == self._key)
+        except Exception:  # pylint: disable=broad-except
+            # Arguments which can't be compared (like NumPy arrays)
+            return False
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            key = (record.name, record.levelno, record.msg, record.args)
+            if self._is_repeat(key):
+                if (
+                    self._repeated
+                    and self.max_delay > 0
+                    and record.created - self._first_repeat >= self.max_delay
+                ):
+                    self._release_run()
+                if not self._repeated:
+                    self._first_repeat = record.created
+                self._repeated += 1
+                self._last = record
+                return
+            self._release_run()
+            self._key = key
+            self._forward(record)
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def _release_run(self) -> None:
+        """
+        Pass on the records held back for the current run.
+        """
+        repeated, self._repeated = self._repeated, 0
+        last, self._last = self._last, None
+        if last is None:
+            return
+        if repeated == 1:
+            self._forward(last)
+            return
+        summary = copy.copy(last)
+        summary.msg = "Last message repeated %d times"
+        summary.args = (repeated,)
+        summary.exc_info = None
+        summary.exc_text = None
+        summary.stack_info = None
+        summary.repeated = repeated
+        self._forward(summary)
+
+    def _forward(self, record: logging.LogRecord) -> None:
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def flush(self) -> None:
+        """
+        Pass on the records held back for the current run and flush the
+        target handlers.
+        """
+        self.acquire()
+        try:
+            self._release_run()
+        finally:
+            self.release()
+        for handler in self.handlers:
+            handler.flush()
+
+    def close(self) -> None:
+        """
+        Pass on the records held back and stop the periodic flush.
+        """
+        self._stop_flushing.set()
+        try:
+            self.flush()
+        finally:
+            super().close()
+
+
+def buffer_handlers(
+    logger: logging.Logger, handlers: Iterable[logging.Handler]
+) -> List[logging.Handler]:
+    """
+    Replace each :py:class:`logging.StreamHandler` in *handlers* attached to
+    *logger* with a :py:class:`~.BufferedStreamHandler` writing to the same
+    stream. The level, formatter and filters are taken over.
+
+    File handlers (:py:class:`logging.FileHandler` and its subclasses) are
+    kept: they open their files lazily (``delay=True``) and may do more than
+    writing to a stream (like batching rows or closing an XML document).
+    Stream handlers without a stream are kept as well.
+
+    The original handlers are only detached, not closed, so they still own
+    their streams.
+
+    Returns the new list of handlers (handlers which are not replaced are
+    returned as-is).
+    """
+    output: List[logging.Handler] = []
+    for handler in handlers:
+        if (
+            isinstance(handler, (BufferedStreamHandler, logging.FileHandler))
+            or not isinstance(handler, logging.StreamHandler)
+            or handler.stream is None
+        ):
+            output.append(handler)
+            continue
+        handler.flush()
+        buffered = BufferedStreamHandler(handler.stream)
+        buffered.setLevel(handler.level)
+        buffered.setFormatter(handler.formatter)
+        for filter_ in handler.filters:
+            buffered.addFilter(filter_)
+        logger.removeHandler(handler)
+        logger.addHandler(buffered)
+        output.append(buffered)
+    return output
@@ -0,0 +1,311 @@
+"""
+This module contains a sparse time index for log files.
+
+The index is stored next to the log file (see :py:func:`~.index_filename`).
+It maps the ``created`` timestamp of some records to the byte offset at which
+the record starts in the log file. An entry is added every *every_records*
+records and whenever *every_seconds* seconds passed since the previous entry.
+This keeps the index small while limiting how much of the log file has to be
+read to find a given point in time.
+
+The index assumes that timestamps in the log file are ascending. Records
+written by several threads may be slightly out of order. Readers therefore
+start reading one index block early, stop one index block late and filter
+each record by its timestamp.
+
+The index file starts with :py:data:`MAGIC`, followed by entries consisting
+of the timestamp (a double) and the offset (an unsigned 64 bit integer),
+stored little-endian.
+"""
+import csv
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from typing import IO, Iterator, List, Optional, Tuple, Union
+
+MAGIC = b"GOUGEIDX\x00\x01"
+ENTRY = struct.Struct("<dQ")
+
+#: Appended to the log file name to get the name of the index file.
+INDEX_SUFFIX = ".idx"
+
+#: Default number of records between two index entries.
+EVERY_RECORDS = 1000
+#: Default number of seconds between two index entries.
+EVERY_SECONDS = 60.0
+
+Filename = Union[str, "os.PathLike[str]"]
+
+
+def index_filename(filename: Filename) -> str:
+    """
+    Return the name of the index file for the log file *filename*.
+    """
+    return os.fspath(filename) + INDEX_SUFFIX
+
+
+class TimeIndex:
+    """
+    An index loaded into memory.
+
+    :param timestamps: The timestamps of the indexed records (ascending).
+    :param offsets: The byte offsets of the indexed records.
+    """
+
+    def __init__(self, timestamps: "array[float]", offsets: "array[int]"):
+        self.timestamps = timestamps
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @staticmethod
+    def load(filename: Filename) -> "TimeIndex":
+        """
+        Load the index file *filename*. Incomplete trailing entries are
+        ignored.
+
+        :raises ValueError: If the file is not an index file.
+        """
+        with open(filename, "rb") as fptr:
+            data = fptr.read()
+        if not data.startswith(MAGIC):
+            raise ValueError(f"{filename} is not a gouge index file")
+        timestamps = array("d")
+        offsets = array("Q")
+        end = len(data) - (len(data) - len(MAGIC)) % ENTRY.size
+        for timestamp, offset in ENTRY.iter_unpack(data[len(MAGIC) : end]):
+            timestamps.append(timestamp)
+            offsets.append(offset)
+        return TimeIndex(timestamps, offsets)
+
+    def save(self, filename: Filename) -> None:
+        """
+        Write the index to the file *filename*, replacing its content.
+        """
+        with open(filename, "wb") as fptr:
+            fptr.write(MAGIC)
+            for entry in zip(self.timestamps, self.offsets):
+                fptr.write(ENTRY.pack(*entry))
+
+    def span(
+        self, start: Optional[float] = None, end: Optional[float] = None
+    ) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Return the byte range ``(first, stop)`` of the log file which
+        contains the records created between *start* (inclusive) and *end*
+        (exclusive).
+
+        *first* is *None* if reading has to begin at the start of the file
+        and *stop* is *None* if reading has to continue until the end of
+        the file.
+        """
+        first = None
+        stop = None
+        if start is not None:
+            # The block ending at the first entry at or after *start*
+            # contains *start*. Begin one block earlier, which may contain
+            # matching records as well if timestamps are out of order.
+            position = bisect_left(self.timestamps, start) - 2
+            if position >= 0:
+                first = self.offsets[position]
+        if end is not None:
+            # Stop after the block *after* the first entry at or after *end*
+            # for the same reason.
+            position = bisect_left(self.timestamps, end) + 1
+            if position < len(self.offsets):
+                stop = self.offsets[position]
+        return first, stop
+
+
+class TimeIndexWriter:
+    """
+    Write an index file while the log file is written.
+
+    For each record, the log writer calls :py:meth:`~.due`. If it returns
+    *True*, the writer has to call :py:meth:`~.add` with the offset at which
+    the record starts.
+
+    :param filename: The index file. If this is *None*, the entries are only
+        selected (see :py:meth:`~.due`) but not written anywhere.
+    :param mode: ``"a"`` to extend an existing index, ``"w"`` to start over.
+    :param every_records: Add an entry after this many records.
+    :param every_seconds: Add an entry if this many seconds passed since the
+        previous entry.
+    """
+
+    def __init__(
+        self,
+        filename: Optional[Filename],
+        mode: str = "a",
+        every_records: int = EVERY_RECORDS,
+        every_seconds: float = EVERY_SECONDS,
+    ) -> None:
+        self.filename = filename
+        self.every_records = every_records
+        self.every_seconds = every_seconds
+        self._last: Optional[float] = None
+        self._since = 0
+        self._stream: Optional[IO[bytes]] = None
+        if filename is None:
+            return
+        if mode == "a" and os.path.exists(filename):
+            existing = TimeIndex.load(filename)
+            if len(existing):
+                # The number of records since the last entry is unknown.
+                # Add an entry for the first new record.
+                self._last = existing.timestamps[-1]
+                self._since = every_records
+        self._stream = open(filename, mode + "b")
+        if self._stream.tell() == 0:
+            self._stream.write(MAGIC)
+
+    def due(self, created: float) -> bool:
+        """
+        Count a record created at *created* and return whether an index
+        entry should be added for it.
+        """
+        if (
+            self._last is not None
+            and self._since < self.every_records
+            and created - self._last < self.every_seconds
+        ):
+            self._since += 1
+            return False
+        return True
+
+    def add(self, created: float, offset: int) -> None:
+        """
+        Add an entry for the record created at *created* starting at
+        *offset*.
+        """
+        if self._stream is not None:
+            self._stream.write(ENTRY.pack(created, offset))
+        self._last = created
+        self._since = 1
+
+    def flush(self) -> None:
+        if self._stream is not None:
+            self._stream.flush()
+
+    def close(self) -> None:
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            stream.close()
+
+
+def scan_csv(
+    filename: Filename, offset: int = 0, encoding: str = "utf-8"
+) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Read the CSV file *filename* starting at the byte position *offset* and
+    yield ``(offset, row)`` for each row, where *offset* is the position at
+    which the row starts. Values spanning several lines are supported.
+    """
+    position = offset
+
+    with open(filename, "rb") as fptr:
+        fptr.seek(offset)
+
+        def lines() -> Iterator[str]:
+            nonlocal position
+            for line in fptr:
+                position += len(line)
+                yield line.decode(encoding)
+
+        row_start = position
+        # The CSV reader pulls exactly the lines it needs for one row, so
+        # *position* is the end of the row when it is returned.
+        for row in csv.reader(lines()):
+            yield row_start, row
+            row_start = position
+
+
+def _csv_timestamps(
+    filename: Filename, encoding: str = "utf-8"
+) -> Iterator[Tuple[float, int]]:
+    for offset, row in scan_csv(filename, encoding=encoding):
+        try:
+            yield float(row[0]), offset
+        except (IndexError, ValueError):
+            # The header or an empty line
+            continue
+
+
+def build_csv_index(
+    filename: Filename,
+    every_records: int = EVERY_RECORDS,
+    every_seconds: float = EVERY_SECONDS,
+    encoding: str = "utf-8",
+) -> TimeIndex:
+    """
+    (Re-)create the index file for the :py:class:`~gouge.parseable.CSVLog`
+    file *filename* and return the new index.
+
+    If the index file cannot be written (for example because the directory
+    is read-only), the index is only kept in memory.
+    """
+    selector = TimeIndexWriter(None, "w", every_records, every_seconds)
+    index = TimeIndex(array("d"), array("Q"))
+    for created, offset in _csv_timestamps(filename, encoding):
+        if selector.due(created):
+            selector.add(created, offset)
+            index.timestamps.append(created)
+            index.offsets.append(offset)
+    try:
+        index.save(index_filename(filename))
+    except OSError:
+        pass
+    return index
+
+
+def load_csv_index(
+    filename: Filename,
+    every_records: int = EVERY_RECORDS,
+    every_seconds: float = EVERY_SECONDS,
+    encoding: str = "utf-8",
+) -> TimeIndex:
+    """
+    Return the index of the :py:class:`~gouge.parseable.CSVLog` file
+    *filename*. If the index file is missing, unreadable or refers to
+    positions beyond the end of the log file, it is rebuilt using
+    :py:func:`~.build_csv_index` (in memory only, if it cannot be written).
+    """
+    try:
+        index = TimeIndex.load(index_filename(filename))
+    except (OSError, ValueError):
+        pass
+    else:
+        if not len(index) or index.offsets[-1] < os.path.getsize(filename):
+            return index
+    return build_csv_index(filename, every_records, every_seconds, encoding)
+
+
+def read_csv_slice(
+    filename: Filename,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    encoding: str = "utf-8",
+) -> Iterator[List[str]]:
+    """
+    Yield the rows of the :py:class:`~gouge.parseable.CSVLog` file
+    *filename* which were created between *start* (inclusive) and *end*
+    (exclusive).
+
+    Only the part of the file covered by the matching index blocks is read.
+    The index is created if it is missing (see :py:func:`~.load_csv_index`).
+    """
+    first, stop = load_csv_index(filename, encoding=encoding).span(start, end)
+    for offset, row in scan_csv(filename, first or 0, encoding):
+        if stop is not None and offset >= stop:
+            break
+        try:
+            created = float(row[0])
+        except (IndexError, ValueError):
+            continue
+        if start is not None and created < start:
+            continue
+        if end is not None and created >= end:
+            continue
+        yield row
@@ -0,0 +1,140 @@
+"""
+This module shifts log levels inside the loggers, before records are created.
+
+:py:class:`gouge.filters.ShiftingFilter` changes the level of records which
+already exist. A record which is shifted below the level of the logger has
+still been created (looking up the caller, keeping the arguments alive, ...)
+only to be thrown away. :py:func:`shift_level` applies the same shift in
+:py:meth:`logging.Logger.isEnabledFor`, so such records are never created::
+
+    from gouge.loggers import shift_level
+
+    # "sqlalchemy" INFO records become DEBUG records. If the logger level is
+    # INFO, they are dropped before they are created.
+    shift_level("sqlalchemy", -1)
+"""
+import logging
+from threading import RLock
+from typing import Any, Dict, Optional, Type
+
+from gouge.filters import LOGGER_INDEX, LevelTable, is_descendant
+
+
+class ShiftingLogger(logging.Logger):
+    """
+    A logger which shifts the level of every message by the
+    :py:class:`~gouge.filters.LevelTable` in :py:attr:`level_shift` before
+    checking if it is enabled and when creating the record.
+
+    :py:func:`shift_level` converts existing loggers to this class (or to a
+    subclass of this class and their current class). It can also be
+    installed with :py:func:`logging.setLoggerClass`.
+    """
+
+    #: The shifted levels, or *None* to log unchanged.
+    level_shift: Optional[LevelTable] = None
+
+    def isEnabledFor(self, level: int) -> bool:
+        shift = self.level_shift
+        if shift is not None:
+            level = shift[level][0]
+        return super().isEnabledFor(level)
+
+    def makeRecord(self, *args: Any, **kwargs: Any) -> logging.LogRecord:
+        record = super().makeRecord(*args, **kwargs)
+        shift = self.level_shift
+        if shift is not None:
+            record.levelno, record.levelname = shift[record.levelno]
+        return record
+
+
+_LOCK = RLock()
+#: The shifts by logger name
+_SHIFTS: Dict[str, LevelTable] = {}
+_CLASSES: Dict[Type[logging.Logger], Type[ShiftingLogger]] = {}
+
+
+def _shifting_class(cls: Type[logging.Logger]) -> Type[ShiftingLogger]:
+    if issubclass(cls, ShiftingLogger):
+        return cls
+    if cls is logging.Logger:
+        return ShiftingLogger
+    output = _CLASSES.get(cls)
+    if output is None:
+        output = _CLASSES[cls] = type(
+            f"Shifting{cls.__name__}", (ShiftingLogger, cls), {}
+        )
+    return output
+
+
+def _resolve(name: str) -> Optional[LevelTable]:
+    """
+    Return the shift of the most specific registered ancestor of *name*.
+    """
+    best: Optional[str] = None
+    for parent in _SHIFTS:
+        if is_descendant(name, parent) and (
+            best is None or len(parent) > len(best)
+        ):
+            best = parent
+    return None if best is None else _SHIFTS[best]
+
+
+def _update(logger: logging.Logger) -> None:
+    with _LOCK:
+        shift = _resolve(logger.name)
+        if shift is None and not isinstance(logger, ShiftingLogger):
+            return
+        cls = _shifting_class(type(logger))
+        if type(logger) is not cls:
+            logger.__class__ = cls
+        logger.level_shift = shift  # type: ignore
+
+
+def shift_level(
+    logger: str,
+    shift_by: int = 0,
+    min: int = logging.NOTSET,
+    max: int = logging.CRITICAL,
+    offset: int = 0,
+) -> None:
+    """
+    Shift the levels of *logger* and all its descendants, including loggers
+    created later on.
+
+    The arguments have the same meaning as for
+    :py:class:`gouge.filters.ShiftingFilter`. If shifts are registered for
+    a logger and one of its ancestors, the shift of the logger wins.
+
+    Unlike :py:class:`~gouge.filters.ShiftingFilter`, the shift is applied
+    *before* the logger checks its level. For example, with a logger level
+    of ``INFO`` and ``shift_by=-1``, ``logger.info()`` calls are dropped
+    without creating a record.
+
+    :param logger: The name of the logger. ``""`` shifts all loggers.
+    """
+    table = LevelTable(offset or 10 * shift_by, min, max)
+    with _LOCK:
+        is_new = logger not in _SHIFTS
+        _SHIFTS[logger] = table
+        if is_new:
+            LOGGER_INDEX.follow(logger, _update)
+        for existing in LOGGER_INDEX.descendants(logger):
+            _update(existing)
+        if logger == "":
+            _update(logging.getLogger())
+
+
+def unshift_level(logger: str) -> None:
+    """
+    Remove the shift registered with :py:func:`shift_level` for *logger*.
+    The descendants fall back to the shift of the nearest ancestor (if any).
+    """
+    with _LOCK:
+        if _SHIFTS.pop(logger, None) is None:
+            return
+        LOGGER_INDEX.unfollow(logger, _update)
+        for existing in LOGGER_INDEX.descendants(logger):
+            _update(existing)
+        if logger == "":
+            _update(logging.getLogger())
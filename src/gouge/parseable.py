@@ -1,7 +1,178 @@
 import csv
 import io
+import json
+import keyword
 import logging
-from typing import Any, Optional
+import os
+import re
+import threading
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+from gouge.handlers import buffer_handlers
+from gouge.index import (
+    EVERY_RECORDS,
+    EVERY_SECONDS,
+    TimeIndexWriter,
+    index_filename,
+    load_csv_index,
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+#: The record attributes written by the formatters in this module, in output
+#: order.
+FIELDS = (
+    "created",
+    "filename",
+    "funcName",
+    "levelname",
+    "levelno",
+    "lineno",
+    "module",
+    "msecs",
+    "name",
+    "pathname",
+    "process",
+    "processName",
+    "relativeCreated",
+    "thread",
+    "threadName",
+    "message",
+    "exc_text",
+)
+
+#: Template for one XML record. The values are filled in positionally in the
+#: order of :py:data:`FIELDS`.
+XML_RECORD_TEMPLATE = (
+    "<record>"
+    + "".join(f"<{name}>{{}}</{name}>" for name in FIELDS)
+    + "</record>"
+)
+
+
+def record_values(
+    formatter: logging.Formatter, record: logging.LogRecord
+) -> List[Any]:
+    """
+    Return the values of :py:data:`FIELDS` for *record*.
+
+    This sets ``record.message`` and (if the record carries exception
+    information) ``record.exc_text`` using *formatter*.
+    """
+    record.message = record.getMessage()
+
+    if record.exc_info:
+        # Cache the traceback text to avoid converting it multiple times
+        # (it's constant anyway)
+        exc_text = getattr(record, "exc_text", "")
+        if not exc_text:
+            record.exc_text = formatter.formatException(record.exc_info)
+
+    exc_text = getattr(record, "exc_text", "")
+    return [
+        record.created,
+        record.filename,
+        record.funcName,
+        record.levelname,
+        record.levelno,
+        record.lineno,
+        record.module,
+        record.msecs,
+        record.name,
+        record.pathname,
+        record.process,
+        record.processName,
+        record.relativeCreated,
+        record.thread,
+        record.threadName,
+        record.message,
+        exc_text,
+    ]
+
+
+#: Attributes set by the constructor of every log record.
+_RECORD_ATTRIBUTES = frozenset(
+    vars(logging.LogRecord("", 0, "", 0, "", (), None))
+)
+#: Attributes of every log record. Anything else on a record was passed in
+#: via ``extra``.
+RESERVED_ATTRIBUTES = _RECORD_ATTRIBUTES | {"message", "asctime"}
+
+
+def compile_extractor(
+    fields: Sequence[str],
+) -> Callable[[logging.LogRecord], Dict[str, Any]]:
+    """
+    Create a function which returns a dictionary with the attributes *fields*
+    of a log record.
+
+    The function is generated once with a dictionary literal for the given
+    fields. This is noticeably faster than looking up the attributes in a
+    loop.
+
+    Attributes which are not set on every record (like those passed in via
+    ``extra``) are *None* for records which do not have them.
+    """
+    for name in fields:
+        if not name.isidentifier() or keyword.iskeyword(name):
+            raise ValueError(f"Invalid field name: {name!r}")
+    items = ", ".join(
+        f"{name!r}: record.{name}"
+        if name in _RECORD_ATTRIBUTES
+        else f"{name!r}: getattr(record, {name!r}, None)"
+        for name in fields
+    )
+    namespace: Dict[str, Any] = {}
+    exec(  # pylint: disable=exec-used
+        f"def extract(record):\n    return {{{items}}}\n", namespace
+    )
+    return namespace["extract"]  # type: ignore
+
+
+#: Characters which are not allowed in XML 1.0 documents (not even as
+#: character references).
+P_XML_INVALID = re.compile(
+    r"[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]"
+)
+
+
+def xml_escape(text: str) -> str:
+    """
+    Escape *text* for use as XML character data.
+
+    The same characters as in :py:mod:`xml.dom.minidom` are escaped
+    (including double-quotes) to keep the output of
+    :py:class:`~.XMLLog` unchanged. Characters which XML 1.0 does not allow
+    (like the escape character of ANSI colour codes) are replaced by
+    ``U+FFFD`` so that the document remains parseable.
+    """
+    # Printable strings never contain invalid characters, which saves the
+    # regex scan for most messages.
+    if not text.isprintable():
+        text = P_XML_INVALID.sub("\ufffd", text)
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if '"' in text:
+        text = text.replace('"', "&quot;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
 
 
 class CSVLog(logging.Formatter):
@@ -29,57 +200,267 @@ class CSVLog(logging.Formatter):
     * exc_text
     """
 
+    #: The column names, in output order.
+    COLUMNS = FIELDS
+
     @staticmethod
-    def basicConfig(**kwargs: Any) -> None:
+    def basicConfig(buffered: bool = False, **kwargs: Any) -> None:
+        """
+        Convenience method to have a one-liner set-up.
+
+        The *kwargs* are passed on to :py:func:`logging.basicConfig`. After
+        that, the formatter of all root handlers is replaced. If *buffered* is
+        set, stream handlers are replaced by
+        :py:class:`~gouge.handlers.BufferedStreamHandler` instances.
+        """
         logging.basicConfig(**kwargs)
         root = logging.getLogger()
         for handler in root.handlers:
             handler.setFormatter(CSVLog())
+        if buffered:
+            buffer_handlers(root, root.handlers[:])
 
     def __init__(
         self, fmt: Optional[str] = None, datefmt: Optional[str] = None
     ) -> None:
         logging.Formatter.__init__(self, fmt, datefmt)
-        self.buffer = io.StringIO()
-        self.writer = csv.writer(self.buffer)
+        # Each thread gets its own buffer so that the formatter can be used
+        # concurrently without locking.
+        self._local = threading.local()
 
-    def format(self, record: logging.LogRecord) -> str:
-        record.message = record.getMessage()
+    def _thread_state(self) -> Tuple[io.StringIO, Any]:
+        local = self._local
+        try:
+            return local.buffer, local.writer
+        except AttributeError:
+            local.buffer = io.StringIO()
+            local.writer = csv.writer(local.buffer)
+            return local.buffer, local.writer
 
-        if record.exc_info:
-            # Cache the traceback text to avoid converting it multiple times
-            # (it's constant anyway)
-            exc_text = getattr(record, "exc_text", "")
-            if not exc_text:
-                record.exc_text = self.formatException(record.exc_info)
+    @property
+    def buffer(self) -> io.StringIO:
+        """
+        The buffer used by :py:meth:`~.format` in the current thread.
+        """
+        return self._thread_state()[0]
 
-        exc_text = getattr(record, "exc_text", "")
-        message_items = [
-            record.created,
-            record.filename,
-            record.funcName,
-            record.levelname,
-            record.levelno,
-            record.lineno,
-            record.module,
-            record.msecs,
-            record.name,
-            record.pathname,
-            record.process,
-            record.processName,
-            record.relativeCreated,
-            record.thread,
-            record.threadName,
-            record.message,
-            exc_text,
-        ]
-
-        self.writer.writerow(message_items)
-        output = self.buffer.getvalue()
-        self.buffer.seek(0)
-        self.buffer.truncate()
+    @property
+    def writer(self) -> Any:
+        """
+        The CSV writer used by :py:meth:`~.format` in the current thread.
+        """
+        return self._thread_state()[1]
+
+    def make_row(self, record: logging.LogRecord) -> List[Any]:
+        """
+        Return the values of the CSV columns for *record*.
+        """
+        return record_values(self, record)
+
+    @staticmethod
+    def render_rows(rows: Iterable[Sequence[Any]]) -> str:
+        """
+        Convert *rows* (as returned by :py:meth:`~.make_row`) to CSV text.
+        Each row is terminated by a newline.
+        """
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows)
+        return buffer.getvalue()
+
+    def format(self, record: logging.LogRecord) -> str:
+        buffer, writer = self._thread_state()
+        writer.writerow(self.make_row(record))
+        output = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
         return output.strip()
 
+    def format_many(self, records: Iterable[logging.LogRecord]) -> str:
+        """
+        Format all *records* in one go. This is considerably faster than
+        calling :py:meth:`~.format` for each record.
+
+        The result contains one line per record (plus additional lines for
+        values containing newlines), each terminated by a newline.
+        """
+        return self.render_rows(self.make_row(record) for record in records)
+
+
+class CSVFileHandler(logging.FileHandler):
+    """
+    A file handler writing :py:class:`~.CSVLog` rows in large chunks.
+
+    Rows are collected and written in one go once *batch_size* records are
+    pending, when a record with a level of *flush_level* or higher is
+    emitted, at the latest *max_latency* seconds after the previous write,
+    when the handler is flushed and when it is closed.
+
+    If the file is empty when it is opened, a header line with the column
+    names is written first.
+
+    :param filename: The name of the output file.
+    :param mode: The mode used to open the file.
+    :param encoding: The file encoding.
+    :param delay: If true, the file is opened with the first record.
+    :param batch_size: The number of records to collect before writing.
+    :param flush_level: Records of this level or higher are written
+        immediately.
+    :param header: Whether to write a header line to empty files.
+    :param max_latency: The maximum number of seconds a record stays in
+        memory. If this is ``0`` the rows are only written by the other
+        conditions.
+    :param index: Whether to maintain a sparse time index next to the file
+        (see :py:mod:`gouge.index`). A missing index is rebuilt when an
+        existing file is opened for appending.
+    :param index_records: Add an index entry every this many records.
+    :param index_seconds: Add an index entry if this many seconds passed
+        since the previous one.
+    """
+
+    def __init__(
+        self,
+        filename: "Union[str, os.PathLike[str]]",
+        mode: str = "a",
+        encoding: Optional[str] = "utf-8",
+        delay: bool = False,
+        batch_size: int = 1000,
+        flush_level: int = logging.ERROR,
+        header: bool = True,
+        index: bool = False,
+        index_records: int = EVERY_RECORDS,
+        index_seconds: float = EVERY_SECONDS,
+        max_latency: float = 1.0,
+    ) -> None:
+        self.header = header
+        self.max_latency = max_latency
+        self.batch_size = batch_size
+        self.flush_level = flush_level
+        self.use_index = index
+        self.index_records = index_records
+        self.index_seconds = index_seconds
+        self.index: Optional[TimeIndexWriter] = None
+        self._offset = 0
+        self._rows: List[List[Any]] = []
+        # Reported to handleError() if a periodic flush fails
+        self._last_record: Optional[logging.LogRecord] = None
+        super().__init__(filename, mode, encoding, delay)
+        self.formatter: CSVLog = CSVLog()
+        self._stop_flushing = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        if max_latency > 0:
+            self._flusher = threading.Thread(
+                target=self._flush_periodically,
+                name="gouge-csv-flush",
+                daemon=True,
+            )
+            self._flusher.start()
+
+    def _flush_periodically(self) -> None:
+        while not self._stop_flushing.wait(self.max_latency):
+            if not self._rows:
+                continue
+            record = self._last_record
+            try:
+                self.flush()
+            except Exception:  # pylint: disable=broad-except
+                if record is not None:
+                    self.handleError(record)
+
+    def setFormatter(self, fmt: Optional[logging.Formatter]) -> None:
+        if not isinstance(fmt, CSVLog):
+            raise TypeError("CSVFileHandler requires a CSVLog formatter")
+        super().setFormatter(fmt)
+
+    def _open(self) -> TextIO:
+        stream = super()._open()
+        # Newlines are written unchanged on all platforms. Otherwise the
+        # offsets counted for the index would be off by one per line.
+        stream.reconfigure(newline="")
+        if self.header and stream.tell() == 0:
+            stream.write(CSVLog.render_rows([CSVLog.COLUMNS]))
+        if self.use_index:
+            self._open_index()
+            self._offset = stream.tell()
+        return stream
+
+    def _open_index(self) -> None:
+        if self.index is not None:
+            self.index.close()
+        mode = "w" if "w" in self.mode else "a"
+        if mode == "a":
+            # Make sure the index covers the existing content
+            load_csv_index(
+                self.baseFilename,
+                self.index_records,
+                self.index_seconds,
+                self.encoding or "utf-8",
+            )
+        self.index = TimeIndexWriter(
+            index_filename(self.baseFilename),
+            mode,
+            self.index_records,
+            self.index_seconds,
+        )
+
+    def _write(self, text: str) -> None:
+        self.stream.write(text)
+        if self.index is not None:
+            self._offset += (
+                len(text)
+                if text.isascii()
+                else len(text.encode(self.encoding or "utf-8"))
+            )
+
+    def _write_rows(self, rows: List[List[Any]]) -> None:
+        if self.index is None:
+            self._write(CSVLog.render_rows(rows))
+            return
+        start = 0
+        for position, row in enumerate(rows):
+            if self.index.due(row[0]):
+                if position > start:
+                    self._write(CSVLog.render_rows(rows[start:position]))
+                    start = position
+                self.index.add(row[0], self._offset)
+        self._write(CSVLog.render_rows(rows[start:]))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._rows.append(self.formatter.make_row(record))
+            self._last_record = record
+            if (
+                len(self._rows) >= self.batch_size
+                or record.levelno >= self.flush_level
+            ):
+                self.flush()
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def flush(self) -> None:
+        """
+        Write all pending rows to the file.
+        """
+        self.acquire()
+        try:
+            if self._rows:
+                if self.stream is None:
+                    self.stream = self._open()
+                rows, self._rows = self._rows, []
+                self._write_rows(rows)
+            super().flush()
+            if self.index is not None:
+                self.index.flush()
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        self._stop_flushing.set()
+        self.flush()
+        super().close()
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
 
 class XMLLog(logging.Formatter):
     """
@@ -109,55 +490,196 @@ class XMLLog(logging.Formatter):
     """
 
     @staticmethod
-    def basicConfig(**kwargs: Any) -> None:
+    def basicConfig(buffered: bool = False, **kwargs: Any) -> None:
+        """
+        Convenience method to have a one-liner set-up.
+
+        The *kwargs* are passed on to :py:func:`logging.basicConfig`. After
+        that, the formatter of all root handlers is replaced. If *buffered* is
+        set, stream handlers are replaced by
+        :py:class:`~gouge.handlers.BufferedStreamHandler` instances.
+        """
         logging.basicConfig(**kwargs)
         root = logging.getLogger()
         for handler in root.handlers:
             handler.setFormatter(XMLLog())
+        if buffered:
+            buffer_handlers(root, root.handlers[:])
+
+    def format(self, record: logging.LogRecord) -> str:
+        values = record_values(self, record)
+        return XML_RECORD_TEMPLATE.format(
+            *[xml_escape(str(value)) for value in values]
+        )
+
+
+class JSONLog(logging.Formatter):
+    """
+    JSON Lines formatter for python loggers.
+
+    Each record is rendered as a JSON object on a single line. By default,
+    the object contains the same fields as :py:class:`~.CSVLog` (see
+    :py:data:`FIELDS`).
+
+    If `orjson <https://pypi.org/project/orjson/>`_ is installed it is used
+    for encoding, otherwise the standard :py:mod:`json` module is used. Both
+    produce compact output, but they differ in a few details: ``orjson``
+    writes large floats like ``1e16`` without a ``+`` in the exponent and
+    writes ``NaN`` and infinities as ``null``. Records which ``orjson``
+    cannot encode (for example integers larger than 64 bits) are encoded
+    with :py:mod:`json` instead. Values which cannot be encoded are
+    converted using :py:func:`str`.
+
+    :param fields: The record attributes to include (in that order).
+        ``"message"``, ``"exc_text"`` and ``"asctime"`` are computed if
+        requested. Attributes missing on a record are written as ``null``.
+    :param extra: Whether to include attributes passed in via ``extra`` when
+        logging. They are added after *fields*.
+    :param fast_encoder: Whether to use ``orjson`` if it is available.
+    """
+
+    @staticmethod
+    def basicConfig(buffered: bool = False, **kwargs: Any) -> None:
+        """
+        Convenience method to have a one-liner set-up.
+
+        The *kwargs* are passed on to :py:func:`logging.basicConfig`. After
+        that, the formatter of all root handlers is replaced. If *buffered* is
+        set, stream handlers are replaced by
+        :py:class:`~gouge.handlers.BufferedStreamHandler` instances.
+        """
+        logging.basicConfig(**kwargs)
+        root = logging.getLogger()
+        for handler in root.handlers:
+            handler.setFormatter(JSONLog())
+        if buffered:
+            buffer_handlers(root, root.handlers[:])
 
     def __init__(
-        self, fmt: Optional[str] = None, datefmt: Optional[str] = None
+        self,
+        fmt: Optional[str] = None,
+        datefmt: Optional[str] = None,
+        *,
+        fields: Sequence[str] = FIELDS,
+        extra: bool = True,
+        fast_encoder: bool = True,
     ) -> None:
         logging.Formatter.__init__(self, fmt, datefmt)
-        from xml.dom.minidom import Document
+        self.fields = tuple(fields)
+        self.extra = extra
+        self._extract = compile_extractor(self.fields)
+        self._needs_message = "message" in self.fields
+        self._needs_exc_text = "exc_text" in self.fields
+        self._needs_asctime = "asctime" in self.fields
+        self._reserved = RESERVED_ATTRIBUTES | set(self.fields)
+        self._dumps_json = json.JSONEncoder(
+            ensure_ascii=False, separators=(",", ":"), default=str
+        ).encode
+        self._dumps: Callable[[Dict[str, Any]], str]
+        if fast_encoder and orjson is not None:
+            self._dumps = self._dumps_orjson
+        else:
+            self._dumps = self._dumps_json
 
-        self.doc = Document()
+    def _dumps_orjson(self, data: Dict[str, Any]) -> str:
+        try:
+            return orjson.dumps(  # type: ignore
+                data, default=str, option=orjson.OPT_NON_STR_KEYS  # type: ignore
+            ).decode("utf8")
+        except TypeError:
+            return self._dumps_json(data)
 
     def format(self, record: logging.LogRecord) -> str:
-        record.message = record.getMessage()
+        if self._needs_message:
+            record.message = record.getMessage()
+        if self._needs_exc_text and record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if self._needs_asctime:
+            record.asctime = self.formatTime(record, self.datefmt)
+        data = self._extract(record)
+        if self.extra:
+            reserved = self._reserved
+            for key, value in vars(record).items():
+                if key not in reserved:
+                    data[key] = value
+        return self._dumps(data)
 
-        if record.exc_info:
-            # Cache the traceback text to avoid converting it multiple times
-            # (it's constant anyway)
-            exc_text = getattr(record, "exc_text", "")
-            if not exc_text:
-                record.exc_text = self.formatException(record.exc_info)
 
-        exc_text = getattr(record, "exc_text", "")
-        message_items = [
-            ("created", record.created),
-            ("filename", record.filename),
-            ("funcName", record.funcName),
-            ("levelname", record.levelname),
-            ("levelno", record.levelno),
-            ("lineno", record.lineno),
-            ("module", record.module),
-            ("msecs", record.msecs),
-            ("name", record.name),
-            ("pathname", record.pathname),
-            ("process", record.process),
-            ("processName", record.processName),
-            ("relativeCreated", record.relativeCreated),
-            ("thread", record.thread),
-            ("threadName", record.threadName),
-            ("message", record.message),
-            ("exc_text", exc_text),
-        ]
-
-        element = self.doc.createElement("record")
-        for tagname, value in message_items:
-            subelement = self.doc.createElement(tagname)
-            subelement.appendChild(self.doc.createTextNode(str(value)))
-            element.appendChild(subelement)
-        output: str = element.toxml()
-        return output
+class XMLFileHandler(logging.FileHandler):
+    """
+    A file handler writing :py:class:`~.XMLLog` records into a well-formed
+    XML document.
+
+    The records are wrapped in a single ``<log>`` root element which is
+    closed when the handler is closed. This makes the file consumable by
+    streaming parsers like :py:func:`xml.etree.ElementTree.iterparse`.
+
+    When appending to an existing, properly closed document, the closing tag
+    is removed first so that new records end up inside the root element.
+
+    :param filename: The name of the output file.
+    :param mode: The mode used to open the file.
+    :param encoding: The file encoding (also used in the XML declaration).
+    :param delay: If true, the file is opened with the first record.
+    """
+
+    ROOT_TAG = "log"
+
+    def __init__(
+        self,
+        filename: "Union[str, os.PathLike[str]]",
+        mode: str = "a",
+        encoding: str = "utf-8",
+        delay: bool = False,
+    ) -> None:
+        super().__init__(filename, mode, encoding, delay)
+        self.formatter: XMLLog = XMLLog()
+
+    @property
+    def _footer(self) -> str:
+        return f"</{self.ROOT_TAG}>\n"
+
+    def setFormatter(self, fmt: Optional[logging.Formatter]) -> None:
+        if not isinstance(fmt, XMLLog):
+            raise TypeError("XMLFileHandler requires an XMLLog formatter")
+        super().setFormatter(fmt)
+
+    def _open(self) -> TextIO:
+        if "a" in self.mode:
+            self._strip_footer()
+        stream = super()._open()
+        if stream.tell() == 0:
+            stream.write(
+                f'<?xml version="1.0" encoding="{self.encoding}"?>\n'
+                f"<{self.ROOT_TAG}>\n"
+            )
+        return stream
+
+    def _strip_footer(self) -> None:
+        """
+        Remove the closing root tag from an existing document.
+        """
+        footer = self._footer.encode(self.encoding or "utf-8")
+        try:
+            with open(self.baseFilename, "rb+") as existing:
+                existing.seek(0, os.SEEK_END)
+                size = existing.tell()
+                if size < len(footer):
+                    return
+                existing.seek(size - len(footer))
+                if existing.read() == footer:
+                    existing.truncate(size - len(footer))
+        except FileNotFoundError:
+            pass
+
+    def close(self) -> None:
+        """
+        Close the root element and the file.
+        """
+        self.acquire()
+        try:
+            if self.stream is not None and not self.stream.closed:
+                self.stream.write(self._footer)
+        finally:
+            self.release()
+        super().close()
@@ -1,6 +1,23 @@
 import re
+from collections import Counter
+from logging import LogRecord
+from operator import itemgetter
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Match,
+    Optional,
+    Pattern,
+    Sequence,
+    Tuple,
+    Union,
+)
 
-from gouge.colourcli import clr
+from gouge.cache import LRUCache
+from gouge.colourcli import PreFormatter, clr, colour_only, record_pre_formatter
 
 P_UVICORN_ACCESS = re.compile(
     r'^(?P<remote_host>\S+) - "'
@@ -18,29 +35,356 @@ METHOD_COLORS = {
 }
 
 
-def uvicorn_access(message: str) -> str:
+#: The message template used by uvicorn for access log records
+UVICORN_ACCESS_TEMPLATE = '%s - "%s %s HTTP/%s" %d'
+
+
+def _status_colour(status_code: int) -> str:
+    if status_code >= 500:
+        return f"{clr.Back.RED}{clr.Fore.YELLOW}"
+    if status_code >= 400:
+        return clr.Fore.BLUE
+    if status_code >= 300:
+        return clr.Fore.YELLOW
+    return clr.Fore.GREEN
+
+
+#: The colours of the HTTP status codes
+STATUS_COLORS = {code: _status_colour(code) for code in range(100, 600)}
+
+
+def _render_access(
+    remote_host: str, method: str, path: str, http: str, status: str, code: int
+) -> str:
+    status_color = STATUS_COLORS.get(code) or _status_colour(code)
+    method_color = METHOD_COLORS.get(method, clr.Fore.YELLOW)
+    return (
+        f"{clr.Fore.BLUE}{remote_host}{clr.Style.RESET_ALL}"
+        ' - "'
+        f"{method_color}{method}{clr.Style.RESET_ALL} "
+        f"{clr.Style.BRIGHT}{clr.Fore.WHITE}{path}{clr.Style.RESET_ALL} "
+        f"{clr.Fore.CYAN}{http}{clr.Style.RESET_ALL}"
+        '" '
+        f"{status_color}{status}{clr.Style.RESET_ALL}"
+    )
+
+
+@colour_only
+@record_pre_formatter
+def uvicorn_access(message: Union[str, LogRecord]) -> str:
     """
     A sample pre-formatter for the "uvicorn.access" logger
+
+    When used with :py:class:`~gouge.colourcli.Simple` it receives the
+    record and uses the arguments of uvicorn's access log message directly.
+    If called with a message (or if the record does not use the expected
+    template), the message is parsed instead.
     """
+    if isinstance(message, LogRecord):
+        record = message
+        args = record.args
+        if (
+            record.msg == UVICORN_ACCESS_TEMPLATE
+            and isinstance(args, tuple)
+            and len(args) == 5
+            and args[1] in METHOD_COLORS
+            and isinstance(args[4], int)
+        ):
+            remote_host, method, path, http_version, status_code = args
+            return _render_access(
+                str(remote_host),
+                method,
+                str(path),
+                f"HTTP/{http_version}",
+                "%d" % status_code,
+                status_code,
+            )
+        message = record.getMessage()
     match = P_UVICORN_ACCESS.match(message)
     if match:
         remote_host, method, path, http_version, status_code = match.groups()
-        if int(status_code) >= 500:
-            status_color = f"{clr.Back.RED}{clr.Fore.YELLOW}"
-        elif int(status_code) >= 400:
-            status_color = clr.Fore.BLUE
-        elif int(status_code) >= 300:
-            status_color = clr.Fore.YELLOW
-        else:
-            status_color = clr.Fore.GREEN
-        method_color = METHOD_COLORS.get(method, clr.Fore.YELLOW)
-        return (
-            f"{clr.Fore.BLUE}{remote_host}{clr.Style.RESET_ALL}"
-            ' - "'
-            f"{method_color}{method}{clr.Style.RESET_ALL} "
-            f"{clr.Style.BRIGHT}{clr.Fore.WHITE}{path}{clr.Style.RESET_ALL} "
-            f"{clr.Fore.CYAN}{http_version}{clr.Style.RESET_ALL}"
-            '" '
-            f"{status_color}{status_code}{clr.Style.RESET_ALL}"
+        return _render_access(
+            remote_host,
+            method,
+            path,
+            http_version,
+            status_code,
+            int(status_code),
         )
     return message
+
+
+#: Inline flags which can be applied to a part of a regular expression
+SCOPED_FLAGS = {
+    re.IGNORECASE: "i",
+    re.MULTILINE: "m",
+    re.DOTALL: "s",
+    re.VERBOSE: "x",
+}
+
+#: How many combinations of matching rules a :py:class:`Highlighter` keeps
+#: compiled.
+HIGHLIGHT_CACHE_SIZE = 256
+
+P_GROUP_NAME = re.compile(r"\(\?P([<=])(\w+)([>)])")
+
+
+class HighlightRule:
+    """
+    A regular expression and the colours of its named groups, used by
+    :py:class:`Highlighter`.
+
+    :param pattern: The regular expression. Only the named groups listed in
+        *colours* are coloured. If groups are nested, the outer one wins.
+        As the pattern is combined with others, backreferences must use
+        names (``(?P=name)``) instead of numbers.
+    :param colours: A mapping from group names to ANSI sequences (for
+        example ``colorama.Fore.GREEN``).
+    :param name: The name used for the hit counter. Defaults to the pattern.
+    :param flags: Regular expression flags. Only :py:data:`re.IGNORECASE`,
+        :py:data:`re.MULTILINE`, :py:data:`re.DOTALL` and
+        :py:data:`re.VERBOSE` are supported.
+    """
+
+    def __init__(
+        self,
+        pattern: Union[str, Pattern[str]],
+        colours: Mapping[str, str],
+        name: Optional[str] = None,
+        flags: int = 0,
+    ) -> None:
+        if not isinstance(pattern, str):
+            flags |= pattern.flags & ~re.UNICODE
+            pattern = pattern.pattern
+        unsupported = flags & ~sum(SCOPED_FLAGS)
+        if unsupported:
+            raise ValueError(f"Unsupported regular expression flags: {flags!r}")
+        compiled = re.compile(pattern, flags)
+        unknown = set(colours) - set(compiled.groupindex)
+        if unknown:
+            raise ValueError(
+                f"Unknown groups in {pattern!r}: {', '.join(sorted(unknown))}"
+            )
+        self.pattern = pattern
+        self.flags = flags
+        self.colours = dict(colours)
+        self.name = name or pattern
+
+    def __repr__(self) -> str:
+        return f"HighlightRule({self.pattern!r}, name={self.name!r})"
+
+    def scoped(self, prefix: str) -> str:
+        """
+        Return the pattern with its flags applied inline and all group names
+        prefixed with *prefix*, so it can be combined with other patterns.
+        """
+        pattern = P_GROUP_NAME.sub(
+            lambda match: f"(?P{match[1]}{prefix}{match[2]}{match[3]}",
+            self.pattern,
+        )
+        letters = "".join(
+            letter for flag, letter in SCOPED_FLAGS.items() if self.flags & flag
+        )
+        if letters:
+            pattern = f"(?{letters}:{pattern})"
+        return pattern
+
+
+class Highlighter:
+    """
+    A pre-formatter colouring the matches of many :py:class:`HighlightRule`
+    instances.
+
+    Each rule is first searched on its own, which is fast for patterns
+    starting with a literal (the regex engine skips ahead to it). Messages
+    which match no rule are returned unchanged. The rules which do match are
+    combined into a single regular expression (cached per combination) to
+    colour the message, so overlapping matches are resolved consistently:
+    where rules overlap, the first rule in the list wins. Matches are counted
+    per rule name in :py:attr:`hits`, which helps finding rules which never
+    match.
+
+    :param rules: The rules.
+    """
+
+    def __init__(self, rules: Iterable[HighlightRule] = ()) -> None:
+        self.colour_only = True
+        self.rules: List[HighlightRule] = []
+        self.hits: "Counter[str]" = Counter()
+        self._compiled: Optional[_CompiledRules] = None
+        self.extend(rules)
+
+    def add(self, rule: HighlightRule) -> None:
+        """
+        Add *rule* after the existing rules.
+        """
+        self.extend([rule])
+
+    def extend(self, rules: Iterable[HighlightRule]) -> None:
+        """
+        Add *rules* after the existing rules.
+        """
+        self.rules.extend(rules)
+        self._compile()
+
+    def _compile(self) -> None:
+        if not self.rules:
+            self._compiled = None
+            return
+        # Replaced in one step, so concurrent calls see either version
+        self._compiled = _CompiledRules(self.rules)
+
+    def __call__(self, message: str) -> str:
+        compiled = self._compiled
+        if compiled is None:
+            return message
+        regex, start = compiled.prefilter(message)
+        if regex is None:
+            return message
+        lookup = compiled.lookup
+        reset = clr.Style.RESET_ALL
+        parts = []
+        position = 0
+        for match in regex.finditer(message, start):
+            # The outer group of a rule closes last
+            name, groups = lookup[int(match.lastgroup[2:])]  # type: ignore
+            self.hits[name] += 1
+            for group, colour in groups:
+                start, end = match.span(group)
+                if start < position or start == end:
+                    continue
+                parts.extend((message[position:start], colour))
+                parts.extend((message[start:end], reset))
+                position = end
+        if not parts:
+            return message
+        parts.append(message[position:])
+        return "".join(parts)
+
+
+class _CompiledRules:
+    """
+    The compiled form of the rules of a :py:class:`Highlighter`.
+
+    :py:meth:`prefilter` searches each rule separately and returns a combined
+    expression of the rules which matched. A rule without any match in the
+    message cannot change the result of the combined expression, so leaving
+    it out only saves work.
+    """
+
+    def __init__(self, rules: Sequence[HighlightRule]) -> None:
+        self.searches: List[Callable[[str], Optional[Match[str]]]] = []
+        self.alternatives: List[str] = []
+        # For each rule: the name and the colours by combined group name
+        self.lookup: List[Tuple[str, List[Tuple[str, str]]]] = []
+        for position, rule in enumerate(rules):
+            prefix = f"_r{position}_"
+            compiled = re.compile(rule.pattern, rule.flags)
+            self.searches.append(compiled.search)
+            self.alternatives.append(f"(?P<_r{position}>{rule.scoped(prefix)})")
+            groups = sorted(compiled.groupindex.items(), key=itemgetter(1))
+            self.lookup.append(
+                (
+                    rule.name,
+                    [
+                        (prefix + group, rule.colours[group])
+                        for group, _ in groups
+                        if group in rule.colours
+                    ],
+                )
+            )
+        self.combined: LRUCache[Pattern[str]] = LRUCache(HIGHLIGHT_CACHE_SIZE)
+
+    def prefilter(self, message: str) -> Tuple[Optional[Pattern[str]], int]:
+        """
+        Return the combined expression of the rules matching *message* (or
+        *None* if no rule matches) and the position of the first match.
+        """
+        matching = []
+        start = len(message)
+        for position, search in enumerate(self.searches):
+            match = search(message)
+            if match is not None:
+                matching.append(position)
+                start = min(start, match.start())
+        if not matching:
+            return None, 0
+        key = tuple(matching)
+        regex = self.combined.get(key)
+        if regex is None:
+            regex = re.compile(
+                "|".join(self.alternatives[position] for position in key)
+            )
+            self.combined.put(key, regex)
+        return regex, start
+
+
+class HighlightRegistry:
+    """
+    A collection of :py:class:`HighlightRule` instances by logger name,
+    with one :py:class:`Highlighter` per logger.
+
+    Example::
+
+        registry = HighlightRegistry()
+        registry.add(
+            "gunicorn.access",
+            r'"(?P<method>GET|POST) ',
+            {"method": clr.Fore.GREEN},
+        )
+        registry.add(
+            "",
+            r"request_id=(?P<id>[0-9a-f-]+)",
+            {"id": clr.Fore.MAGENTA},
+            name="request-id",
+        )
+        formatter = Simple(
+            pre_formatters=registry.pre_formatters(),
+            pre_formatter_lookup=PF_PARENT_FIRST,
+        )
+
+    Rules added later to a logger which is already in the registry are also
+    used by formatters created before. For new loggers, pass the result of
+    :py:meth:`pre_formatters` to the formatter again.
+    """
+
+    def __init__(self) -> None:
+        self.highlighters: Dict[str, Highlighter] = {}
+
+    def add(
+        self,
+        logger: str,
+        pattern: Union[str, Pattern[str]],
+        colours: Mapping[str, str],
+        name: Optional[str] = None,
+        flags: int = 0,
+    ) -> HighlightRule:
+        """
+        Add a rule for *logger*. See :py:class:`HighlightRule` for the
+        arguments.
+        """
+        rule = HighlightRule(pattern, colours, name, flags)
+        highlighter = self.highlighters.get(logger)
+        if highlighter is None:
+            highlighter = self.highlighters[logger] = Highlighter()
+        highlighter.add(rule)
+        return rule
+
+    def pre_formatters(self) -> Dict[str, List[PreFormatter]]:
+        """
+        Return the highlighters in the form expected by the *pre_formatters*
+        argument of :py:class:`gouge.colourcli.Simple`.
+        """
+        return {
+            logger: [highlighter]
+            for logger, highlighter in self.highlighters.items()
+        }
+
+    def hits(self) -> Dict[str, "Counter[str]"]:
+        """
+        Return the number of matches per rule name, by logger name.
+        """
+        return {
+            logger: Counter(highlighter.hits)
+            for logger, highlighter in self.highlighters.items()
+        }
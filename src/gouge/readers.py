@@ -0,0 +1,206 @@
+"""
+This module contains readers for log files written by gouge.
+
+The records returned by the readers are :py:class:`logging.LogRecord`
+instances. They can be formatted again (for example with
+:py:class:`gouge.colourcli.Simple`) or passed on to handlers.
+"""
+import csv
+import logging
+import os
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from gouge.index import index_filename, read_csv_slice
+from gouge.parseable import FIELDS
+
+#: Default size of the read buffer.
+BUFFER_SIZE = 1024 * 1024
+
+
+def _optional_int(value: str) -> Optional[int]:
+    return int(value) if value else None
+
+
+#: Columns converted on first access: attribute -> (column, converter)
+_CONVERSIONS: Dict[str, Tuple[int, Callable[[str], Any]]] = {
+    "created": (FIELDS.index("created"), float),
+    "levelno": (FIELDS.index("levelno"), int),
+    "lineno": (FIELDS.index("lineno"), int),
+    "msecs": (FIELDS.index("msecs"), float),
+    "process": (FIELDS.index("process"), _optional_int),
+    "relativeCreated": (FIELDS.index("relativeCreated"), float),
+    "thread": (FIELDS.index("thread"), _optional_int),
+}
+
+
+class CSVLogRecord(logging.LogRecord):
+    """
+    A log record read from a :py:class:`~gouge.parseable.CSVLog` file.
+
+    Text columns are assigned directly. Numeric columns (``created``,
+    ``levelno``, ``lineno``, ``msecs``, ``process``, ``relativeCreated`` and
+    ``thread``) are only converted when they are first accessed.
+
+    The message is stored as ``msg`` without arguments, so
+    :py:meth:`~logging.LogRecord.getMessage` returns it unchanged. Exception
+    information is only available as text in ``exc_text``.
+
+    :param row: The values of one CSV row in the order of
+        :py:data:`gouge.parseable.FIELDS`.
+    """
+
+    __slots__ = ("_row",)
+
+    args = ()
+    exc_info = None
+    stack_info = None
+    taskName = None
+
+    # The parent initialiser is deliberately not called: it would compute
+    # values (timestamps, process and thread information) of the *current*
+    # process which are replaced anyway.
+    def __init__(self, row: List[str]):  # pylint: disable=super-init-not-called
+        self._row = row
+        (
+            _,
+            self.filename,
+            func_name,
+            self.levelname,
+            _,
+            _,
+            self.module,
+            _,
+            self.name,
+            self.pathname,
+            _,
+            process_name,
+            _,
+            _,
+            thread_name,
+            self.msg,
+            exc_text,
+        ) = row
+        self.message = self.msg
+        self.funcName = func_name or None
+        self.threadName = thread_name or None
+        self.processName = process_name or None
+        self.exc_text = exc_text or None
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            column, convert = _CONVERSIONS[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        value = convert(self._row[column])
+        setattr(self, name, value)
+        return value
+
+
+class CSVLogReader:
+    """
+    Read log records from a file written with
+    :py:class:`~gouge.parseable.CSVLog` (with or without a header line).
+
+    The file is read in large chunks and parsed as a stream, so the memory
+    use does not depend on the size of the file. Values spanning several
+    lines (like tracebacks in ``exc_text``) are supported.
+
+    :param filename: The file to read.
+    :param encoding: The file encoding.
+    :param buffer_size: The size of the read buffer in bytes.
+    """
+
+    def __init__(
+        self,
+        filename: "Union[str, os.PathLike[str]]",
+        encoding: str = "utf-8",
+        buffer_size: int = BUFFER_SIZE,
+    ) -> None:
+        self.filename = filename
+        self.encoding = encoding
+        self.buffer_size = buffer_size
+
+    def __iter__(self) -> Iterator[CSVLogRecord]:
+        return self.records()
+
+    def rows(self) -> Iterator[List[str]]:
+        """
+        Yield the raw CSV rows, without the header.
+
+        :raises ValueError: If a row does not have the expected number of
+            columns.
+        """
+        columns = len(FIELDS)
+        header = list(FIELDS)
+        with open(
+            self.filename,
+            encoding=self.encoding,
+            newline="",
+            buffering=self.buffer_size,
+        ) as fptr:
+            reader = csv.reader(fptr)
+            for row in reader:
+                if len(row) != columns:
+                    if not row:
+                        continue
+                    raise ValueError(
+                        f"{self.filename}:{reader.line_num}: Expected "
+                        f"{columns} columns but got {len(row)}"
+                    )
+                if row == header:
+                    continue
+                yield row
+
+    def records(
+        self,
+        min_level: int = logging.NOTSET,
+        logger: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Iterator[CSVLogRecord]:
+        """
+        Iterate over the log records in the file.
+
+        If *start* or *end* is given and the file has a time index (see
+        :py:mod:`gouge.index`), only the relevant part of the file is read.
+
+        :param min_level: Skip records with a lower level.
+        :param logger: Only return records of this logger and its
+            descendants.
+        :param start: Skip records created before this timestamp.
+        :param end: Skip records created at or after this timestamp.
+        """
+        rows: Iterable[List[str]]
+        if (start is not None or end is not None) and os.path.exists(
+            index_filename(self.filename)
+        ):
+            rows = read_csv_slice(self.filename, start, end, self.encoding)
+            start = end = None
+        else:
+            rows = self.rows()
+        prefix = None if logger is None else logger + "."
+        for row in rows:
+            record = CSVLogRecord(row)
+            if min_level > logging.NOTSET and record.levelno < min_level:
+                continue
+            if start is not None and record.created < start:
+                continue
+            if end is not None and record.created >= end:
+                continue
+            if (
+                prefix is not None
+                and record.name != logger
+                and not record.name.startswith(prefix)
+            ):
+                continue
+            yield record
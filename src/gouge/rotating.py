@@ -0,0 +1,392 @@
+"""
+This module contains a file handler which rotates and compresses log files.
+"""
+import gzip
+import logging
+import math
+import os
+import queue
+import re
+import shutil
+import time
+from threading import Thread
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from gouge.index import index_filename
+from gouge.parseable import CSVFileHandler, CSVLog, XMLFileHandler, XMLLog
+
+try:
+    from compression import zstd  # type: ignore
+except ImportError:  # pragma: no cover
+    try:
+        import zstandard as zstd  # type: ignore
+    except ImportError:
+        zstd = None
+
+#: Compress rotated files with gzip
+GZIP = "gzip"
+#: Compress rotated files with zstd (requires Python 3.14 or ``zstandard``)
+ZSTD = "zstd"
+#: Use zstd if available, gzip otherwise
+AUTO = "auto"
+
+COMPRESSIONS = (GZIP, ZSTD, AUTO)
+
+EXTENSIONS = {GZIP: ".gz", ZSTD: ".zst"}
+
+
+def _compress_gzip(source: str, target: str) -> None:
+    with open(source, "rb") as infile, gzip.open(target, "wb") as outfile:
+        shutil.copyfileobj(infile, outfile, 1024 * 1024)
+
+
+def _compress_zstd(source: str, target: str) -> None:
+    with open(source, "rb") as infile, open(target, "wb") as outfile:
+        if hasattr(zstd, "ZstdCompressor"):
+            # The "zstandard" package
+            zstd.ZstdCompressor().copy_stream(infile, outfile)
+        else:
+            with zstd.ZstdFile(outfile, "wb") as compressed:
+                shutil.copyfileobj(infile, compressed, 1024 * 1024)
+
+
+COMPRESSORS: Dict[str, Callable[[str, str], None]] = {
+    GZIP: _compress_gzip,
+    ZSTD: _compress_zstd,
+}
+
+
+class RotatingFileHandler(logging.Handler):
+    """
+    A file handler which starts a new file ("segment") when the current one
+    grows too large or gets too old. Rotated segments are renamed to
+    ``<name>.<timestamp><extension>`` (for example
+    ``app.20240131-120000.csv``) and optionally compressed on a background
+    thread, so the logging thread never waits on compression.
+
+    The output format depends on the formatter:
+
+    * :py:class:`~gouge.parseable.CSVLog`: each segment is written by a
+      :py:class:`~gouge.parseable.CSVFileHandler` and starts with a header.
+    * :py:class:`~gouge.parseable.XMLLog`: each segment is written by a
+      :py:class:`~gouge.parseable.XMLFileHandler` and is a complete XML
+      document.
+    * anything else (for example :py:class:`~gouge.parseable.JSONLog`): each
+      segment is written by a :py:class:`logging.FileHandler`.
+
+    :param filename: The name of the current log file.
+    :param formatter: The formatter. Defaults to
+        :py:class:`~gouge.parseable.CSVLog`.
+    :param max_bytes: Rotate when the file reaches roughly this size (the
+        written characters are counted, which equals the bytes for ASCII
+        output). Handlers which write in batches may exceed it by one batch.
+        ``0`` disables size based rotation.
+    :param interval: Rotate every *interval* seconds. The boundaries are
+        multiples of *interval* since the epoch (so ``86400`` rotates at
+        midnight UTC). ``0`` disables time based rotation.
+    :param compression: One of :py:data:`GZIP`, :py:data:`ZSTD`,
+        :py:data:`AUTO` or *None* to keep rotated files uncompressed.
+    :param backup_count: Keep at most this many rotated files. ``0`` keeps
+        all files.
+    :param max_age: Delete rotated files older than this many seconds.
+        ``0`` keeps all files.
+    :param encoding: The file encoding.
+    :param handler_kwargs: Additional arguments for the segment handler
+        (for example ``batch_size`` for CSV output).
+    """
+
+    def __init__(
+        self,
+        filename: "Union[str, os.PathLike[str]]",
+        formatter: Optional[logging.Formatter] = None,
+        max_bytes: int = 0,
+        interval: float = 0,
+        compression: Optional[str] = AUTO,
+        backup_count: int = 0,
+        max_age: float = 0,
+        encoding: str = "utf-8",
+        **handler_kwargs: Any,
+    ) -> None:
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(
+                f"Unknown compression {compression!r}. "
+                f"Expected one of {COMPRESSIONS!r} or None"
+            )
+        if compression == AUTO:
+            compression = ZSTD if zstd is not None else GZIP
+        if compression == ZSTD and zstd is None:
+            raise ValueError(
+                "zstd compression requires Python 3.14 or the "
+                "'zstandard' package"
+            )
+        super().__init__()
+        self.baseFilename = os.path.abspath(filename)
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.compression = compression
+        self.backup_count = backup_count
+        self.max_age = max_age
+        self.encoding = encoding
+        # Segments are only created on disk with the first record
+        self.handler_kwargs = {"delay": True, **handler_kwargs}
+        self.formatter = formatter or CSVLog()
+        self._segment: logging.Handler = self._open_segment()
+        self._segment_records = 0
+        self._segment_started = 0.0
+        self._rollover_at = math.inf
+        if os.path.exists(self.baseFilename):
+            stat = os.stat(self.baseFilename)
+            if stat.st_size:
+                # Continue the existing file as if it contained one record
+                self._start_segment(stat.st_mtime)
+        self._worker: Optional[Thread] = None
+        self._jobs: "queue.Queue[Optional[str]]" = queue.Queue()
+
+    def setFormatter(self, fmt: Optional[logging.Formatter]) -> None:
+        """
+        Set the formatter. The current segment is rotated first if the
+        output format changes.
+        """
+        self.acquire()
+        try:
+            self.formatter = fmt or CSVLog()
+            if self._segment.__class__ is _segment_class(self.formatter):
+                self._segment.setFormatter(self.formatter)
+            else:
+                self.rotate()
+        finally:
+            self.release()
+
+    def _open_segment(self) -> logging.Handler:
+        cls = _segment_class(self.formatter)
+        handler: logging.Handler = cls(
+            self.baseFilename, encoding=self.encoding, **self.handler_kwargs
+        )
+        handler.setFormatter(self.formatter)
+        return handler
+
+    def _start_segment(self, created: float) -> None:
+        self._segment_records = 1
+        self._segment_started = created
+        if self.interval > 0:
+            self._rollover_at = (
+                math.floor(created / self.interval) + 1
+            ) * self.interval
+
+    def _should_rotate(self, record: logging.LogRecord) -> bool:
+        if not self._segment_records:
+            return False
+        if record.created >= self._rollover_at:
+            return True
+        if self.max_bytes > 0:
+            stream = getattr(self._segment, "stream", None)
+            if isinstance(stream, _CountingStream):
+                return stream.size >= self.max_bytes
+        return False
+
+    def _count_writes(self) -> None:
+        """
+        Wrap the stream of the current segment to count the written
+        characters, once the segment handler has opened it.
+        """
+        self._segment.acquire()
+        try:
+            stream = getattr(self._segment, "stream", None)
+            if stream is not None and not isinstance(stream, _CountingStream):
+                self._segment.stream = _CountingStream(  # type: ignore
+                    stream, stream.tell()
+                )
+        finally:
+            self._segment.release()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            if self._should_rotate(record):
+                self.rotate()
+            # handle() takes the lock of the segment, which its own
+            # background flusher (if any) uses as well.
+            self._segment.handle(record)
+            if self.max_bytes > 0:
+                self._count_writes()
+            if self._segment_records:
+                self._segment_records += 1
+            else:
+                self._start_segment(record.created)
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def _segment_name(self) -> str:
+        root, ext = os.path.splitext(self.baseFilename)
+        stamp = time.strftime(
+            "%Y%m%d-%H%M%S", time.localtime(self._segment_started)
+        )
+        name = f"{root}.{stamp}{ext}"
+        counter = 0
+        extension = EXTENSIONS.get(self.compression or "", "")
+        while os.path.exists(name) or os.path.exists(name + extension):
+            counter += 1
+            name = f"{root}.{stamp}-{counter}{ext}"
+        return name
+
+    def rotate(self) -> None:
+        """
+        Close the current segment, rename it and start a new one. The
+        renamed file is compressed and old files are removed in the
+        background.
+        """
+        self.acquire()
+        try:
+            self._segment.close()
+            if self._segment_records:
+                segment = self._segment_name()
+                os.rename(self.baseFilename, segment)
+                if os.path.exists(index_filename(self.baseFilename)):
+                    os.rename(
+                        index_filename(self.baseFilename),
+                        index_filename(segment),
+                    )
+                self._submit(segment)
+            self._segment = self._open_segment()
+            self._segment_records = 0
+            self._rollover_at = math.inf
+        finally:
+            self.release()
+
+    def _submit(self, segment: str) -> None:
+        if self._worker is None:
+            self._worker = Thread(
+                target=self._work, name="gouge-rotate", daemon=True
+            )
+            self._worker.start()
+        self._jobs.put(segment)
+
+    def _work(self) -> None:
+        while True:
+            segment = self._jobs.get()
+            try:
+                if segment is None:
+                    return
+                self._process(segment)
+            except Exception:  # pylint: disable=broad-except
+                # Same as logging.Handler.handleError: errors while handling
+                # log output must not break the application.
+                if logging.raiseExceptions:
+                    logging.getLogger("gouge").exception(
+                        "Unable to compress or clean up %s", segment
+                    )
+            finally:
+                self._jobs.task_done()
+
+    def _process(self, segment: str) -> None:
+        if self.compression is not None:
+            target = segment + EXTENSIONS[self.compression]
+            COMPRESSORS[self.compression](segment, target)
+            os.unlink(segment)
+            # The byte offsets in the index refer to the uncompressed file
+            if os.path.exists(index_filename(segment)):
+                os.unlink(index_filename(segment))
+        self.apply_retention()
+
+    def rotated_files(self) -> List[str]:
+        """
+        Return the rotated files of this handler, oldest first.
+        """
+        directory, basename = os.path.split(self.baseFilename)
+        root, ext = os.path.splitext(basename)
+        # The names created by _segment_name (and compressed variants)
+        pattern = re.compile(
+            rf"{re.escape(root)}\.\d{{8}}-\d{{6}}(-\d+)?{re.escape(ext)}"
+            r"(\.gz|\.zst)?"
+        )
+        output = []
+        for name in os.listdir(directory):
+            if pattern.fullmatch(name):
+                output.append(os.path.join(directory, name))
+        output.sort(key=os.path.getmtime)
+        return output
+
+    def apply_retention(self) -> None:
+        """
+        Delete rotated files exceeding *backup_count* or *max_age*.
+        """
+        if not self.backup_count and not self.max_age:
+            return
+        files = self.rotated_files()
+        expired = []
+        if self.backup_count and len(files) > self.backup_count:
+            expired = files[: len(files) - self.backup_count]
+            files = files[len(expired) :]
+        if self.max_age:
+            limit = time.time() - self.max_age
+            expired.extend(
+                name for name in files if os.path.getmtime(name) < limit
+            )
+        for name in expired:
+            # Uncompressed segments may still have their time index
+            for filename in (name, index_filename(name)):
+                try:
+                    os.unlink(filename)
+                except FileNotFoundError:
+                    pass
+
+    def flush(self) -> None:
+        """
+        Flush the current segment. This does not wait for pending
+        compressions (see :py:meth:`~.wait`).
+        """
+        self.acquire()
+        try:
+            self._segment.flush()
+        finally:
+            self.release()
+
+    def wait(self) -> None:
+        """
+        Wait until all rotated files have been compressed.
+        """
+        if self._worker is not None:
+            self._jobs.join()
+
+    def close(self) -> None:
+        """
+        Close the current segment and wait for pending compressions.
+        """
+        self.acquire()
+        try:
+            self._segment.close()
+            worker, self._worker = self._worker, None
+        finally:
+            self.release()
+        if worker is not None:
+            self._jobs.put(None)
+            worker.join()
+        super().close()
+
+
+class _CountingStream:
+    """
+    A proxy for a text stream which counts the written characters, so the
+    size of a segment is known without a system call per record.
+
+    :param stream: The wrapped stream.
+    :param size: The size of the existing content.
+    """
+
+    def __init__(self, stream: Any, size: int) -> None:
+        self._stream = stream
+        self.size = size
+
+    def write(self, data: str) -> int:
+        self.size += len(data)
+        return self._stream.write(data)  # type: ignore
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+
+def _segment_class(formatter: logging.Formatter) -> type:
+    if isinstance(formatter, CSVLog):
+        return CSVFileHandler
+    if isinstance(formatter, XMLLog):
+        return XMLFileHandler
+    return logging.FileHandler
@@ -0,0 +1,124 @@
+import logging
+
+import pytest
+
+from gouge.aggregate import LogTable
+from gouge.binary import BinaryFileHandler, BinaryLogReader
+from gouge.cli import main
+from gouge.parseable import CSVFileHandler
+
+
+@pytest.fixture(params=[False, True], ids=["python", "numpy"])
+def use_numpy(request):
+    if request.param:
+        pytest.importorskip("numpy")
+    return request.param
+
+
+def _records():
+    data = [
+        # name, level, funcName, created
+        ("app", logging.INFO, "a", 0),
+        ("app", logging.ERROR, "a", 10),
+        ("app", logging.ERROR, "b", 70),
+        ("db", logging.ERROR, "a", 80),
+        ("db", logging.INFO, "c", 130),
+        ("app", logging.ERROR, "a", 150),
+    ]
+    for name, level, func, created in data:
+        record = logging.LogRecord(
+            name, level, "/path/to/file.py", 42, "message", (), None, func
+        )
+        record.created = float(created)
+        yield record
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    filename = tmp_path / "log.csv"
+    handler = CSVFileHandler(filename)
+    for record in _records():
+        handler.handle(record)
+    handler.close()
+    return filename
+
+
+def test_dictionary_encoding(csv_file):
+    table = LogTable.from_csv(csv_file, ["name", "levelname"])
+    assert len(table) == 6
+    assert table.columns["name"].values == ["app", "db"]
+    assert list(table.columns["name"].codes) == [0, 0, 0, 1, 1, 0]
+
+
+def test_count_by_interval(csv_file, use_numpy):
+    table = LogTable.from_csv(csv_file, ["name", "levelname", "created"])
+    counts = table.count(["name", "levelname"], 60, use_numpy=use_numpy)
+    assert counts == {
+        (0, "app", "INFO"): 1,
+        (0, "app", "ERROR"): 1,
+        (60, "app", "ERROR"): 1,
+        (60, "db", "ERROR"): 1,
+        (120, "db", "INFO"): 1,
+        (120, "app", "ERROR"): 1,
+    }
+
+
+def test_count_where(csv_file, use_numpy):
+    table = LogTable.from_csv(csv_file, ["funcName", "levelname", "name"])
+    counts = table.count(
+        ["funcName"], where={"levelname": "ERROR"}, use_numpy=use_numpy
+    )
+    assert counts.most_common(1) == [(("a",), 3)]
+    counts = table.count(
+        where={"levelname": ["ERROR", "INFO"], "name": "db"},
+        use_numpy=use_numpy,
+    )
+    assert counts == {(): 2}
+    counts = table.count(
+        ["name"], where={"levelname": "CRITICAL"}, use_numpy=use_numpy
+    )
+    assert counts == {}
+
+
+def test_count_numeric_column(csv_file, use_numpy):
+    table = LogTable.from_csv(csv_file, ["levelno"])
+    counts = table.count(["levelno"], use_numpy=use_numpy)
+    assert counts == {(logging.INFO,): 2, (logging.ERROR,): 4}
+
+
+def test_histogram(csv_file):
+    table = LogTable.from_csv(csv_file, ["created", "name"])
+    assert table.histogram("created", 100) == {0: 4, 100: 2}
+    assert table.histogram("created", 100, where={"name": "db"}) == {
+        0: 1,
+        100: 1,
+    }
+    with pytest.raises(ValueError):
+        table.histogram("name", 100)
+
+
+def test_unknown_and_missing_columns(csv_file):
+    with pytest.raises(ValueError, match="Unknown column"):
+        LogTable(["nope"])
+    table = LogTable.from_csv(csv_file, ["name"])
+    with pytest.raises(ValueError, match="has not been loaded"):
+        table.count(["levelname"])
+
+
+def test_from_records(tmp_path):
+    filename = tmp_path / "log.bin"
+    handler = BinaryFileHandler(filename)
+    for record in _records():
+        handler.handle(record)
+    handler.close()
+    with BinaryLogReader(filename) as reader:
+        table = LogTable.from_records(reader, ["name"])
+    assert table.count(["name"]) == {("app",): 4, ("db",): 2}
+
+
+def test_cli(csv_file, capsys):
+    args = ["aggregate", str(csv_file), "--by", "funcName"]
+    assert main(args + ["--where", "levelname=ERROR", "--top", "1"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split() == ["funcName", "count"]
+    assert [line.split() for line in lines[1:]] == [["a", "3"]]
@@ -0,0 +1,173 @@
+import csv
+import logging
+import sys
+from xml.etree import ElementTree
+
+import pytest
+
+from gouge.binary import BinaryFileHandler, BinaryLogReader, convert
+from gouge.cli import main
+from gouge.parseable import FIELDS, CSVFileHandler, CSVLog
+
+
+def _record(name="the.logger", msg="message", level=logging.INFO, **kwargs):
+    record = logging.LogRecord(
+        name,
+        level,
+        "/path/to/file.py",
+        42,
+        msg,
+        (),
+        kwargs.pop("exc_info", None),
+    )
+    record.__dict__.update(kwargs)
+    return record
+
+
+def _exc_info():
+    try:
+        raise ValueError("line 1\nline 2")
+    except ValueError:
+        return sys.exc_info()
+
+
+def _write(filename, records):
+    handler = BinaryFileHandler(filename)
+    for record in records:
+        handler.handle(record)
+    handler.close()
+
+
+def test_roundtrip(tmp_path):
+    filename = tmp_path / "log.bin"
+    original = _record(msg="hello %s", exc_info=_exc_info())
+    original.args = ("wörld",)
+    _write(filename, [original])
+
+    with BinaryLogReader(filename) as reader:
+        (record,) = list(reader)
+
+    assert record.getMessage() == "hello wörld"
+    assert "line 2" in record.exc_text
+    for field in FIELDS:
+        if field in ("message", "exc_text"):
+            continue
+        assert getattr(record, field) == getattr(original, field), field
+    # Formatting the copy gives the same output as the original
+    assert CSVLog().format(record) == CSVLog().format(original)
+
+
+def test_strings_are_interned(tmp_path):
+    filename = tmp_path / "log.bin"
+    _write(filename, [_record(msg=f"message {i}") for i in range(100)])
+    with BinaryLogReader(filename) as reader:
+        strings = reader.read_strings()
+    assert len(strings) == len(set(strings))
+    assert strings.count("the.logger") == 1
+
+
+def test_append(tmp_path):
+    filename = tmp_path / "log.bin"
+    _write(filename, [_record(msg="first")])
+    _write(filename, [_record(msg="second"), _record("other", msg="third")])
+    with BinaryLogReader(filename) as reader:
+        assert [r.name for r in reader] == ["the.logger"] * 2 + ["other"]
+        assert reader.strings.count("the.logger") == 1
+
+
+def test_truncated_file(tmp_path):
+    filename = tmp_path / "log.bin"
+    _write(filename, [_record(msg="first"), _record(msg="second")])
+    data = filename.read_bytes()
+    filename.write_bytes(data[:-3])
+    with BinaryLogReader(filename) as reader:
+        assert [r.getMessage() for r in reader] == ["first"]
+
+
+def test_append_after_truncation(tmp_path):
+    filename = tmp_path / "log.bin"
+    _write(filename, [_record(msg="first"), _record(msg="second")])
+    data = filename.read_bytes()
+    filename.write_bytes(data[:-3])
+    _write(filename, [_record("new.logger", msg="third")])
+    with BinaryLogReader(filename) as reader:
+        records = list(reader)
+    assert [r.getMessage() for r in records] == ["first", "third"]
+    assert records[1].name == "new.logger"
+
+
+def test_strings_kept_only_for_written_records(tmp_path):
+    filename = tmp_path / "log.bin"
+    broken = _record("broken.logger", msg="broken")
+    broken.lineno = -1  # Cannot be packed
+    handler = BinaryFileHandler(filename)
+    handler.handleError = lambda record: None
+    handler.handle(broken)
+    handler.handle(_record("broken.logger", msg="fine"))
+    handler.close()
+    with BinaryLogReader(filename) as reader:
+        (record,) = reader
+    assert (record.name, record.getMessage()) == ("broken.logger", "fine")
+
+
+def test_not_a_binary_log(tmp_path):
+    filename = tmp_path / "log.csv"
+    filename.write_text("a,b,c\n")
+    with pytest.raises(ValueError):
+        BinaryLogReader(filename)
+
+
+@pytest.mark.parametrize(
+    "filters, expected",
+    [
+        ({}, ["a", "b", "c", "d"]),
+        ({"min_level": logging.WARNING}, ["b", "d"]),
+        ({"logger": "app"}, ["a", "b"]),
+        ({"logger": "app.db"}, ["b"]),
+        ({"start": 20, "end": 40}, ["b", "c"]),
+    ],
+)
+def test_filters(tmp_path, filters, expected):
+    filename = tmp_path / "log.bin"
+    _write(
+        filename,
+        [
+            _record("app", "a", logging.INFO, created=10),
+            _record("app.db", "b", logging.ERROR, created=20),
+            _record("application", "c", logging.INFO, created=30),
+            _record("other", "d", logging.WARNING, created=40),
+        ],
+    )
+    with BinaryLogReader(filename) as reader:
+        assert [r.getMessage() for r in reader.records(**filters)] == expected
+
+
+def test_convert_to_csv(tmp_path):
+    source = tmp_path / "log.bin"
+    target = tmp_path / "log.csv"
+    _write(source, [_record(msg=f"message {i}") for i in range(3)])
+    count = convert(source, CSVFileHandler(target), min_level=logging.INFO)
+    assert count == 3
+    with open(target, newline="") as fptr:
+        rows = list(csv.reader(fptr))
+    assert rows[0] == list(FIELDS)
+    assert [row[15] for row in rows[1:]] == [f"message {i}" for i in range(3)]
+
+
+def test_cli_convert_xml(tmp_path, capsys):
+    source = tmp_path / "log.bin"
+    _write(
+        source, [_record(msg="one"), _record(msg="two", level=logging.DEBUG)]
+    )
+    assert main(["convert", str(source), "-f", "xml", "--level", "INFO"]) == 0
+    root = ElementTree.fromstring(capsys.readouterr().out)
+    assert [r.find("message").text for r in root] == ["one"]
+
+
+def test_cli_convert_console(tmp_path, capsys):
+    source = tmp_path / "log.bin"
+    _write(source, [_record(msg="boom", exc_info=_exc_info())])
+    main(["convert", str(source)])
+    output = capsys.readouterr().out
+    assert "boom" in output
+    assert "ValueError: line 1" in output
@@ -0,0 +1,26 @@
+import pytest
+
+from gouge.cache import LRUCache
+
+
+def test_get_missing():
+    cache = LRUCache(2)
+    assert cache.get("a") is None
+    assert cache.get("a", 1) == 1
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    evicted = cache.put("c", 3)
+    assert evicted == ("b", 2)
+    assert "a" in cache
+    assert "b" not in cache
+    assert len(cache) == 2
+
+
+def test_invalid_size():
+    with pytest.raises(ValueError):
+        LRUCache(0)
@@ -4,9 +4,14 @@ This module tests the log formatter which colorises messages
 
 import logging
 import re
+import sys
+import time
 from logging import LogRecord
+from pathlib import Path
 
-from gouge.colourcli import Simple
+import pytest
+
+from gouge.colourcli import Simple, colour_only, exc_fingerprint
 
 
 def test_format_record_red_exception():
@@ -88,3 +93,216 @@ def test_dictconfig():
     import logging.config
 
     logging.config.dictConfig(config)
+
+
+def test_compiled_template_output():
+    """
+    The pre-compiled templates must produce the exact same layout as the
+    original dynamic template.
+    """
+    record = LogRecord(
+        "name", logging.INFO, "path", 42, "a {b} %s", args=("c",), exc_info=None
+    )
+    formatter = Simple(show_threads=True, show_pid=True)
+    output = formatter.format(record)
+    expected = (
+        f"\x1b[1m[PID: {record.process:<5}]\x1b[0m "
+        f"{record.threadName:<10} "
+        f"\x1b[32m{record.asctime}\x1b[0m "
+        f"\x1b[36m{'INFO':<10}\x1b[0m "
+        "\x1b[1m[name]\x1b[0m "
+        "a {b} c"
+    )
+    assert output == expected
+
+
+def _raise_nested(message):
+    def inner():
+        raise ValueError(message)
+
+    try:
+        inner()
+    except ValueError:
+        return sys.exc_info()
+
+
+def test_exc_text_is_plain():
+    """
+    The traceback stored on the record must not contain escaped braces so
+    other handlers can reuse it.
+    """
+    record = LogRecord(
+        "name",
+        logging.ERROR,
+        "path",
+        42,
+        "message",
+        args={},
+        exc_info=_raise_nested("{foo}"),
+    )
+    formatter = Simple(show_exc=True)
+    output = formatter.format(record)
+    assert "ValueError: {foo}" in record.exc_text
+    assert "ValueError: {foo}" in output
+
+
+def test_traceback_cached(monkeypatch):
+    """
+    Identical tracebacks should only be rendered once.
+    """
+    calls = []
+    original = logging.Formatter.formatException
+
+    def counting(self, exc_info):
+        calls.append(exc_info)
+        return original(self, exc_info)
+
+    monkeypatch.setattr(logging.Formatter, "formatException", counting)
+    formatter = Simple(show_exc=True)
+    outputs = []
+    for _ in range(3):
+        record = LogRecord(
+            "name",
+            logging.ERROR,
+            "path",
+            42,
+            "message",
+            args={},
+            exc_info=_raise_nested("same"),
+        )
+        outputs.append(formatter.format(record).split("\n", 1)[1])
+        assert record.exc_text
+    assert len(calls) == 1
+    assert outputs[0] == outputs[1] == outputs[2]
+
+
+def test_format_exception_override():
+    """
+    Subclasses overriding formatException are used for every record.
+    """
+
+    class Custom(Simple):
+        def formatException(self, exc_info, exc_color):
+            return f"custom {exc_info[1]} {{f.RED}}{exc_color}"
+
+    formatter = Custom(show_exc=True, colour=False)
+    for _ in range(2):
+        record = LogRecord(
+            "name",
+            logging.ERROR,
+            "path",
+            42,
+            "message",
+            args={},
+            exc_info=_raise_nested("same"),
+        )
+        output = formatter.format(record)
+        assert output.endswith("\ncustom same ")
+        assert record.exc_text == "custom same "
+
+
+def test_exc_fingerprint_message():
+    """
+    Exceptions which only differ in their message must not share a
+    fingerprint.
+    """
+    assert exc_fingerprint(_raise_nested("a")) != exc_fingerprint(
+        _raise_nested("b")
+    )
+    assert exc_fingerprint(_raise_nested("a")) == exc_fingerprint(
+        _raise_nested("a")
+    )
+
+
+@pytest.mark.parametrize(
+    "datefmt", [None, "", "%Y-%m-%d %H:%M:%S", "%H:%M", "%H:%M:%S.%f"]
+)
+def test_format_time_cached(datefmt):
+    """
+    Cached timestamps must be identical to the uncached ones.
+    """
+    formatter = Simple()
+    reference = logging.Formatter()
+    for created in [1000.001, 1000.5, 1000.999, 1001.0, 1000.2, 5000.75]:
+        record = LogRecord(
+            "name", logging.INFO, "path", 42, "msg", args={}, exc_info=None
+        )
+        record.created = created
+        record.msecs = (created - int(created)) * 1000
+        assert formatter.formatTime(record, datefmt) == reference.formatTime(
+            record, datefmt
+        )
+
+
+def test_format_time_converter():
+    """
+    Custom converters must be respected.
+    """
+    formatter = Simple()
+    formatter.converter = time.gmtime
+    reference = logging.Formatter()
+    reference.converter = time.gmtime
+    record = LogRecord(
+        "name", logging.INFO, "path", 42, "msg", args={}, exc_info=None
+    )
+    assert formatter.formatTime(record) == reference.formatTime(record)
+
+
+def test_colourless():
+    """
+    Without colours, no escape sequences may be emitted, also not in
+    tracebacks.
+    """
+    record = LogRecord(
+        "name",
+        logging.ERROR,
+        __file__,
+        42,
+        "message",
+        args={},
+        exc_info=_raise_nested("oops"),
+    )
+    formatter = Simple(
+        show_exc=True, show_pid=True, highlighted_path=Path(__file__).parent
+    )
+    formatter.colour = False
+    output = formatter.format(record)
+    assert "\x1b" not in output
+    assert output.startswith(f"[PID: {record.process:<5}] {record.asctime}")
+    assert "ValueError: oops" in output
+
+
+def test_colourless_pre_formatters():
+    """
+    Pre-formatters which only add colours are skipped in colourless mode.
+    """
+
+    @colour_only
+    def colourise(message):
+        return f"\x1b[31m{message}"
+
+    def upper(message):
+        return message.upper()
+
+    record = LogRecord(
+        "name", logging.INFO, "path", 42, "message", args={}, exc_info=None
+    )
+    formatter = Simple(
+        pre_formatters={"name": [colourise, upper]}, colour=False
+    )
+    formatter.format(record)
+    assert record.message == "MESSAGE"
+
+
+def test_basic_config_colour_auto():
+    root = logging.getLogger()
+    old_handlers = root.handlers[:]
+    try:
+        (handler,) = Simple.basicConfig(force=True, stream=sys.__stderr__)
+        assert handler.formatter.colour == sys.__stderr__.isatty()
+        (handler,) = Simple.basicConfig(
+            force=True, stream=sys.__stderr__, colour=True
+        )
+        assert handler.formatter.colour
+    finally:
+        root.handlers[:] = old_handlers
@@ -0,0 +1,373 @@
+import io
+import logging
+import sys
+import threading
+import time
+import weakref
+
+import pytest
+
+from gouge.colourcli import Simple
+from gouge.filters import ShiftingFilter
+from gouge.handlers import (
+    DROP_NEWEST,
+    DROP_OLDEST,
+    BackgroundHandler,
+    BufferedStreamHandler,
+    CollapsingHandler,
+    buffer_handlers,
+)
+from gouge.parseable import CSVFileHandler
+
+
+def SimpleRecord(msg, *args):
+    return logging.LogRecord("name", logging.INFO, "", 0, msg, args, None)
+
+
+class GatedHandler(logging.Handler):
+    """
+    A handler which blocks until the gate is opened. Useful to fill up the
+    queue of a background handler.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.messages = []
+
+    def emit(self, record):
+        self.gate.wait()
+        self.messages.append(record.getMessage())
+
+
+def test_background_writes_on_other_thread():
+    blob = io.StringIO()
+    target = logging.StreamHandler(blob)
+    target.setFormatter(logging.Formatter("%(threadName)s %(message)s"))
+    handler = BackgroundHandler([target])
+    handler.handle(SimpleRecord("hello %s", "world"))
+    handler.close()
+    assert blob.getvalue() == "MainThread hello world\n"
+
+
+def test_background_args_are_frozen():
+    """
+    Records must not be affected by argument modifications after logging.
+    """
+    target = GatedHandler()
+    handler = BackgroundHandler([target])
+    value = ["a"]
+    handler.handle(SimpleRecord("%s", value))
+    value.append("b")
+    target.gate.set()
+    handler.close()
+    assert target.messages == ["['a']"]
+
+
+def test_background_keeps_immutable_args():
+    handler = BackgroundHandler([])
+    try:
+        record = handler.prepare(SimpleRecord("%s %d", "a", 1))
+        assert (record.msg, record.args) == ("%s %d", ("a", 1))
+        record = handler.prepare(SimpleRecord("%s", ["a"]))
+        assert (record.msg, record.args) == ("['a']", None)
+    finally:
+        handler.close()
+
+
+@pytest.mark.parametrize(
+    "overflow, expected",
+    [
+        (DROP_NEWEST, ["0", "1", "2", "3"]),
+        (DROP_OLDEST, ["0", "2", "3", "4"]),
+    ],
+)
+def test_background_drop(overflow, expected):
+    target = GatedHandler()
+    handler = BackgroundHandler([target], maxsize=3, overflow=overflow)
+    handler.handle(SimpleRecord("0"))
+    # Wait for the writer thread to pick up the first record, so the queue
+    # is empty again
+    while not handler.queue.empty():
+        pass
+    for i in range(1, 5):
+        handler.handle(SimpleRecord(str(i)))
+    target.gate.set()
+    handler.close()
+    assert target.messages[:-1] == expected
+    assert target.messages[-1] == (
+        "1 log records were dropped because the log queue was full"
+    )
+
+
+def test_background_invalid_overflow():
+    with pytest.raises(ValueError):
+        BackgroundHandler([], overflow="explode")
+
+
+def test_basic_config_async():
+    root = logging.getLogger()
+    old_handlers = root.handlers[:]
+    try:
+        handlers = Simple.basicConfig(
+            async_mode=True, force=True, stream=sys.__stderr__
+        )
+        assert len(handlers) == 1
+        assert handlers[0] not in root.handlers
+        background = [
+            h for h in root.handlers if isinstance(h, BackgroundHandler)
+        ]
+        assert len(background) == 1
+        assert background[0].handlers == handlers
+        background[0].close()
+    finally:
+        root.handlers[:] = old_handlers
+
+
+class CountingStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return super().write(data)
+
+
+def test_buffered_coalesces_writes():
+    stream = CountingStream()
+    handler = BufferedStreamHandler(stream, buffer_size=1000, max_latency=0)
+    for i in range(10):
+        handler.handle(SimpleRecord("line %d", i))
+    assert stream.writes == 0
+    handler.flush()
+    assert stream.writes == 1
+    assert stream.getvalue().splitlines() == [f"line {i}" for i in range(10)]
+    handler.close()
+
+
+def test_buffered_size_threshold():
+    stream = CountingStream()
+    handler = BufferedStreamHandler(stream, buffer_size=10, max_latency=0)
+    handler.handle(SimpleRecord("12345"))
+    assert stream.writes == 0
+    handler.handle(SimpleRecord("12345"))
+    assert stream.getvalue() == "12345\n12345\n"
+    handler.close()
+
+
+def test_buffered_flush_level():
+    stream = CountingStream()
+    handler = BufferedStreamHandler(stream, max_latency=0)
+    handler.handle(SimpleRecord("info"))
+    record = SimpleRecord("error")
+    record.levelno = logging.ERROR
+    handler.handle(record)
+    assert stream.getvalue() == "info\nerror\n"
+    handler.close()
+
+
+def test_buffered_max_latency():
+    stream = CountingStream()
+    handler = BufferedStreamHandler(stream, max_latency=0.01)
+    handler.handle(SimpleRecord("info"))
+    for _ in range(500):
+        if stream.getvalue():
+            break
+        time.sleep(0.01)
+    assert stream.getvalue() == "info\n"
+    handler.close()
+
+
+def test_buffered_close_flushes():
+    stream = CountingStream()
+    handler = BufferedStreamHandler(stream, max_latency=0)
+    handler.handle(SimpleRecord("info"))
+    handler.close()
+    assert stream.getvalue() == "info\n"
+
+
+class BrokenStream(CountingStream):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def write(self, data):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("broken pipe")
+        return super().write(data)
+
+
+def test_buffered_write_error_is_handled():
+    stream = BrokenStream(1)
+    handler = BufferedStreamHandler(stream, max_latency=0)
+    errors = []
+    handler.handleError = errors.append
+    handler.handle(SimpleRecord("lost"))
+    record = SimpleRecord("boom")
+    record.levelno = logging.ERROR
+    handler.handle(record)
+    assert errors == [record]
+    handler.handle(record)
+    handler.close()
+    assert stream.getvalue() == "boom\n"
+
+
+def test_buffered_periodic_flush_survives_errors():
+    stream = BrokenStream(1)
+    handler = BufferedStreamHandler(stream, max_latency=0.01)
+    errors = []
+    handler.handleError = errors.append
+    handler.handle(SimpleRecord("first"))
+    for _ in range(500):
+        if errors:
+            break
+        time.sleep(0.01)
+    handler.handle(SimpleRecord("second"))
+    for _ in range(500):
+        if stream.getvalue():
+            break
+        time.sleep(0.01)
+    assert stream.getvalue() == "second\n"
+    assert len(errors) == 1
+    handler.close()
+
+
+def test_buffer_handlers():
+    logger = logging.getLogger("test_buffer_handlers")
+    stream = io.StringIO()
+    original = logging.StreamHandler(stream)
+    original.setLevel(logging.WARNING)
+    logger.addHandler(original)
+    try:
+        (replacement,) = buffer_handlers(logger, [original])
+        assert isinstance(replacement, BufferedStreamHandler)
+        assert replacement.stream is stream
+        assert replacement.level == logging.WARNING
+        assert logger.handlers == [replacement]
+        replacement.close()
+    finally:
+        del logger.handlers[:]
+
+
+def test_buffer_handlers_keeps_file_handlers(tmp_path):
+    filename = tmp_path / "log.csv"
+    logger = logging.getLogger("test_buffer_handlers_keeps_file_handlers")
+    delayed = CSVFileHandler(filename, delay=True, max_latency=0)
+    plain = logging.FileHandler(tmp_path / "log.txt")
+    without_stream = logging.StreamHandler(io.StringIO())
+    without_stream.stream = None
+    without_stream.setLevel(logging.CRITICAL)
+    handlers = [delayed, plain, without_stream]
+    for handler in handlers:
+        logger.addHandler(handler)
+    try:
+        assert buffer_handlers(logger, handlers) == handlers
+        assert logger.handlers == handlers
+        logger.warning("message")
+        delayed.flush()
+        assert "message" in filename.read_text()
+    finally:
+        del logger.handlers[:]
+        delayed.close()
+        plain.close()
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    @property
+    def messages(self):
+        return [record.getMessage() for record in self.records]
+
+
+def _collapsing(**kwargs):
+    target = ListHandler()
+    return CollapsingHandler([target], **kwargs), target
+
+
+def _emit(handler, msg, *args, level=logging.INFO, created=0.0):
+    record = SimpleRecord(msg, *args)
+    record.levelno = level
+    record.created = created
+    handler.handle(record)
+
+
+def test_collapsing_runs():
+    handler, target = _collapsing(max_delay=0)
+    for _ in range(4):
+        _emit(handler, "retry %s", "db")
+    _emit(handler, "retry %s", "cache")
+    _emit(handler, "retry %s", "cache")
+    _emit(handler, "retry %s", "cache", level=logging.ERROR)
+    _emit(handler, "done")
+    handler.close()
+    assert target.messages == [
+        "retry db",
+        "Last message repeated 3 times",
+        "retry cache",
+        "retry cache",
+        "retry cache",
+        "done",
+    ]
+    assert target.records[1].repeated == 3
+    assert target.records[1].name == "name"
+
+
+def test_collapsing_max_delay():
+    handler, target = _collapsing(max_delay=10)
+    for created in range(25):
+        _emit(handler, "tick", created=float(created))
+    assert target.messages == [
+        "tick",
+        "Last message repeated 10 times",
+        "Last message repeated 10 times",
+    ]
+    handler.close()
+    assert target.messages[-1] == "Last message repeated 4 times"
+
+
+def test_collapsing_flushes_at_shutdown():
+    handler, target = _collapsing()
+    logger = logging.getLogger("test_collapsing_shutdown")
+    logger.addHandler(handler)
+    try:
+        for _ in range(3):
+            logger.error("boom")
+        assert target.messages == ["boom"]
+        logging.shutdown([weakref.ref(handler)])
+        assert target.messages == ["boom", "Last message repeated 2 times"]
+        assert target.records[-1].levelno == logging.ERROR
+    finally:
+        logger.removeHandler(handler)
+
+
+def test_collapsing_with_shifting_filter():
+    handler, target = _collapsing(max_delay=0)
+    handler.addFilter(ShiftingFilter(-1, "lib"))
+    for _ in range(3):
+        handler.handle(
+            logging.LogRecord("lib.a", logging.WARNING, "", 0, "x", (), None)
+        )
+    handler.flush()
+    assert [r.levelno for r in target.records] == [logging.INFO] * 2
+    assert target.messages == ["x", "Last message repeated 2 times"]
+
+
+def test_collapsing_uncomparable_args():
+    class Uncomparable:
+        def __eq__(self, other):
+            raise ValueError("ambiguous")
+
+        __hash__ = object.__hash__
+
+    handler, target = _collapsing(max_delay=0)
+    _emit(handler, "value %s", Uncomparable())
+    _emit(handler, "value %s", Uncomparable())
+    assert len(target.records) == 2
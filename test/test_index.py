@@ -0,0 +1,181 @@
+import logging
+import os
+
+import pytest
+
+from gouge.index import (
+    TimeIndex,
+    TimeIndexWriter,
+    build_csv_index,
+    index_filename,
+    read_csv_slice,
+)
+from gouge.parseable import CSVFileHandler
+
+
+def _record(created, msg="message"):
+    record = logging.LogRecord(
+        "the.logger", logging.INFO, "/path/to/file.py", 42, msg, (), None
+    )
+    record.created = float(created)
+    return record
+
+
+def _write(filename, records, **kwargs):
+    handler = CSVFileHandler(filename, index=True, **kwargs)
+    for record in records:
+        handler.handle(record)
+    handler.close()
+
+
+def _messages(rows):
+    return [row[15] for row in rows]
+
+
+def test_writer_every_records(tmp_path):
+    filename = tmp_path / "log.idx"
+    writer = TimeIndexWriter(filename, every_records=3, every_seconds=1000)
+    for position in range(10):
+        if writer.due(position):
+            writer.add(position, position * 10)
+    writer.close()
+    index = TimeIndex.load(filename)
+    assert list(index.timestamps) == [0, 3, 6, 9]
+    assert list(index.offsets) == [0, 30, 60, 90]
+
+
+def test_writer_every_seconds(tmp_path):
+    filename = tmp_path / "log.idx"
+    writer = TimeIndexWriter(filename, every_records=1000, every_seconds=5)
+    for created in [0, 1, 2, 6, 7, 20]:
+        if writer.due(created):
+            writer.add(created, 0)
+    writer.close()
+    assert list(TimeIndex.load(filename).timestamps) == [0, 6, 20]
+
+
+def test_span():
+    index = TimeIndex([10.0, 20.0, 30.0], [100, 200, 300])
+    assert index.span() == (None, None)
+    assert index.span(5, 15) == (None, 300)
+    assert index.span(5, 10) == (None, 200)
+    assert index.span(20, 25) == (None, None)
+    assert index.span(25, 40) == (100, None)
+    assert index.span(35, 40) == (200, None)
+
+
+def test_handler_offsets(tmp_path):
+    filename = tmp_path / "log.csv"
+    _write(
+        filename,
+        [_record(i, f"message {i}\nwith ü") for i in range(10)],
+        index_records=4,
+        batch_size=3,
+    )
+    index = TimeIndex.load(index_filename(filename))
+    assert list(index.timestamps) == [0, 4, 8]
+    with open(filename, "rb") as fptr:
+        for created, offset in zip(index.timestamps, index.offsets):
+            fptr.seek(offset)
+            assert fptr.readline().startswith(f"{created!r},".encode())
+
+
+def test_read_slice(tmp_path):
+    filename = tmp_path / "log.csv"
+    _write(filename, [_record(i, f"m{i}") for i in range(100)], index_records=7)
+    rows = list(read_csv_slice(filename, 42, 50))
+    assert _messages(rows) == [f"m{i}" for i in range(42, 50)]
+    assert _messages(read_csv_slice(filename, end=3)) == ["m0", "m1", "m2"]
+    assert len(list(read_csv_slice(filename))) == 100
+
+
+def test_read_slice_rebuilds_index(tmp_path):
+    filename = tmp_path / "log.csv"
+    _write(filename, [_record(i, f"m{i}\nline 2") for i in range(20)])
+    built = TimeIndex.load(index_filename(filename))
+    os.unlink(index_filename(filename))
+    assert _messages(read_csv_slice(filename, 5, 7)) == [
+        "m5\nline 2",
+        "m6\nline 2",
+    ]
+    rebuilt = TimeIndex.load(index_filename(filename))
+    assert list(rebuilt.offsets) == list(built.offsets)
+
+
+def test_read_slice_out_of_order(tmp_path):
+    """
+    A record after the index entry at *end* may still be older than *end*.
+    """
+    filename = tmp_path / "log.csv"
+    created = [0, 1, 2, 3, 4, 5, 7, 6, 8, 9]
+    _write(filename, [_record(i, f"m{i}") for i in created], index_records=2)
+    index = TimeIndex.load(index_filename(filename))
+    assert list(index.timestamps) == [0, 2, 4, 7, 8]
+    assert _messages(read_csv_slice(filename, 5, 7)) == ["m5", "m6"]
+
+
+def test_read_slice_out_of_order_start(tmp_path):
+    """
+    A record before the index entry at *start* may already be newer than
+    *start*.
+    """
+    filename = tmp_path / "log.csv"
+    created = [0, 1, 2, 3, 4, 5, 6, 8, 7.9, 9, 10, 11, 12, 13]
+    _write(filename, [_record(i, f"m{i}") for i in created], index_records=2)
+    index = TimeIndex.load(index_filename(filename))
+    assert list(index.timestamps) == [0, 2, 4, 6, 7.9, 10, 12]
+    assert _messages(read_csv_slice(filename, 8, 9)) == ["m8"]
+
+
+def test_read_slice_unwritable_index(tmp_path):
+    """
+    Reading does not fail if the index cannot be written.
+    """
+    filename = tmp_path / "log.csv"
+    handler = CSVFileHandler(filename)
+    for created in range(20):
+        handler.handle(_record(created, f"m{created}"))
+    handler.close()
+    # A directory in place of the index file can neither be read nor written
+    os.mkdir(index_filename(filename))
+    assert _messages(read_csv_slice(filename, 5, 7)) == ["m5", "m6"]
+    assert len(build_csv_index(filename, every_records=5)) == 4
+
+
+def test_handler_newlines(tmp_path):
+    """
+    Lines are terminated by "\n" on all platforms, which the index offsets
+    rely on.
+    """
+    filename = tmp_path / "log.csv"
+    _write(filename, [_record(i, f"m{i}\nline 2") for i in range(3)])
+    assert b"\r" not in filename.read_bytes()
+    assert _messages(read_csv_slice(filename, 1, 2)) == ["m1\nline 2"]
+
+
+def test_append_without_index(tmp_path):
+    filename = tmp_path / "log.csv"
+    handler = CSVFileHandler(filename)
+    for created in range(5):
+        handler.handle(_record(created))
+    handler.close()
+    _write(filename, [_record(i) for i in range(5, 10)], index_records=2)
+    index = TimeIndex.load(index_filename(filename))
+    assert list(index.timestamps) == [0, 2, 4, 5, 7, 9]
+    with open(filename, "rb") as fptr:
+        for created, offset in zip(index.timestamps, index.offsets):
+            fptr.seek(offset)
+            assert fptr.readline().startswith(f"{created!r},".encode())
+
+
+def test_build_index_of_empty_file(tmp_path):
+    filename = tmp_path / "log.csv"
+    filename.write_text("")
+    assert len(build_csv_index(filename)) == 0
+
+
+def test_not_an_index(tmp_path):
+    filename = tmp_path / "log.csv.idx"
+    filename.write_bytes(b"nope")
+    with pytest.raises(ValueError):
+        TimeIndex.load(filename)
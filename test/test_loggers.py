@@ -0,0 +1,105 @@
+import logging
+
+import pytest
+
+from gouge.loggers import ShiftingLogger, shift_level, unshift_level
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class CustomLogger(logging.Logger):
+    pass
+
+
+@pytest.fixture
+def handler():
+    handler = ListHandler()
+    parent = logging.getLogger("shifted")
+    parent.addHandler(handler)
+    parent.setLevel(logging.INFO)
+    parent.propagate = False
+    try:
+        yield handler
+    finally:
+        for name in ["shifted", "shifted.child", "shifted.custom", ""]:
+            unshift_level(name)
+        parent.removeHandler(handler)
+
+
+def test_dropped_before_record(handler, monkeypatch):
+    logger = logging.getLogger("shifted.existing")
+    shift_level("shifted", -1)
+    assert isinstance(logger, ShiftingLogger)
+
+    created = []
+    monkeypatch.setattr(
+        ShiftingLogger,
+        "makeRecord",
+        lambda self, *args, **kwargs: created.append(args),
+    )
+    logger.info("dropped")
+    assert not logger.isEnabledFor(logging.INFO)
+    assert logger.isEnabledFor(logging.WARNING)
+    assert not created
+
+
+def test_levels_shifted(handler):
+    logger = logging.getLogger("shifted.levels")
+    shift_level("shifted", -1)
+    logger.warning("warning")
+    logger.critical("critical")
+    assert [(r.levelno, r.levelname) for r in handler.records] == [
+        (logging.INFO, "INFO"),
+        (logging.ERROR, "ERROR"),
+    ]
+
+
+def test_min_max_offset(handler):
+    logger = logging.getLogger("shifted.limits")
+    shift_level("shifted", offset=25, max=logging.ERROR)
+    logger.debug("debug")
+    logger.info("info")
+    assert [r.levelno for r in handler.records] == [35, logging.ERROR]
+    assert handler.records[0].levelname == "Level 35"
+
+
+def test_later_loggers_and_precedence(handler):
+    shift_level("shifted", -1)
+    shift_level("shifted.child", 1)
+    late = logging.getLogger("shifted.late")
+    child = logging.getLogger("shifted.child.deep")
+    late.info("late")
+    child.debug("child")
+    assert [r.getMessage() for r in handler.records] == ["child"]
+    assert handler.records[0].levelno == logging.INFO
+
+    unshift_level("shifted.child")
+    child.debug("child again")
+    child.warning("warning")
+    assert [r.levelno for r in handler.records[1:]] == [logging.INFO]
+
+
+def test_custom_logger_class(handler):
+    logging.setLoggerClass(CustomLogger)
+    try:
+        logger = logging.getLogger("shifted.custom.logger")
+    finally:
+        logging.setLoggerClass(logging.Logger)
+    shift_level("shifted.custom", 1)
+    assert isinstance(logger, CustomLogger)
+    assert isinstance(logger, ShiftingLogger)
+    logger.info("info")
+    assert handler.records[0].levelno == logging.WARNING
+
+
+def test_unrelated_loggers(handler):
+    sibling = logging.getLogger("shiftedness")
+    shift_level("shifted", -1)
+    assert type(sibling) is logging.Logger
@@ -0,0 +1,277 @@
+import csv
+import io
+import json
+import logging
+import sys
+import threading
+import time
+from xml.etree import ElementTree
+
+import pytest
+
+from gouge.parseable import (
+    FIELDS,
+    CSVFileHandler,
+    CSVLog,
+    JSONLog,
+    XMLFileHandler,
+    XMLLog,
+)
+
+
+def _record(msg="message", level=logging.INFO, exc_info=None):
+    return logging.LogRecord(
+        "the.logger", level, "/path/to/file.py", 42, msg, (), exc_info
+    )
+
+
+def _exc_info():
+    try:
+        raise ValueError("line 1\nline 2")
+    except ValueError:
+        return sys.exc_info()
+
+
+def test_csv_format_many():
+    records = [_record(f"message {i}") for i in range(5)]
+    formatter = CSVLog()
+    expected = "".join(f"{formatter.format(r)}\n" for r in records)
+    assert formatter.format_many(records) == expected
+
+
+def test_csv_format_many_multiline():
+    records = [_record(exc_info=_exc_info()), _record("after")]
+    output = CSVLog().format_many(records)
+    rows = list(csv.reader(io.StringIO(output)))
+    assert len(rows) == 2
+    assert rows[0][-1].endswith("ValueError: line 1\nline 2")
+    assert rows[1][15] == "after"
+
+
+def test_csv_file_handler_header_once(tmp_path):
+    filename = tmp_path / "log.csv"
+    for _ in range(2):
+        handler = CSVFileHandler(filename)
+        handler.handle(_record())
+        handler.close()
+    rows = list(csv.reader(filename.open(newline="")))
+    assert rows[0] == list(CSVLog.COLUMNS)
+    assert len(rows) == 3
+    assert rows[1][15] == rows[2][15] == "message"
+
+
+def test_csv_file_handler_batches(tmp_path):
+    filename = tmp_path / "log.csv"
+    handler = CSVFileHandler(
+        filename, batch_size=3, header=False, max_latency=0
+    )
+    handler.handle(_record("1"))
+    handler.handle(_record("2"))
+    assert filename.read_text() == ""
+    handler.handle(_record("3"))
+    assert len(filename.read_text().splitlines()) == 3
+    handler.handle(_record("4"))
+    handler.handle(_record("5", level=logging.ERROR))
+    assert len(filename.read_text().splitlines()) == 5
+    handler.close()
+
+
+def test_csv_file_handler_max_latency(tmp_path):
+    filename = tmp_path / "log.csv"
+    handler = CSVFileHandler(filename, header=False, max_latency=0.01)
+    handler.handle(_record("quiet"))
+    for _ in range(500):
+        if filename.read_text():
+            break
+        time.sleep(0.01)
+    assert len(filename.read_text().splitlines()) == 1
+    handler.close()
+
+
+def test_csv_file_handler_write_error(tmp_path):
+    class FullDisk(io.StringIO):
+        def write(self, data):
+            raise OSError("disk full")
+
+    handler = CSVFileHandler(tmp_path / "log.csv", max_latency=0)
+    handler.stream.close()
+    handler.stream = FullDisk()
+    errors = []
+    handler.handleError = errors.append
+    record = _record("boom", level=logging.ERROR)
+    handler.handle(record)
+    assert errors == [record]
+    handler.stream = None
+
+
+def test_csv_concurrent_format():
+    """
+    A single formatter shared by many threads must never produce corrupted
+    rows.
+    """
+    formatter = CSVLog()
+    errors = []
+    barrier = threading.Barrier(8)
+
+    def produce(thread_id):
+        barrier.wait()
+        for i in range(2000):
+            message = f"thread-{thread_id}-record-{i}"
+            output = formatter.format(_record(message))
+            rows = list(csv.reader(io.StringIO(output)))
+            if len(rows) != 1 or rows[0][15] != message:
+                errors.append(output)
+
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [
+            threading.Thread(target=produce, args=(i,)) for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(old_interval)
+    assert errors == []
+
+
+def test_xml_format():
+    record = _record('a <b> & "c"')
+    record.created = 1.5
+    record.msecs = 500.0
+    record.relativeCreated = 2.0
+    record.process = 1
+    record.thread = 2
+    record.processName = "MainProcess"
+    record.threadName = "MainThread"
+    expected = (
+        "<record><created>1.5</created><filename>file.py</filename>"
+        "<funcName>None</funcName><levelname>INFO</levelname>"
+        "<levelno>20</levelno><lineno>42</lineno><module>file</module>"
+        "<msecs>500.0</msecs><name>the.logger</name>"
+        "<pathname>/path/to/file.py</pathname><process>1</process>"
+        "<processName>MainProcess</processName>"
+        "<relativeCreated>2.0</relativeCreated><thread>2</thread>"
+        "<threadName>MainThread</threadName>"
+        "<message>a &lt;b&gt; &amp; &quot;c&quot;</message>"
+        "<exc_text>None</exc_text></record>"
+    )
+    assert XMLLog().format(record) == expected
+
+
+def test_xml_file_handler(tmp_path):
+    filename = tmp_path / "log.xml"
+    for i in range(2):
+        handler = XMLFileHandler(filename)
+        handler.handle(_record(f"message {i} <&>"))
+        if i == 0:
+            handler.handle(_record(exc_info=_exc_info()))
+        handler.close()
+
+    messages = [
+        element.text
+        for _, element in ElementTree.iterparse(filename)
+        if element.tag == "message"
+    ]
+    assert messages == ["message 0 <&>", "message", "message 1 <&>"]
+    assert filename.read_text().count("<?xml") == 1
+
+
+def test_xml_invalid_characters(tmp_path):
+    filename = tmp_path / "log.xml"
+    handler = XMLFileHandler(filename)
+    handler.handle(_record("\x1b[31mred\x1b[0m\x00\ttab\nline ✓"))
+    handler.close()
+
+    messages = [
+        element.text
+        for _, element in ElementTree.iterparse(filename)
+        if element.tag == "message"
+    ]
+    assert messages == ["\ufffd[31mred\ufffd[0m\ufffd\ttab\nline ✓"]
+
+
+def test_json_default_fields():
+    record = _record('a "quoted" message')
+    output = JSONLog().format(record)
+    assert "\n" not in output
+    data = json.loads(output)
+    assert list(data) == list(FIELDS)
+    assert data["message"] == 'a "quoted" message'
+    assert data["exc_text"] is None
+
+
+def test_json_subset_and_extra():
+    record = _record("message")
+    record.request_id = "abc"
+    record.payload = object()
+    formatter = JSONLog(fields=["levelname", "message"])
+    data = json.loads(formatter.format(record))
+    assert list(data) == ["levelname", "message", "request_id", "payload"]
+    assert data["request_id"] == "abc"
+    assert data["payload"].startswith("<object object")
+
+
+def test_json_missing_field():
+    """
+    Fields passed via ``extra`` may be missing on some records.
+    """
+    formatter = JSONLog(fields=["message", "request_id"], extra=False)
+    record = _record("message")
+    assert formatter.format(record) == '{"message":"message","request_id":null}'
+    record.request_id = "abc"
+    assert (
+        formatter.format(record) == '{"message":"message","request_id":"abc"}'
+    )
+
+
+def test_json_no_extra():
+    record = _record("message")
+    record.request_id = "abc"
+    formatter = JSONLog(fields=["message"], extra=False)
+    assert formatter.format(record) == '{"message":"message"}'
+
+
+def test_json_exception():
+    record = _record(exc_info=_exc_info())
+    data = json.loads(JSONLog().format(record))
+    assert data["exc_text"].endswith("ValueError: line 1\nline 2")
+
+
+def test_json_encoders_equivalent():
+    """
+    Both encoders agree on common values (they differ on large floats and
+    NaN, see the JSONLog docstring).
+    """
+    record = _record("ünïcode ✓")
+    record.number = 1.5
+    record.mapping = {1: "int key", "nested": [1, None, True]}
+    fast = JSONLog(fast_encoder=True).format(record)
+    slow = JSONLog(fast_encoder=False).format(record)
+    assert fast == slow
+
+
+@pytest.mark.parametrize("fast_encoder", [True, False])
+def test_json_non_str_keys(fast_encoder):
+    record = _record("message")
+    record.mapping = {1: "a", None: "b"}
+    data = json.loads(JSONLog(fast_encoder=fast_encoder).format(record))
+    assert data["mapping"] == {"1": "a", "null": "b"}
+
+
+@pytest.mark.parametrize("fast_encoder", [True, False])
+def test_json_big_int(fast_encoder):
+    record = _record("message")
+    record.big = 2**70
+    data = json.loads(JSONLog(fast_encoder=fast_encoder).format(record))
+    assert data["big"] == 2**70
+
+
+@pytest.mark.parametrize(
+    "name", ["message); import os; (", "class", "not a name"]
+)
+def test_json_invalid_field(name):
+    with pytest.raises(ValueError):
+        JSONLog(fields=[name])
@@ -1,10 +1,11 @@
 import logging
+import re
 from logging import LogRecord
 
 import pytest
 
 from gouge import preformatters as pf
-from gouge.colourcli import Simple
+from gouge.colourcli import Simple, record_pre_formatter
 
 
 def _dummy_preformatter(message: str) -> str:
@@ -44,3 +45,234 @@ def test_uvicorn_access(status_code: str):
 def test_uvicorn_access_default():
     result = pf.uvicorn_access("invalid-line-format")
     assert result == "invalid-line-format"
+
+
+def _tag(tag: str):
+    def pre_formatter(message: str) -> str:
+        return f"{message}-{tag}"
+
+    return pre_formatter
+
+
+def _format_message(formatter: Simple, logger_name: str) -> str:
+    record = LogRecord(
+        logger_name, logging.INFO, "the-file", 42, "msg", None, None
+    )
+    formatter.format(record)
+    return record.message
+
+
+@pytest.mark.parametrize(
+    "lookup, expected",
+    [
+        ("exact", "msg"),
+        ("parent-first", "msg-root-a-a.b"),
+        ("child-first", "msg-a.b-a-root"),
+        ("nearest", "msg-a.b"),
+    ],
+)
+def test_hierarchical_lookup(lookup, expected):
+    registry = {"": [_tag("root")], "a": [_tag("a")], "a.b": [_tag("a.b")]}
+    instance = Simple(pre_formatters=registry, pre_formatter_lookup=lookup)
+    assert _format_message(instance, "a.b.c") == expected
+
+
+def test_hierarchical_no_sibling_match():
+    """
+    A registration for "a" must not apply to "ab".
+    """
+    instance = Simple(
+        pre_formatters={"a": [_tag("a")]}, pre_formatter_lookup="parent-first"
+    )
+    assert _format_message(instance, "ab") == "msg"
+
+
+def test_hierarchical_cache_invalidation():
+    instance = Simple(pre_formatter_lookup="parent-first")
+    assert _format_message(instance, "a.b") == "msg"
+    instance.pre_formatters["a"] = [_tag("a")]
+    assert _format_message(instance, "a.b") == "msg-a"
+    instance.add_pre_formatter("a.b", _tag("a.b"))
+    assert _format_message(instance, "a.b") == "msg-a-a.b"
+    del instance.pre_formatters["a"]
+    assert _format_message(instance, "a.b") == "msg-a.b"
+
+
+def test_exact_lookup_in_place_modification():
+    """
+    With the default lookup, in-place changes of the registered lists take
+    effect (like they did before the lookup modes were added).
+    """
+    instance = Simple(pre_formatters={"a": []})
+    assert _format_message(instance, "a") == "msg"
+    instance.pre_formatters["a"].append(_tag("a"))
+    assert _format_message(instance, "a") == "msg-a"
+    instance.pre_formatters["a"].clear()
+    assert _format_message(instance, "a") == "msg"
+
+
+def test_caller_mapping_is_shared():
+    """
+    Entries added to the mapping passed to Simple apply (it is not copied).
+    """
+    registry = {"y": [_tag("y")]}
+    instance = Simple(pre_formatters=registry)
+    registry["x"] = [_tag("x")]
+    assert _format_message(instance, "x") == "msg-x"
+    instance.add_pre_formatter("z", _tag("z"))
+    assert "z" in registry
+
+
+def test_invalid_lookup():
+    with pytest.raises(ValueError):
+        Simple(pre_formatter_lookup="sideways")
+
+
+def test_highlighter():
+    registry = pf.HighlightRegistry()
+    registry.add(
+        "http", r"(?P<method>GET|POST) (?P<path>\S+)", {"method": "<m>"}
+    )
+    registry.add("http", r"status=(?P<status>\d+)", {"status": "<s>"})
+    registry.add(
+        "http", r"(?P<level>error)", {"level": "<e>"}, name="err", flags=re.I
+    )
+    (highlighter,) = registry.pre_formatters()["http"]
+    result = highlighter("GET /a status=200 ERROR status=500")
+    reset = pf.clr.Style.RESET_ALL
+    assert result == (
+        f"<m>GET{reset} /a status=<s>200{reset} <e>ERROR{reset} "
+        f"status=<s>500{reset}"
+    )
+    assert registry.hits()["http"] == {
+        "(?P<method>GET|POST) (?P<path>\\S+)": 1,
+        "status=(?P<status>\\d+)": 2,
+        "err": 1,
+    }
+    assert highlighter("nothing to see") == "nothing to see"
+
+
+def test_highlighter_shared_group_names():
+    highlighter = pf.Highlighter(
+        [
+            pf.HighlightRule(r"a=(?P<value>\w)(?P=value)", {"value": "<a>"}),
+            pf.HighlightRule(r"b=(?P<value>\w)", {"value": "<b>"}),
+        ]
+    )
+    reset = pf.clr.Style.RESET_ALL
+    assert highlighter("a=xx a=xy b=z") == f"a=<a>x{reset}x a=xy b=<b>z{reset}"
+
+
+def test_highlighter_prefilter():
+    """
+    Only the rules matching a message are combined, without changing which
+    rule wins where they overlap.
+    """
+    highlighter = pf.Highlighter(
+        [
+            pf.HighlightRule(r"(?P<a>ab)", {"a": "<a>"}),
+            pf.HighlightRule(r"(?P<b>bc)", {"b": "<b>"}),
+            pf.HighlightRule(r"(?P<c>^x)", {"c": "<c>"}),
+        ]
+    )
+    reset = pf.clr.Style.RESET_ALL
+    assert highlighter("abc bc") == f"<a>ab{reset}c <b>bc{reset}"
+    assert highlighter("zbc") == f"z<b>bc{reset}"
+    # "^" still only matches at the start of the message
+    assert highlighter("bc x") == f"<b>bc{reset} x"
+    assert highlighter("nothing") == "nothing"
+    assert highlighter.hits == {"(?P<a>ab)": 1, "(?P<b>bc)": 3}
+
+
+def test_highlight_rule_errors():
+    with pytest.raises(ValueError, match="Unknown groups"):
+        pf.HighlightRule(r"(?P<a>x)", {"b": "<b>"})
+    with pytest.raises(ValueError, match="Unsupported"):
+        pf.HighlightRule(r"x", {}, flags=re.ASCII)
+
+
+def test_highlighter_in_simple():
+    registry = pf.HighlightRegistry()
+    registry.add("", r"id=(?P<id>\d+)", {"id": "<id>"})
+    instance = Simple(
+        pre_formatters=registry.pre_formatters(),
+        pre_formatter_lookup="parent-first",
+    )
+    record = LogRecord("a.b", logging.INFO, "", 1, "id=%d", (5,), None)
+    instance.format(record)
+    assert record.message == f"id=<id>5{pf.clr.Style.RESET_ALL}"
+    # Rules added later apply as well
+    registry.add("", r"(?P<word>late)", {"word": "<w>"})
+    record = LogRecord("a.b", logging.INFO, "", 1, "late", (), None)
+    instance.format(record)
+    assert record.message == f"<w>late{pf.clr.Style.RESET_ALL}"
+    # Skipped without colours
+    instance = Simple(
+        pre_formatters=registry.pre_formatters(),
+        pre_formatter_lookup="parent-first",
+        colour=False,
+    )
+    record = LogRecord("a.b", logging.INFO, "", 1, "id=%d", (5,), None)
+    instance.format(record)
+    assert record.message == "id=5"
+
+
+def _access_record(status_code=200, method="GET"):
+    return LogRecord(
+        "uvicorn.access",
+        logging.INFO,
+        "",
+        1,
+        pf.UVICORN_ACCESS_TEMPLATE,
+        ("127.0.0.1:43522", method, "/foo/bar", "1.1", status_code),
+        None,
+    )
+
+
+@pytest.mark.parametrize("status_code", [100, 200, 304, 404, 500, 700])
+def test_uvicorn_access_record(status_code):
+    record = _access_record(status_code)
+    assert pf.uvicorn_access(record) == pf.uvicorn_access(record.getMessage())
+
+
+def test_uvicorn_access_record_fallback():
+    record = _access_record(method="BREW")
+    assert pf.uvicorn_access(record) == record.getMessage()
+    record = LogRecord(
+        "uvicorn.access", logging.INFO, "", 1, "plain %s", ("text",), None
+    )
+    assert pf.uvicorn_access(record) == "plain text"
+
+
+def test_record_pre_formatter():
+    @record_pre_formatter
+    def first(record):
+        if record.args:
+            return f"first:{record.args[0]}"
+        return None
+
+    @record_pre_formatter
+    def second(record):
+        return "second"
+
+    instance = Simple(
+        pre_formatters={"a": [_tag("x"), first, second, _tag("y")]}
+    )
+    record = LogRecord("a", logging.INFO, "", 1, "%s", ("arg",), None)
+    instance.format(record)
+    assert record.message == "first:arg-x-y"
+    record = LogRecord("a", logging.INFO, "", 1, "msg", (), None)
+    instance.format(record)
+    assert record.message == "second-x-y"
+
+    instance = Simple(pre_formatters={"a": [first]})
+    record = LogRecord("a", logging.INFO, "", 1, "msg", (), None)
+    instance.format(record)
+    assert record.message == "msg"
+
+
+def test_uvicorn_access_in_simple():
+    instance = Simple(pre_formatters={"uvicorn.access": [pf.uvicorn_access]})
+    record = _access_record(404)
+    instance.format(record)
+    assert record.message == pf.uvicorn_access(record.getMessage())
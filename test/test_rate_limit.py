@@ -0,0 +1,102 @@
+import logging
+from functools import partial
+
+from gouge.filters import RateLimitFilter
+
+SimpleRecord = partial(
+    logging.LogRecord, pathname="", lineno=0, args=(), exc_info=None
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _filter(**kwargs):
+    clock = Clock()
+    filter_ = RateLimitFilter(**kwargs)
+    filter_.clock = clock
+    filter_.summarize()  # Reset the summary timer to the fake clock
+    return filter_, clock
+
+
+def _record(name="lib", msg="Connection failed", level=logging.WARNING):
+    return SimpleRecord(name=name, level=level, msg=msg)
+
+
+def _kept(filter_, count, **kwargs):
+    return sum(filter_.filter(_record(**kwargs)) for _ in range(count))
+
+
+def test_burst_and_refill():
+    filter_, clock = _filter(rate=2, burst=5, summary_interval=0)
+    assert _kept(filter_, 10) == 5
+    clock.now = 1.0
+    assert _kept(filter_, 10) == 2
+    clock.now = 100.0
+    assert _kept(filter_, 10) == 5
+
+
+def test_keys():
+    filter_, _ = _filter(rate=1, summary_interval=0)
+    assert _kept(filter_, 3) == 1
+    assert _kept(filter_, 3, msg="Other %s") == 1
+    assert _kept(filter_, 3, name="other") == 1
+    # Unhashable messages share the bucket of the logger
+    assert _kept(filter_, 3, msg={"a": 1}) == 1
+
+    filter_, _ = _filter(rate=1, by_message=False, summary_interval=0)
+    assert _kept(filter_, 3) == 1
+    assert _kept(filter_, 3, msg="Other %s") == 0
+
+
+def test_not_formatted():
+    filter_, _ = _filter(rate=1, summary_interval=0)
+    assert filter_.filter(_record(msg="%d"))
+    # getMessage() would fail for this record
+    assert not filter_.filter(_record(msg="%d"))
+
+
+def test_sampling():
+    filter_, _ = _filter(
+        rate=1000,
+        sampling={logging.DEBUG: 0.0, logging.INFO: 1.0},
+        summary_interval=0,
+    )
+    assert _kept(filter_, 10, level=logging.DEBUG) == 0
+    assert _kept(filter_, 10, level=logging.INFO) == 10
+    assert _kept(filter_, 10, level=logging.WARNING) == 10
+
+
+def test_summary(caplog):
+    filter_, clock = _filter(rate=1, summary_interval=10)
+    caplog.set_level(logging.WARNING, "gouge.ratelimit")
+    assert _kept(filter_, 5) == 1
+    assert _kept(filter_, 2, name="quiet") == 1
+    assert not caplog.records
+    clock.now = 10.0
+    assert filter_.filter(_record(name="quiet"))
+    assert [(r.getMessage(), r.suppressed) for r in caplog.records] == [
+        ("Suppressed 4 records from 'lib': 'Connection failed'", 4),
+        ("Suppressed 1 records from 'quiet': 'Connection failed'", 1),
+    ]
+    # Summary records pass the filter and the counts start over
+    assert filter_.filter(caplog.records[0])
+    caplog.clear()
+    assert _kept(filter_, 2) == 1
+    filter_.summarize()
+    assert [r.suppressed for r in caplog.records] == [1]
+
+
+def test_bounded_keys(caplog):
+    filter_, _ = _filter(rate=1, max_keys=2, summary_interval=0)
+    caplog.set_level(logging.WARNING, "gouge.ratelimit")
+    for name in ["a", "b", "c", "d"]:
+        assert _kept(filter_, 3, name=name) == 1
+    assert len(filter_._buckets) == 2
+    filter_.summarize()
+    assert sorted(r.suppressed for r in caplog.records) == [2, 2, 4]
@@ -0,0 +1,122 @@
+import logging
+import sys
+
+import pytest
+
+from gouge.cli import main
+from gouge.colourcli import Simple
+from gouge.parseable import FIELDS, CSVFileHandler, CSVLog
+from gouge.readers import CSVLogReader
+
+
+def _record(name="the.logger", msg="message", level=logging.INFO, **kwargs):
+    record = logging.LogRecord(
+        name,
+        level,
+        "/path/to/file.py",
+        42,
+        msg,
+        (),
+        kwargs.pop("exc_info", None),
+    )
+    record.__dict__.update(kwargs)
+    return record
+
+
+def _exc_info():
+    try:
+        raise ValueError('line 1\nline 2, with "quotes"')
+    except ValueError:
+        return sys.exc_info()
+
+
+def _write(filename, records, **kwargs):
+    handler = CSVFileHandler(filename, **kwargs)
+    for record in records:
+        handler.handle(record)
+    handler.close()
+
+
+def test_roundtrip(tmp_path):
+    filename = tmp_path / "log.csv"
+    original = _record(msg="hello %s", exc_info=_exc_info())
+    original.args = ("wörld",)
+    _write(filename, [original, _record(msg="second")])
+
+    first, second = CSVLogReader(filename)
+
+    assert first.getMessage() == "hello wörld"
+    assert 'line 2, with "quotes"' in first.exc_text
+    assert second.getMessage() == "second"
+    for field in FIELDS:
+        if field in ("message", "exc_text"):
+            continue
+        assert getattr(first, field) == getattr(original, field), field
+    assert CSVLog().format(first) == CSVLog().format(original)
+
+
+def test_lazy_conversion(tmp_path):
+    filename = tmp_path / "log.csv"
+    _write(filename, [_record()])
+    (record,) = CSVLogReader(filename)
+    assert "created" not in vars(record)
+    assert isinstance(record.created, float)
+    assert "created" in vars(record)
+
+
+def test_reformat(tmp_path):
+    filename = tmp_path / "log.csv"
+    original = _record(msg="boom", exc_info=_exc_info())
+    _write(filename, [original])
+    (record,) = CSVLogReader(filename)
+    formatter = Simple(show_exc=True, colour=False)
+    assert formatter.format(record) == formatter.format(original)
+
+
+def test_without_header(tmp_path):
+    filename = tmp_path / "log.csv"
+    _write(filename, [_record(msg="one"), _record(msg="two")], header=False)
+    assert [r.getMessage() for r in CSVLogReader(filename)] == ["one", "two"]
+
+
+def test_invalid_row(tmp_path):
+    filename = tmp_path / "log.csv"
+    filename.write_text("a,b,c\n")
+    with pytest.raises(ValueError, match="log.csv:1"):
+        list(CSVLogReader(filename))
+
+
+@pytest.mark.parametrize("index", [False, True])
+@pytest.mark.parametrize(
+    "filters, expected",
+    [
+        ({"min_level": logging.WARNING}, ["b", "d"]),
+        ({"logger": "app"}, ["a", "b"]),
+        ({"start": 20, "end": 40}, ["b", "c"]),
+        ({"start": 20, "logger": "other"}, ["d"]),
+    ],
+)
+def test_filters(tmp_path, index, filters, expected):
+    filename = tmp_path / "log.csv"
+    _write(
+        filename,
+        [
+            _record("app", "a", logging.INFO, created=10.0),
+            _record("app.db", "b", logging.ERROR, created=20.0),
+            _record("application", "c", logging.INFO, created=30.0),
+            _record("other", "d", logging.WARNING, created=40.0),
+        ],
+        index=index,
+        index_records=2,
+    )
+    records = CSVLogReader(filename).records(**filters)
+    assert [r.getMessage() for r in records] == expected
+
+
+def test_cli_convert_csv(tmp_path, capsys):
+    filename = tmp_path / "log.csv"
+    _write(filename, [_record(msg="one"), _record(msg="two")])
+    main(["convert", str(filename), "--format", "jsonl"])
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2
+    assert '"message":"two"' in lines[1]
@@ -0,0 +1,168 @@
+import csv
+import gzip
+import json
+import logging
+import os
+import sys
+from xml.etree import ElementTree
+
+import pytest
+
+from gouge.parseable import FIELDS, JSONLog, XMLLog
+from gouge.rotating import GZIP, RotatingFileHandler
+
+
+def _record(created, msg="message"):
+    record = logging.LogRecord(
+        "the.logger", logging.INFO, "/path/to/file.py", 42, msg, (), None
+    )
+    record.created = float(created)
+    return record
+
+
+def _segments(tmp_path, suffix):
+    return sorted(str(p) for p in tmp_path.glob(f"log.*{suffix}"))
+
+
+def test_rotate_by_time_csv(tmp_path):
+    filename = tmp_path / "log.csv"
+    handler = RotatingFileHandler(filename, interval=60, compression=GZIP)
+    for created in [0, 10, 59, 60, 61, 125]:
+        handler.handle(_record(created, f"m{created}"))
+    handler.close()
+
+    segments = _segments(tmp_path, ".csv.gz")
+    assert len(segments) == 2
+    contents = []
+    for name in segments + [str(filename)]:
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(name, "rt", newline="") as fptr:
+            rows = list(csv.reader(fptr))
+        assert rows[0] == list(FIELDS)
+        contents.append([row[15] for row in rows[1:]])
+    assert sorted(contents) == sorted(
+        [["m0", "m10", "m59"], ["m60", "m61"], ["m125"]]
+    )
+
+
+def test_rotate_by_size_xml(tmp_path):
+    filename = tmp_path / "log.xml"
+    handler = RotatingFileHandler(
+        filename, XMLLog(), max_bytes=1000, compression=None
+    )
+    for position in range(20):
+        handler.handle(_record(position, f"m{position}"))
+    handler.close()
+
+    segments = _segments(tmp_path, ".xml")
+    assert len(segments) > 2
+    messages = []
+    for name in segments + [filename]:
+        root = ElementTree.parse(name).getroot()
+        messages.extend(r.find("message").text for r in root)
+    assert sorted(messages) == sorted(f"m{i}" for i in range(20))
+
+
+def test_retention(tmp_path):
+    filename = tmp_path / "log.jsonl"
+    handler = RotatingFileHandler(
+        filename, JSONLog(), interval=1, compression=GZIP, backup_count=2
+    )
+    for created in range(6):
+        handler.handle(_record(created))
+        handler.wait()
+    handler.close()
+    assert len(_segments(tmp_path, ".jsonl.gz")) == 2
+    with open(filename) as fptr:
+        assert json.loads(fptr.read())["created"] == 5.0
+
+
+def test_continue_existing_file(tmp_path):
+    filename = tmp_path / "log.csv"
+    handler = RotatingFileHandler(filename, compression=None)
+    handler.handle(_record(0, "first"))
+    handler.close()
+    handler = RotatingFileHandler(filename, compression=None)
+    handler.handle(_record(1, "second"))
+    handler.close()
+    with open(filename, newline="") as fptr:
+        rows = list(csv.reader(fptr))
+    assert [row[15] for row in rows] == ["message", "first", "second"]
+
+
+def test_segment_names_unique(tmp_path):
+    filename = tmp_path / "log.csv"
+    handler = RotatingFileHandler(filename, compression=None)
+    for _ in range(3):
+        handler.handle(_record(0))
+        handler.rotate()
+    handler.close()
+    assert len(_segments(tmp_path, ".csv")) == 3
+    assert not os.path.exists(filename)
+
+
+def test_invalid_compression(tmp_path):
+    with pytest.raises(ValueError):
+        RotatingFileHandler(tmp_path / "log.csv", compression="lzma")
+
+
+def test_retention_ignores_other_files(tmp_path):
+    filename = tmp_path / "app.csv"
+    unrelated = [tmp_path / "app.audit.csv", tmp_path / "app.old.csv.gz"]
+    for name in unrelated:
+        name.write_text("keep me")
+    handler = RotatingFileHandler(
+        filename, compression=None, backup_count=1, index=True
+    )
+    for created in range(3):
+        handler.handle(_record(created))
+        handler.rotate()
+        handler.wait()
+    handler.close()
+    assert all(name.exists() for name in unrelated)
+    segments = handler.rotated_files()
+    assert len(segments) == 1
+    # The index files of deleted segments are removed as well
+    assert sorted(p.name for p in tmp_path.glob("*.idx")) == [
+        os.path.basename(segments[0]) + ".idx"
+    ]
+
+
+def test_rotate_by_size_counts_writes(tmp_path, monkeypatch):
+    filename = tmp_path / "log.csv"
+    handler = RotatingFileHandler(
+        filename, max_bytes=500, compression=None, batch_size=1
+    )
+    monkeypatch.setattr(
+        os, "fstat", lambda *args: pytest.fail("fstat per record")
+    )
+    for position in range(20):
+        handler.handle(_record(position))
+    monkeypatch.undo()
+    handler.close()
+    assert len(_segments(tmp_path, ".csv")) > 2
+    for name in _segments(tmp_path, ".csv"):
+        assert os.path.getsize(name) < 500 + 200
+
+
+def test_concurrent_latency_flush(tmp_path):
+    """
+    Rows must not get lost while the flusher thread of the CSV segment
+    writes the pending rows.
+    """
+    filename = tmp_path / "log.csv"
+    handler = RotatingFileHandler(
+        filename, compression=None, batch_size=100000, max_latency=0.0001
+    )
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for position in range(20000):
+            handler.handle(_record(position, f"m{position}"))
+    finally:
+        sys.setswitchinterval(old_interval)
+    handler.close()
+
+    with open(filename, newline="") as fptr:
+        rows = list(csv.reader(fptr))
+    assert len(rows) == 20001
@@ -210,3 +210,81 @@ def test_attached_to_logger(reset_logging):
         "0 NOTSET debug - d",
     ]
     assert lines == expected
+
+
+def test_noshift_sibling():
+    """
+    A logger sharing a name prefix is not a descendant.
+    """
+    filter_ = ShiftingFilter(1, "foo")
+    record = SimpleRecord(name="foobar", level=logging.DEBUG)
+    filter_.filter(record)
+    assert record.levelno == logging.DEBUG
+
+
+def test_inject_skips_siblings(reset_logging):
+    parent = logging.getLogger("sib")
+    child = logging.getLogger("sib.child")
+    sibling = logging.getLogger("sibling")
+    filter_ = ShiftingFilter(-1)
+    filter_.inject("sib")
+    assert filter_ in parent.filters
+    assert filter_ in child.filters
+    assert filter_ not in sibling.filters
+    filter_.cleanup()
+    assert filter_ not in child.filters
+
+
+def test_inject_follow(reset_logging):
+    existing = logging.getLogger("plug.existing")
+    filter_ = ShiftingFilter(-1)
+    filter_.inject("plug", follow=True)
+    late = logging.getLogger("plug.late.deep")
+    child = existing.getChild("child")
+    unrelated = logging.getLogger("plugin")
+    assert filter_ in existing.filters
+    assert filter_ in late.filters
+    assert filter_ in child.filters
+    assert filter_ not in unrelated.filters
+    # The intermediate logger was only a placeholder until now
+    assert filter_ in logging.getLogger("plug.late").filters
+
+    filter_.cleanup()
+    assert filter_ not in late.filters
+    assert filter_ not in logging.getLogger("plug.after_cleanup").filters
+
+
+def test_custom_level_name():
+    """
+    Level names added after the filter was created should be used.
+    """
+    filter_ = ShiftingFilter(offset=3)
+    record = SimpleRecord(name="a", level=logging.INFO)
+    filter_.filter(record)
+    assert record.levelname == "Level 23"
+    logging.addLevelName(23, "NOTICE")
+    try:
+        record = SimpleRecord(name="a", level=logging.INFO)
+        filter_.filter(record)
+        assert record.levelname == "NOTICE"
+    finally:
+        logging.addLevelName(23, "Level 23")
+
+
+def test_reconfigure():
+    """
+    Changing the attributes after the first record should take effect.
+    """
+    filter_ = ShiftingFilter(1, "a")
+    record = SimpleRecord(name="a.b", level=logging.DEBUG)
+    filter_.filter(record)
+    assert record.levelno == logging.INFO
+    filter_.logger = "x"
+    record = SimpleRecord(name="a.b", level=logging.DEBUG)
+    filter_.filter(record)
+    assert record.levelno == logging.DEBUG
+    filter_.logger = "a"
+    filter_.max = logging.DEBUG + 5
+    record = SimpleRecord(name="a.b", level=logging.DEBUG)
+    filter_.filter(record)
+    assert (record.levelno, record.levelname) == (15, "Level 15")
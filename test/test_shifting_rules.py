@@ -0,0 +1,118 @@
+import logging
+import logging.config
+from functools import partial
+
+import pytest
+
+from gouge.filters import ShiftingRules, ShiftRule
+
+SimpleRecord = partial(
+    logging.LogRecord, pathname="", lineno=0, msg="", args={}, exc_info=None
+)
+
+
+def _shift(filter_, name, level=logging.INFO):
+    record = SimpleRecord(name=name, level=level)
+    assert filter_.filter(record) is True
+    return record.levelno
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("sqlalchemy", logging.DEBUG),
+        ("sqlalchemy.engine", logging.DEBUG),
+        ("sqlalchemy.pool.impl", logging.WARNING),
+        ("sqlalchemyx", logging.INFO),
+        ("app", logging.INFO),
+        ("app.audit", logging.WARNING),
+        ("app.audit.db", logging.WARNING),
+        ("other", logging.INFO),
+    ],
+)
+def test_longest_prefix(name, expected):
+    filter_ = ShiftingRules(
+        {"sqlalchemy": -1, "sqlalchemy.pool": 1, "app.audit": 1}
+    )
+    assert _shift(filter_, name) == expected
+    # Cached
+    assert _shift(filter_, name) == expected
+
+
+def test_root_rule():
+    filter_ = ShiftingRules({"": 1, "quiet": 0})
+    assert _shift(filter_, "anything") == logging.WARNING
+    assert _shift(filter_, "root") == logging.WARNING
+    assert _shift(filter_, "quiet.child") == logging.INFO
+
+
+def test_limits_and_level_names():
+    filter_ = ShiftingRules(
+        {
+            "urllib3": {"shift_by": -3, "min": "debug"},
+            "app": {"offset": 25, "max": logging.ERROR},
+        }
+    )
+    record = SimpleRecord(name="urllib3.connectionpool", level=logging.ERROR)
+    filter_.filter(record)
+    assert (record.levelno, record.levelname) == (logging.DEBUG, "DEBUG")
+    assert _shift(filter_, "app", logging.DEBUG) == 35
+    assert _shift(filter_, "app", logging.WARNING) == logging.ERROR
+
+
+def test_rule_objects():
+    rules = [ShiftRule("a", -10), ShiftRule("a.b", 10, max=logging.WARNING)]
+    filter_ = ShiftingRules(rules)
+    assert filter_.rules == rules
+    assert _shift(filter_, "a.b.c", logging.WARNING) == logging.WARNING
+    assert _shift(filter_, "a.c", logging.WARNING) == logging.INFO
+
+
+def test_load():
+    filter_ = ShiftingRules({"lib": -1})
+    assert _shift(filter_, "lib.sub") == logging.DEBUG
+    filter_.load({"lib.sub": 1})
+    assert _shift(filter_, "lib.sub") == logging.WARNING
+    assert _shift(filter_, "lib") == logging.INFO
+    filter_.load({})
+    assert _shift(filter_, "lib.sub") == logging.INFO
+
+
+@pytest.mark.parametrize(
+    "config, message",
+    [
+        ({"shift": 1}, "Unknown keys"),
+        ({"shift_by": 1, "min": "LOUD"}, "Unknown level"),
+    ],
+)
+def test_invalid_config(config, message):
+    with pytest.raises(ValueError, match=message):
+        ShiftingRules({"lib": config})
+
+
+def test_dictconfig():
+    logging.config.dictConfig(
+        {
+            "version": 1,
+            "disable_existing_loggers": False,
+            "filters": {
+                "shift": {
+                    "()": "gouge.filters.ShiftingRules",
+                    "rules": {"noisy": -1, "app.audit": {"shift_by": 1}},
+                }
+            },
+            "handlers": {
+                "test": {
+                    "class": "logging.NullHandler",
+                    "filters": ["shift"],
+                }
+            },
+        }
+    )
+    handler = logging._handlers["test"]  # type: ignore
+    try:
+        (filter_,) = handler.filters
+        assert _shift(filter_, "noisy.child") == logging.DEBUG
+        assert _shift(filter_, "app.audit") == logging.WARNING
+    finally:
+        handler.close()